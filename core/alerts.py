@@ -0,0 +1,397 @@
+"""
+Bandeja de salida de alertas por email (tabla ``alert_outbox``).
+
+Las ventas y ajustes de stock no envían emails: agregan la alerta a la tabla
+dentro de su propia transacción, de modo que una alerta existe si y solo si
+el cambio que la originó se confirmó, y no se pierde si el proceso se
+reinicia antes de enviarla.
+
+El comando ``despachar_alertas`` las envía. Solo puede haber un despachador
+activo a la vez (bloqueo consultivo de sesión), así que el límite de envíos
+por segundo del proveedor se respeta con un único balde de fichas en memoria.
+Un envío fallido se reintenta con espera exponencial, solo para los
+destinatarios que aún no la recibieron (``delivered_to``); después de
+``MAX_INTENTOS`` la alerta queda como ``fallida`` con el último error.
+
+Un producto no vuelve a alertar en cada venta mientras siga con stock bajo:
+``stock_alert_state`` guarda si su alerta está armada, y solo se alerta al
+cruzar el umbral hacia abajo o tras un enfriamiento
+(``settings.ALERTAS_STOCK_ENFRIAMIENTO``). Reponer el stock la vuelve a armar.
+
+Las alertas de una tienda se envían a los administradores del directorio de
+destinatarios (ver ``core/recipients.py``), cada uno con los productos de
+los niveles que eligió; por eso encolarlas no consulta usuarios ni tiendas.
+Para no enviar un email por producto, las alertas de una tienda se acumulan
+durante una ventana (``VENTANA`` segundos) y cada destinatario las recibe
+juntas en un único resumen. Los emails de una pasada se entregan por el transporte
+configurado (ver ``core/transports.py``) en lotes de hasta ``max_lote``
+mensajes por solicitud; cada solicitud consume una ficha del balde.
+"""
+import json
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import recipients
+from .transports import obtener_transporte
+
+# Estados de una alerta
+PENDIENTE = 'pendiente'
+ENVIADA = 'enviada'
+FALLIDA = 'fallida'
+DESCARTADA = 'descartada'  # ningún destinatario recibe ese nivel de alerta
+
+# Clave del bloqueo consultivo que identifica al despachador activo
+_SQL_TURNO_DESPACHADOR = "hashtextextended('alert_outbox', 0)"
+
+
+def configuracion_despacho():
+    configuracion = {
+        'TASA': 2,               # envíos por segundo (límite de Resend)
+        'RAFAGA': 2,             # envíos seguidos permitidos tras una pausa
+        'VENTANA': 300,          # segundos que se acumulan alertas por tienda
+        'MAX_INTENTOS': 6,
+        'REINTENTO_BASE': 30,    # segundos antes del primer reintento
+        'REINTENTO_MAX': 3600,   # tope de la espera entre reintentos
+    }
+    configuracion.update(getattr(settings, 'ALERTAS_DESPACHO', {}))
+    return configuracion
+
+
+# =====================================================
+# ENCOLAR
+# =====================================================
+
+def enfriamiento_alertas():
+    """Segundos tras los cuales un producto que sigue con stock bajo vuelve a alertar"""
+    return getattr(settings, 'ALERTAS_STOCK_ENFRIAMIENTO', 24 * 3600)
+
+
+def encolar_alertas_stock_bajo(cursor, id_store, user_id, productos):
+    """
+    Agrega alertas de stock bajo solo para los productos que deben alertar
+
+    Un producto alerta cuando su stock cruza el umbral hacia abajo (su
+    estado está armado) o cuando pasó el enfriamiento desde su última alerta;
+    después queda desarmado hasta que ``rearmar_alertas_stock`` vea el stock
+    repuesto. El estado y las alertas se escriben en una sola sentencia.
+
+    Debe llamarse con el cursor de la transacción que cambió el stock.
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        id_store: UUID de la tienda
+        user_id: UUID del usuario que originó la alerta
+        productos (list): Tuplas (id_product, nombre, stock restante) de
+            productos que quedaron bajo el umbral
+    """
+    if not productos:
+        return
+
+    params = []
+    for id_product, nombre, stock in productos:
+        params.extend([
+            str(id_product),
+            stock,
+            json.dumps({'id_product': str(id_product), 'producto': nombre, 'stock': int(stock)}),
+        ])
+
+    # Los estados se bloquean en orden de id_product para evitar deadlocks
+    # entre ventas simultáneas de los mismos productos
+    cursor.execute(f"""
+        WITH bajos (id_product, stock, payload) AS (
+            VALUES {', '.join(['(%s::uuid, %s::numeric, %s::jsonb)'] * len(productos))}
+        ),
+        disparadas AS (
+            INSERT INTO stock_alert_state AS e (id_product, id_store, armed, last_alerted_at, last_stock)
+            SELECT id_product, %s::uuid, FALSE, now(), stock
+            FROM bajos
+            ORDER BY id_product
+            ON CONFLICT (id_product) DO UPDATE
+                SET armed = FALSE, last_alerted_at = now(), last_stock = EXCLUDED.last_stock
+                WHERE e.armed OR e.last_alerted_at <= now() - make_interval(secs => %s)
+            RETURNING e.id_product
+        )
+        INSERT INTO alert_outbox (id_store, id_user, kind, payload)
+        SELECT %s::uuid, %s::uuid, 'stock_bajo', b.payload
+        FROM bajos b
+        INNER JOIN disparadas d ON d.id_product = b.id_product
+    """, params + [
+        str(id_store),
+        enfriamiento_alertas(),
+        str(id_store),
+        str(user_id) if user_id else None,
+    ])
+
+
+def rearmar_alertas_stock(cursor, ids_producto):
+    """
+    Vuelve a armar la alerta de los productos cuyo stock ya no está bajo
+
+    Se llama después de reponer stock (ajustes y cancelaciones); la próxima
+    vez que el stock baje del umbral se alertará de inmediato.
+    """
+    from .metrics import STOCK_BAJO
+    from .stock_ledger import sql_stock_actual
+
+    cursor.execute(f"""
+        UPDATE stock_alert_state e
+        SET armed = TRUE
+        FROM products p
+        WHERE p.id_product = e.id_product
+          AND e.id_product = ANY(%s::uuid[])
+          AND NOT e.armed
+          AND {sql_stock_actual('p')} >= %s
+    """, [[str(id_product) for id_product in ids_producto], STOCK_BAJO])
+
+
+# =====================================================
+# DESPACHAR
+# =====================================================
+
+class BaldeFichas:
+    """Limita la tasa de envíos: ``tasa`` fichas por segundo, hasta ``capacidad`` acumuladas"""
+
+    def __init__(self, tasa, capacidad):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad)
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self):
+        """Espera hasta que haya una ficha disponible y la consume"""
+        self._recargar()
+        while self._fichas < 1:
+            time.sleep((1 - self._fichas) / self.tasa)
+            self._recargar()
+        self._fichas -= 1
+
+
+def tomar_turno_despachador():
+    """
+    Intenta convertirse en el despachador activo
+
+    El bloqueo es de sesión: se mantiene hasta ``liberar_turno_despachador``
+    o hasta que se cierre la conexión.
+
+    Returns:
+        bool: False si otro proceso ya está despachando
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT pg_try_advisory_lock({_SQL_TURNO_DESPACHADOR})")
+        return cursor.fetchone()[0]
+
+
+def liberar_turno_despachador():
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT pg_advisory_unlock({_SQL_TURNO_DESPACHADOR})")
+
+
+def _espera_reintento(intentos, configuracion):
+    """Segundos hasta el siguiente intento: exponencial con variación aleatoria"""
+    espera = min(configuracion['REINTENTO_MAX'], configuracion['REINTENTO_BASE'] * 2 ** (intentos - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _mensaje(kind, payloads, tienda, email):
+    """Arma el email que resume las alertas de un destinatario"""
+    from .notifications import mensaje_alerta_stock_bajo, mensaje_stock_critico_multiple
+
+    if kind != 'stock_bajo':
+        raise ValueError(f'Tipo de alerta desconocido: {kind}')
+
+    # Un producto alertado varias veces en la ventana aparece una vez, con el último stock
+    productos = {}
+    for payload in payloads:
+        productos[payload['id_product']] = payload
+
+    if len(productos) == 1:
+        payload, = productos.values()
+        return mensaje_alerta_stock_bajo(payload['producto'], payload['stock'], tienda, email)
+    return mensaje_stock_critico_multiple(
+        sorted(
+            ({'name': payload['producto'], 'stock': payload['stock']} for payload in productos.values()),
+            key=lambda producto: (producto['stock'], producto['name'])
+        ),
+        tienda,
+        email,
+    )
+
+
+def _registrar_fallo(ids_alerta, intentos, error, configuracion, resultado):
+    with connection.cursor() as cursor:
+        if intentos >= configuracion['MAX_INTENTOS']:
+            cursor.execute("""
+                UPDATE alert_outbox
+                SET status = %s, attempts = %s, last_error = %s
+                WHERE id_alert = ANY(%s)
+            """, [FALLIDA, intentos, error, ids_alerta])
+            resultado['fallidas'] += len(ids_alerta)
+        else:
+            cursor.execute("""
+                UPDATE alert_outbox
+                SET attempts = %s, last_error = %s,
+                    next_attempt_at = now() + make_interval(secs => %s)
+                WHERE id_alert = ANY(%s)
+            """, [intentos, error, _espera_reintento(intentos, configuracion), ids_alerta])
+            resultado['reprogramadas'] += len(ids_alerta)
+
+
+def despachar_pendientes(limite=100, balde=None):
+    """
+    Envía las alertas pendientes agrupadas en un email por destinatario
+
+    Las alertas de una misma tienda y tipo se acumulan durante ``VENTANA``
+    segundos desde la más antigua; luego cada destinatario de la tienda
+    recibe un resumen con los productos de su nivel. Debe ejecutarlo solo el
+    despachador activo (``tomar_turno_despachador``). Los resultados se
+    guardan al terminar cada pasada; cada alerta registra en ``delivered_to``
+    los emails que ya la recibieron, de modo que un reintento solo se envía
+    a los destinatarios que fallaron. Una alerta queda enviada cuando todos
+    sus destinatarios la recibieron.
+
+    Args:
+        limite (int): Máximo de tiendas a procesar en esta pasada
+        balde (BaldeFichas): Límite de tasa compartido entre pasadas
+
+    Returns:
+        dict: Cantidad de emails intentados y de alertas enviadas,
+        reprogramadas, fallidas y descartadas
+    """
+    configuracion = configuracion_despacho()
+    if balde is None:
+        balde = BaldeFichas(configuracion['TASA'], configuracion['RAFAGA'])
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            WITH vencidas AS (
+                SELECT id_alert, id_store, kind, payload, attempts, created_at
+                FROM alert_outbox
+                WHERE status = %s AND next_attempt_at <= now()
+            ),
+            grupos AS (
+                SELECT id_store, kind, MIN(created_at) AS desde
+                FROM vencidas
+                GROUP BY id_store, kind
+                HAVING MIN(created_at) <= now() - make_interval(secs => %s)
+                ORDER BY desde
+                LIMIT %s
+            )
+            SELECT v.id_alert, v.id_store, v.kind, v.payload, v.attempts, a.delivered_to
+            FROM vencidas v
+            INNER JOIN alert_outbox a ON a.id_alert = v.id_alert
+            INNER JOIN grupos g ON g.id_store = v.id_store AND g.kind = v.kind
+            ORDER BY g.desde, v.id_alert
+        """, [PENDIENTE, configuracion['VENTANA'], limite])
+        alertas = cursor.fetchall()
+
+    resultado = {'emails': 0, 'enviadas': 0, 'reprogramadas': 0, 'fallidas': 0, 'descartadas': 0}
+    if not alertas:
+        return resultado
+
+    # (id_store, kind) -> [(id_alert, payload, attempts)], en orden de antigüedad
+    grupos = {}
+    entregado_a = {}  # id_alert -> emails que ya la recibieron en pasadas anteriores
+    for id_alert, id_store, kind, payload, intentos, entregados in alertas:
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        if isinstance(entregados, str):
+            entregados = json.loads(entregados)
+        grupos.setdefault((str(id_store), kind), []).append((id_alert, payload, intentos))
+        entregado_a[id_alert] = set(entregados or [])
+
+    transporte = obtener_transporte()
+    respaldo = recipients.email_respaldo()
+
+    # (ids de alerta incluidas, intentos, email, mensaje) por destinatario
+    envios = []
+    descartadas = []
+    incluidas = {}  # id_alert -> intentos, de las alertas con algún destinatario
+    errores = {}  # id_alert -> (intentos, error)
+    for (id_store, kind), filas in grupos.items():
+        intentos = max(intentos for _, _, intentos in filas) + 1
+        directorio = recipients.directorio_tienda(id_store)
+        destinatarios = directorio['destinatarios'] or ([(respaldo, 'medio')] if respaldo else [])
+
+        for email, nivel in destinatarios:
+            propias = [
+                (id_alert, payload) for id_alert, payload, _ in filas
+                if recipients.recibe_alerta(nivel, payload['stock'])
+            ]
+            incluidas.update((id_alert, intentos) for id_alert, _ in propias)
+            # Sin repetir las alertas que este destinatario ya recibió
+            propias = [(id_alert, payload) for id_alert, payload in propias if email not in entregado_a[id_alert]]
+            if not propias:
+                continue
+            ids_alerta = [id_alert for id_alert, _ in propias]
+            try:
+                mensaje = _mensaje(kind, [payload for _, payload in propias], directorio['tienda'], email)
+            except Exception as e:
+                for id_alert in ids_alerta:
+                    errores[id_alert] = (intentos, str(e) or e.__class__.__name__)
+                continue
+            envios.append((ids_alerta, intentos, email, mensaje))
+
+        descartadas.extend(id_alert for id_alert, _, _ in filas if id_alert not in incluidas)
+
+    # Cada solicitud al proveedor lleva hasta max_lote emails y consume una ficha
+    nuevas_entregas = {}  # id_alert -> emails entregados en esta pasada
+    for inicio in range(0, len(envios), transporte.max_lote):
+        lote = envios[inicio:inicio + transporte.max_lote]
+
+        balde.tomar()
+        resultado['emails'] += len(lote)
+        try:
+            transporte.enviar_lote([mensaje for _, _, _, mensaje in lote])
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            print(f"❌ Error al enviar {len(lote)} alertas: {error}")
+            for ids_alerta, intentos, _, _ in lote:
+                for id_alert in ids_alerta:
+                    errores[id_alert] = (intentos, error)
+            continue
+        for ids_alerta, _, email, _ in lote:
+            for id_alert in ids_alerta:
+                nuevas_entregas.setdefault(id_alert, []).append(email)
+
+    # Una alerta con algún email fallido se reintenta, pero solo para los
+    # destinatarios que no la recibieron
+    entregadas = [(id_alert, intentos) for id_alert, intentos in incluidas.items() if id_alert not in errores]
+    with connection.cursor() as cursor:
+        if nuevas_entregas:
+            cursor.execute("""
+                UPDATE alert_outbox a
+                SET delivered_to = a.delivered_to || e.emails
+                FROM unnest(%s::bigint[], %s::jsonb[]) AS e(id_alert, emails)
+                WHERE a.id_alert = e.id_alert
+            """, [list(nuevas_entregas), [json.dumps(emails) for emails in nuevas_entregas.values()]])
+        if entregadas:
+            cursor.execute("""
+                UPDATE alert_outbox a
+                SET status = %s, attempts = e.intentos, sent_at = now()
+                FROM unnest(%s::bigint[], %s::int[]) AS e(id_alert, intentos)
+                WHERE a.id_alert = e.id_alert
+            """, [ENVIADA, [id_alert for id_alert, _ in entregadas], [intentos for _, intentos in entregadas]])
+        if descartadas:
+            cursor.execute("""
+                UPDATE alert_outbox
+                SET status = %s, last_error = 'Sin destinatarios para este nivel de alerta'
+                WHERE id_alert = ANY(%s)
+            """, [DESCARTADA, descartadas])
+    resultado['enviadas'] += len(entregadas)
+    resultado['descartadas'] += len(descartadas)
+
+    fallos = {}
+    for id_alert, (intentos, error) in errores.items():
+        fallos.setdefault((intentos, error), []).append(id_alert)
+    for (intentos, error), ids_alerta in fallos.items():
+        _registrar_fallo(ids_alerta, intentos, error, configuracion, resultado)
+
+    return resultado
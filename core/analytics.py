@@ -0,0 +1,168 @@
+"""
+Consultas de análisis (BI) por tienda.
+
+Todas las consultas filtran directamente por ``sales.id_store`` y unen
+``sales_bag`` y ``products`` por sus claves, en lugar de reunir primero en
+Python los IDs de venta de la tienda desde ``sales_movement`` y enviarlos de
+vuelta como ``ANY(%s)``: esa lista crecía sin límite con el historial. Los
+índices que usan estas consultas se crean en las migraciones 0006 y 0007.
+"""
+from django.db import connection
+
+from .stock_ledger import SQL_PENDIENTES_TIENDA
+
+
+# Consultas por tienda. Se exponen como constantes para que el comando
+# ``benchmark_analytics`` pueda comparar sus planes con los de la versión anterior.
+#
+# Las cantidades, ingresos y ganancias salen del precio y costo unitarios que
+# cada línea de ``sales_bag`` guarda al momento de la venta: se agregan primero
+# sobre ``sales``/``sales_bag`` y ``products`` solo se une al final para los
+# nombres y categorías de los productos ya agrupados.
+_VENTAS_POR_PRODUCTO = """
+    SELECT
+        sb.id_product,
+        SUM(sb.quantitity) AS total_vendido,
+        SUM(sb.unit_price * sb.quantitity) AS ingresos,
+        SUM((sb.unit_price - sb.unit_cost) * sb.quantitity) AS ganancia
+    FROM sales s
+    INNER JOIN sales_bag sb ON sb.id_sale = s.id_sale
+    WHERE s.id_store = %s AND s.state = true
+    GROUP BY sb.id_product
+"""
+
+SQL_PRODUCTOS_MAS_VENDIDOS = f"""
+    SELECT p.name, v.total_vendido, v.ingresos
+    FROM ({_VENTAS_POR_PRODUCTO}) v
+    INNER JOIN products p ON p.id_product = v.id_product
+    ORDER BY v.total_vendido DESC
+    LIMIT %s
+"""
+
+SQL_VENTAS_POR_CATEGORIA = f"""
+    SELECT p.category, SUM(v.total_vendido) AS total_vendido, SUM(v.ingresos) AS ingresos
+    FROM ({_VENTAS_POR_PRODUCTO}) v
+    INNER JOIN products p ON p.id_product = v.id_product
+    GROUP BY p.category
+    ORDER BY ingresos DESC
+"""
+
+SQL_VENTAS_POR_PRODUCTO = f"""
+    SELECT p.name, p.category, v.total_vendido, v.ingresos
+    FROM ({_VENTAS_POR_PRODUCTO}) v
+    INNER JOIN products p ON p.id_product = v.id_product
+"""
+
+SQL_ESTADO_INVENTARIO = f"""
+    SELECT
+        COUNT(*) FILTER (WHERE stock >= %(stock_bajo)s) AS disponibles,
+        COUNT(*) FILTER (WHERE stock > 0 AND stock < %(stock_bajo)s) AS stock_bajo,
+        COUNT(*) FILTER (WHERE stock = 0) AS agotados
+    FROM (
+        SELECT p.stock + COALESCE(m.delta, 0) AS stock
+        FROM products p
+        LEFT JOIN {SQL_PENDIENTES_TIENDA} m ON m.id_product = p.id_product
+        WHERE p.id_store = %(id_store)s AND p.status_product = true
+    ) p
+"""
+
+SQL_GANANCIA_POR_PRODUCTO = f"""
+    SELECT p.name, v.ganancia AS ganancia_total
+    FROM ({_VENTAS_POR_PRODUCTO}) v
+    INNER JOIN products p ON p.id_product = v.id_product
+    ORDER BY ganancia_total DESC
+"""
+
+SQL_VENTAS_PRODUCTO_POR_FECHA = """
+    SELECT s.date_sale, SUM(sb.quantitity) AS cantidad_vendida
+    FROM sales_bag sb
+    INNER JOIN sales s ON s.id_sale = sb.id_sale
+    WHERE sb.id_product = %s AND s.id_store = %s AND s.state = true
+    GROUP BY s.date_sale
+    ORDER BY s.date_sale
+"""
+
+
+def _consultar(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def productos_mas_vendidos(id_store, limite=10):
+    """
+    Productos con más unidades vendidas en ventas completadas
+
+    Returns:
+        list: Tuplas (nombre, cantidad vendida, ingresos)
+    """
+    return [
+        (nombre, float(cantidad), float(ingresos))
+        for nombre, cantidad, ingresos in _consultar(SQL_PRODUCTOS_MAS_VENDIDOS, [str(id_store), limite])
+    ]
+
+
+def ventas_por_categoria(id_store):
+    """
+    Unidades vendidas e ingresos por categoría de producto
+
+    Returns:
+        list: Tuplas (categoría, cantidad vendida, ingresos), de mayor a menor ingreso
+    """
+    return [
+        (categoria, float(cantidad), float(ingresos))
+        for categoria, cantidad, ingresos in _consultar(SQL_VENTAS_POR_CATEGORIA, [str(id_store)])
+    ]
+
+
+def ventas_por_producto(id_store):
+    """
+    Unidades vendidas e ingresos de cada producto vendido (sin orden)
+
+    Es la base común de ``productos_mas_vendidos`` y ``ventas_por_categoria``
+    cuando se necesitan ambos: los productos de una tienda son pocos, por lo
+    que agrupar por categoría en Python evita recorrer las ventas dos veces.
+
+    Returns:
+        list: Tuplas (nombre, categoría, cantidad vendida, ingresos)
+    """
+    return [
+        (nombre, categoria, float(cantidad), float(ingresos))
+        for nombre, categoria, cantidad, ingresos in _consultar(SQL_VENTAS_POR_PRODUCTO, [str(id_store)])
+    ]
+
+
+def estado_inventario(id_store, stock_bajo):
+    """
+    Cantidad de productos activos disponibles, con stock bajo y agotados
+
+    Returns:
+        tuple: (disponibles, stock bajo, agotados)
+    """
+    return _consultar(SQL_ESTADO_INVENTARIO, {'id_store': str(id_store), 'stock_bajo': stock_bajo})[0]
+
+
+def ganancia_por_producto(id_store):
+    """
+    Ganancia total por producto en ventas completadas
+
+    Returns:
+        list: Tuplas (nombre, ganancia total), de mayor a menor
+    """
+    return [
+        (nombre, float(ganancia))
+        for nombre, ganancia in _consultar(SQL_GANANCIA_POR_PRODUCTO, [str(id_store)])
+    ]
+
+
+def ventas_producto_por_fecha(id_store, id_product):
+    """
+    Unidades vendidas de un producto por fecha
+
+    Returns:
+        list: Tuplas (fecha, cantidad vendida), ordenadas por fecha
+    """
+    return [
+        (fecha, float(cantidad))
+        for fecha, cantidad in _consultar(SQL_VENTAS_PRODUCTO_POR_FECHA, [str(id_product), str(id_store)])
+    ]
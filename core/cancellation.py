@@ -0,0 +1,77 @@
+"""
+Cancelación de ventas con restauración de stock.
+
+Cancela una o muchas ventas de una tienda dentro de una sola transacción y
+con una cantidad fija de consultas:
+
+1. Marca como canceladas las ventas completadas indicadas, bloqueándolas en
+   orden de ``id_sale``. Las que ya estaban canceladas o no pertenecen a la
+   tienda se ignoran, por lo que repetir una cancelación no devuelve stock dos
+   veces.
+2. Devuelve al stock las cantidades de todas sus líneas agregando sus
+   movimientos al libro de stock con un único INSERT (ver
+   ``core/stock_ledger.py``); las filas de ``products`` no se bloquean. Los
+   productos que vuelven a superar el umbral de stock bajo rearman su alerta.
+3. Registra un movimiento de auditoría por venta y descuenta las ventas del
+   resumen diario.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+
+from . import alerts, chart_cache, rollups, stock_ledger
+
+
+def cancelar_ventas(id_store, user_id, ids_venta):
+    """
+    Cancela ventas completadas de una tienda y restaura su stock
+
+    Args:
+        id_store: UUID de la tienda
+        user_id: UUID del usuario que cancela (para la auditoría)
+        ids_venta (list): UUIDs de las ventas a cancelar
+
+    Returns:
+        list: IDs (str) de las ventas efectivamente canceladas
+    """
+    ids_venta = sorted({str(id_sale) for id_sale in ids_venta})
+    if not ids_venta:
+        return []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # 1. Cancelar solo las ventas completadas de la tienda
+        cursor.execute("""
+            WITH objetivo AS (
+                SELECT id_sale
+                FROM sales
+                WHERE id_sale = ANY(%s::uuid[]) AND id_store = %s AND state = TRUE
+                ORDER BY id_sale
+                FOR UPDATE
+            )
+            UPDATE sales s
+            SET state = FALSE
+            FROM objetivo o
+            WHERE s.id_sale = o.id_sale
+            RETURNING s.id_sale, s.id_store, s.date_sale, s.total, s.utility, s.items
+        """, [ids_venta, str(id_store)])
+        canceladas = cursor.fetchall()
+        if not canceladas:
+            return []
+
+        ids_canceladas = [str(fila[0]) for fila in canceladas]
+
+        # 2. Devolver al stock todas las líneas en una sola sentencia
+        productos = stock_ledger.registrar_devoluciones(cursor, ids_canceladas, user_id)
+        alerts.rearmar_alertas_stock(cursor, productos)
+
+        # 3. Auditoría y resumen diario
+        cursor.execute("""
+            INSERT INTO sales_movement (type_movement, type_action, date_movement, id_sale, id_user)
+            SELECT 'venta', 'eliminacion', %s, id_sale, %s
+            FROM unnest(%s::uuid[]) AS id_sale
+        """, [datetime.now(), str(user_id), ids_canceladas])
+
+        rollups.registrar_cancelaciones_en_rollup(cursor, [fila[1:] for fila in canceladas])
+        chart_cache.invalidar_tienda_al_confirmar(id_store)
+
+    return ids_canceladas
@@ -0,0 +1,125 @@
+"""
+Caché en memoria de los gráficos renderizados del dashboard.
+
+Cada fragmento se guarda por (tienda, gráfico) junto con la versión de datos
+de la tienda con la que se generó. Las escrituras de productos y ventas
+incrementan esa versión, por lo que el siguiente acceso vuelve a generar el
+gráfico. La versión vive en la base de datos (tabla ``data_version``, ver
+``core/versions.py``), de modo que una venta atendida por un proceso invalida
+los gráficos de todos los demás; el ETag de ``api_dashboard_bundle`` se arma
+con esta misma versión.
+
+Los fragmentos se guardan en memoria del proceso con un límite de entradas y
+de bytes, expulsando primero los menos usados (LRU).
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import versions
+
+
+class _CacheLRU:
+    """Diccionario acotado por cantidad de entradas y bytes, con expulsión LRU"""
+
+    def __init__(self, max_entradas, max_bytes):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, version, fragmento):
+        tamano = len(fragmento)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+            self._datos[clave] = (version, fragmento)
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, expulsado) = self._datos.popitem(last=False)
+                self._bytes -= len(expulsado)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+
+_fragmentos = _CacheLRU(
+    max_entradas=getattr(settings, 'GRAFICOS_CACHE_MAX_ENTRADAS', 256),
+    max_bytes=getattr(settings, 'GRAFICOS_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+)
+
+
+def _clave_version(id_store):
+    return f'datos_tienda:{id_store}'
+
+
+def version_datos(id_store):
+    """Devuelve la versión actual de los datos de una tienda"""
+    return versions.version(_clave_version(id_store))
+
+
+def invalidar_tienda(id_store):
+    """Incrementa la versión de datos de la tienda (invalida sus gráficos)"""
+    if not id_store:
+        return
+    versions.incrementar(_clave_version(id_store))
+
+
+def invalidar_tienda_al_confirmar(id_store):
+    """Invalida los gráficos de la tienda cuando se confirme la transacción actual"""
+    if not id_store:
+        return
+    versions.incrementar_al_confirmar(_clave_version(id_store))
+
+
+def obtener_vigente(id_store, nombre):
+    """
+    Busca el fragmento de un gráfico para la versión actual de la tienda
+
+    Returns:
+        tuple: (fragmento o None, versión actual). La versión debe pasarse a
+        ``guardar`` para no cachear un resultado bajo una versión más nueva
+        que la de los datos con que se generó.
+    """
+    version = version_datos(id_store)
+    guardado = _fragmentos.get((str(id_store), nombre))
+    if guardado is not None and guardado[0] == version:
+        return guardado[1], version
+    return None, version
+
+
+def guardar(id_store, nombre, version, fragmento):
+    """Guarda el fragmento de un gráfico generado con la versión indicada"""
+    _fragmentos.set((str(id_store), nombre), version, fragmento)
+
+
+def obtener_o_generar(id_store, nombre, generar):
+    """
+    Devuelve el fragmento cacheado de un gráfico o lo genera
+
+    Args:
+        id_store: UUID de la tienda
+        nombre (str): Identificador del gráfico
+        generar (callable): Función sin argumentos que devuelve el fragmento
+
+    Las excepciones de ``generar`` se propagan y el resultado no se cachea.
+    """
+    fragmento, version = obtener_vigente(id_store, nombre)
+    if fragmento is None:
+        fragmento = generar()
+        guardar(id_store, nombre, version, fragmento)
+    return fragmento
@@ -0,0 +1,161 @@
+"""
+Generación concurrente de los gráficos del dashboard.
+
+Cada gráfico se genera en dos fases (ver ``core/charts.py``): la carga de
+datos se ejecuta en un pool de hilos, cada uno con su propia conexión a la
+base de datos, y la construcción de la especificación se ejecuta en el mismo
+hilo o, si se configura ``'TIPO': 'procesos'``, en un pool de procesos que
+evita el GIL para el trabajo de CPU. Cada gráfico tiene un tiempo máximo; si
+se agota o la generación falla, se devuelve un gráfico de error, de modo que
+la latencia total es la del gráfico más lento y no la suma de todos.
+
+Un hilo que ya empezó no se puede cancelar, así que el tiempo máximo se
+aplica también al trabajo: las consultas de la carga de datos corren con
+``statement_timeout``, y un gráfico que se agota libera su hilo en lugar de
+dejarlo ocupado para las solicitudes siguientes. Los que aún esperaban en la
+cola del pool se cancelan.
+
+Los fragmentos del dashboard (``dashboard_grafico_view``) y las APIs de
+gráficos pasan por este módulo.
+
+Configuración (``settings.GRAFICOS_EJECUTOR``)::
+
+    {'TIPO': 'hilos' | 'procesos' | 'secuencial', 'TRABAJADORES': 4, 'TIMEOUT': 10}
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import chart_cache, charts
+
+
+_CONFIG_POR_DEFECTO = {'TIPO': 'hilos', 'TRABAJADORES': 4, 'TIMEOUT': 10}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _config():
+    return {**_CONFIG_POR_DEFECTO, **getattr(settings, 'GRAFICOS_EJECUTOR', {})}
+
+
+def _pool(tipo, trabajadores):
+    """Devuelve (creándolo una sola vez) el pool del tipo indicado"""
+    with _pools_lock:
+        if tipo not in _pools:
+            if tipo == 'procesos':
+                _pools[tipo] = ProcessPoolExecutor(
+                    max_workers=trabajadores,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    # Los hijos se inician con 'spawn': preparar Django antes de
+                    # recibir tareas (se pasa django.setup y no una función de
+                    # este módulo, cuya importación ya requiere los modelos)
+                    initializer=django.setup,
+                )
+            else:
+                _pools[tipo] = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix='graficos')
+        return _pools[tipo]
+
+
+def _cargar_datos(nombre, id_store, timeout):
+    """Carga los datos de un gráfico cortando las consultas que superen ``timeout``"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Equivale a SET LOCAL: vale solo hasta el final de esta transacción
+        cursor.execute(
+            "SELECT set_config('statement_timeout', %s, true)",
+            [f'{max(1, int(timeout * 1000))}ms'],
+        )
+        return charts.cargar_datos(nombre, id_store)
+
+
+def _generar_en_hilo(nombre, id_store, version, pool_procesos, limite):
+    """Carga los datos del gráfico y construye su JSON; lo guarda en la caché"""
+    try:
+        datos = _cargar_datos(nombre, id_store, limite - time.monotonic())
+    finally:
+        # Cada hilo del pool abre su propia conexión; liberarla al terminar
+        connection.close()
+
+    if pool_procesos is not None:
+        # La construcción solo recorre los datos ya cargados
+        fragmento = pool_procesos.submit(charts.construir_json, nombre, datos).result(
+            timeout=max(0, limite - time.monotonic())
+        )
+    else:
+        fragmento = charts.construir_json(nombre, datos)
+
+    chart_cache.guardar(id_store, nombre, version, fragmento)
+    return fragmento
+
+
+def generar_graficos(id_store, nombres):
+    """
+    Genera varios gráficos de una tienda en paralelo
+
+    Args:
+        id_store: UUID de la tienda
+        nombres (list): Nombres de gráficos de ``charts.GRAFICOS``
+
+    Returns:
+        dict: JSON de cada gráfico por nombre. Los que fallan o superan el
+        tiempo máximo se reemplazan por un gráfico de error.
+    """
+    config = _config()
+    timeout = config['TIMEOUT']
+    limite = time.monotonic() + timeout
+    resultados = {}
+    pendientes = {}
+
+    for nombre in nombres:
+        fragmento, version = chart_cache.obtener_vigente(id_store, nombre)
+        if fragmento is not None:
+            resultados[nombre] = fragmento
+        else:
+            pendientes[nombre] = version
+
+    if not pendientes:
+        return resultados
+
+    if config['TIPO'] == 'secuencial':
+        for nombre, version in pendientes.items():
+            try:
+                datos = _cargar_datos(nombre, id_store, limite - time.monotonic())
+                resultados[nombre] = charts.construir_json(nombre, datos)
+                chart_cache.guardar(id_store, nombre, version, resultados[nombre])
+            except Exception as e:
+                resultados[nombre] = charts.error_json(nombre, e)
+        return resultados
+
+    hilos = _pool('hilos', config['TRABAJADORES'])
+    procesos = _pool('procesos', config['TRABAJADORES']) if config['TIPO'] == 'procesos' else None
+
+    futuros = {
+        nombre: hilos.submit(_generar_en_hilo, nombre, id_store, version, procesos, limite)
+        for nombre, version in pendientes.items()
+    }
+
+    for nombre, futuro in futuros.items():
+        try:
+            resultados[nombre] = futuro.result(timeout=max(0, limite - time.monotonic()))
+        except FuturesTimeoutError:
+            # Solo cancela si aún no empezó; si ya corre, statement_timeout
+            # corta su consulta
+            futuro.cancel()
+            resultados[nombre] = charts.error_json(
+                nombre, TimeoutError(f'Tiempo agotado ({timeout}s)')
+            )
+        except Exception as e:
+            resultados[nombre] = charts.error_json(nombre, e)
+
+    return resultados
+
+
+def generar_grafico(id_store, nombre):
+    """JSON de un gráfico de la tienda, con el tiempo máximo del ejecutor"""
+    return generar_graficos(id_store, [nombre])[nombre]
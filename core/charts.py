@@ -0,0 +1,291 @@
+"""
+Especificaciones JSON de los gráficos del dashboard.
+
+Cada gráfico se describe como un diccionario ``{'data', 'layout', 'config'}``
+con arreglos columnares que el navegador dibuja con ``Plotly.newPlot``
+usando la copia de plotly.js que carga el dashboard. El servidor solo ejecuta
+una consulta y serializa los arreglos; no construye figuras de Plotly ni
+DataFrames de pandas.
+"""
+import json
+import traceback
+from itertools import accumulate
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import analytics, rollups, stock_ledger
+from .models import Products
+
+
+CONFIG = {'displayModeBar': False, 'responsive': True}
+
+# Escapes para poder incrustar el JSON dentro de un <script> sin riesgo
+_ESCAPES_HTML = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
+
+
+def _anotacion(texto, color='gray', size=16, con_borde=False):
+    anotacion = {
+        'text': texto,
+        'xref': 'paper', 'yref': 'paper',
+        'x': 0.5, 'y': 0.5, 'showarrow': False,
+        'font': {'size': size, 'color': color},
+    }
+    if con_borde:
+        anotacion.update({'bgcolor': 'white', 'bordercolor': 'gray', 'borderwidth': 2, 'borderpad': 10})
+    return anotacion
+
+
+def _spec_mensaje(texto, height=500, **kwargs):
+    """Gráfico sin datos que solo muestra un mensaje centrado"""
+    return {
+        'data': [],
+        'layout': {
+            'annotations': [_anotacion(texto, **kwargs)],
+            'xaxis': {'visible': False},
+            'yaxis': {'visible': False},
+            'height': height,
+            'plot_bgcolor': 'white',
+        },
+        'config': CONFIG,
+    }
+
+
+def spec_error(e):
+    """Gráfico de error con el mensaje de la excepción"""
+    return _spec_mensaje(f"Error al generar gráfico<br>{str(e)}", color='red', size=14)
+
+
+def _titulo(texto):
+    return {
+        'text': texto,
+        'font': {'size': 18, 'color': '#111827', 'family': 'Arial, sans-serif'},
+        'x': 0.5,
+        'xanchor': 'center',
+    }
+
+
+def _titulo_eje(texto):
+    return {'text': texto, 'font': {'size': 14, 'color': '#374151'}}
+
+
+def datos_stock_productos(id_store):
+    """Lista de (nombre, stock) de los productos activos, por nombre"""
+    return [
+        (nombre, float(stock))
+        for nombre, stock in stock_ledger.anotar_stock_actual(Products.objects.filter(
+            id_store=id_store,
+            status_product=True
+        )).values_list('name', 'stock_actual').order_by('name')
+    ]
+
+
+def spec_stock_productos(productos):
+    """Barras verticales de stock por producto"""
+    if not productos:
+        return _spec_mensaje("No hay productos<br>en el inventario")
+
+    nombres = [nombre for nombre, stock in productos]
+    stocks = [stock for nombre, stock in productos]
+
+    return {
+        'data': [{
+            'type': 'bar',
+            'x': nombres,
+            'y': stocks,
+            'marker': {
+                # Colores según nivel de stock
+                'color': ['#10b981' if s >= 10 else '#f59e0b' if s > 0 else '#ef4444' for s in stocks],
+                'line': {'color': 'white', 'width': 2},
+            },
+            'text': [int(s) for s in stocks],
+            'textposition': 'outside',
+            'textfont': {'size': 12, 'color': 'black'},
+            'hovertemplate': '<b>%{x}</b><br>Stock: %{y}<extra></extra>',
+        }],
+        'layout': {
+            'title': _titulo('Stock por Producto'),
+            'xaxis': {'title': _titulo_eje('Producto'), 'tickangle': -45, 'gridcolor': '#E5E7EB', 'showgrid': False},
+            'yaxis': {
+                'title': _titulo_eje('Stock Disponible'),
+                'gridcolor': '#E5E7EB',
+                'showgrid': True,
+                'rangemode': 'tozero',
+            },
+            'plot_bgcolor': 'white',
+            'paper_bgcolor': 'white',
+            'height': 700,
+            # Ancho dinámico: 80px por barra, mínimo 1600px
+            'width': max(1600, len(productos) * 80),
+            'autosize': False,
+            'margin': {'l': 80, 'r': 20, 't': 80, 'b': 150},
+            'hovermode': 'closest',
+        },
+        'config': CONFIG,
+    }
+
+
+def datos_precio_ventas_producto(id_store):
+    """Lista de (nombre, ganancia total) por producto, de mayor a menor"""
+    return analytics.ganancia_por_producto(id_store)
+
+
+def spec_precio_ventas_producto(rows):
+    """Barras de ganancia total por producto"""
+    if not rows:
+        return _spec_mensaje("No hay datos de ventas<br>para mostrar", height=700, con_borde=True)
+
+    nombres = [nombre for nombre, ganancia in rows]
+    ganancias = [ganancia for nombre, ganancia in rows]
+
+    return {
+        'data': [{
+            'type': 'bar',
+            'x': nombres,
+            'y': ganancias,
+            'marker': {
+                # Verde para ganancia positiva, rojo para negativa
+                'color': ['#10b981' if g >= 0 else '#ef4444' for g in ganancias],
+                'line': {'color': 'white', 'width': 2},
+            },
+            'text': [f'${g:,.0f}' for g in ganancias],
+            'textposition': 'outside',
+            'textfont': {'size': 12, 'color': 'black'},
+            'hovertemplate': '<b>%{x}</b><br>Ganancia: $%{y:,.0f}<extra></extra>',
+        }],
+        'layout': {
+            'title': dict(_titulo(f'Productos por Ganancia ({len(rows)} productos)'), y=0.98),
+            'xaxis': {'title': _titulo_eje('Producto'), 'tickangle': -45, 'gridcolor': '#E5E7EB', 'showgrid': False},
+            'yaxis': {
+                'title': _titulo_eje('Ganancia Total ($)'),
+                'gridcolor': '#E5E7EB',
+                'showgrid': True,
+                'tickformat': '$,.0f',
+            },
+            'hovermode': 'x unified',
+            'height': 700,
+            'width': max(1600, len(rows) * 80),
+            'autosize': False,
+            'plot_bgcolor': 'white',
+            'paper_bgcolor': 'white',
+            'margin': {'l': 80, 'r': 20, 't': 80, 'b': 150},
+        },
+        'config': CONFIG,
+    }
+
+
+def datos_historial_ganancias(id_store):
+    """Lista de (fecha ISO, total del día) desde el resumen diario"""
+    return [(dia.isoformat(), float(total)) for dia, total, cantidad in rollups.ventas_por_dia(id_store)]
+
+
+def spec_historial_ganancias(ventas):
+    """Líneas de ganancia diaria y acumulada"""
+    layout = {
+        'title': {'text': 'Historial de Ganancias en el Tiempo', 'font': {'size': 16, 'family': 'Arial Black'}, 'y': 0.98},
+        'xaxis': {'title': {'text': 'Fecha'}, 'tickangle': 45},
+        'yaxis': {'title': {'text': 'Ganancias ($)'}, 'tickformat': '$,.0f', 'side': 'left'},
+        'hovermode': 'x unified',
+        'height': 700,
+        'width': 1600,
+        'autosize': False,
+        'plot_bgcolor': 'white',
+        'paper_bgcolor': 'white',
+        'showlegend': True,
+        'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': -0.15, 'xanchor': 'left', 'x': 0},
+        'margin': {'l': 60, 'r': 60, 't': 80, 'b': 150},
+    }
+
+    if not ventas:
+        layout['annotations'] = [_anotacion("No hay historial de ventas<br>para mostrar", con_borde=True)]
+        return {'data': [], 'layout': layout, 'config': CONFIG}
+
+    fechas = [dia for dia, total in ventas]
+    ganancia_dia = [total for dia, total in ventas]
+
+    return {
+        'data': [
+            {
+                'type': 'scatter',
+                'x': fechas,
+                'y': list(accumulate(ganancia_dia)),
+                'mode': 'lines+markers',
+                'name': 'Ganancia Acumulada',
+                'line': {'color': '#8b5cf6', 'width': 3},
+                'marker': {'size': 8, 'color': '#8b5cf6', 'line': {'color': 'white', 'width': 2}},
+                'fill': 'tozeroy',
+                'fillcolor': 'rgba(139, 92, 246, 0.15)',
+                'hovertemplate': '<b>%{x|%Y-%m-%d}</b><br>Acumulada: $%{y:,.2f}<extra></extra>',
+            },
+            {
+                'type': 'scatter',
+                'x': fechas,
+                'y': ganancia_dia,
+                'mode': 'lines+markers',
+                'name': 'Ganancia del Día',
+                'line': {'color': '#10b981', 'width': 2.5},
+                'marker': {'size': 7, 'color': '#10b981', 'line': {'color': 'white', 'width': 1.5}},
+                'fill': 'tozeroy',
+                'fillcolor': 'rgba(16, 185, 129, 0.15)',
+                'hovertemplate': '<b>%{x|%Y-%m-%d}</b><br>Del día: $%{y:,.2f}<extra></extra>',
+            },
+        ],
+        'layout': layout,
+        'config': CONFIG,
+    }
+
+
+def spec_ventas_producto_por_fecha(datos=None):
+    """Gráfico vacío que el dashboard llena al elegir un producto"""
+    return {
+        'data': [],
+        'layout': {
+            'annotations': [_anotacion(
+                "Selecciona un producto del menú desplegable<br>para ver su historial de ventas",
+                con_borde=True,
+            )],
+            'title': _titulo('Ventas por Fecha - Selecciona un Producto'),
+            'xaxis': {'title': _titulo_eje('Fecha'), 'gridcolor': '#E5E7EB', 'showgrid': True},
+            'yaxis': {'title': _titulo_eje('Cantidad Vendida'), 'gridcolor': '#E5E7EB', 'showgrid': True},
+            'height': 700,
+            'width': 1600,
+            'autosize': False,
+            'plot_bgcolor': 'white',
+            'paper_bgcolor': 'white',
+            'margin': {'l': 80, 'r': 20, 't': 80, 'b': 80},
+        },
+        'config': CONFIG,
+    }
+
+
+# Gráficos del dashboard por nombre (usados en las URLs). Cada gráfico se
+# genera en dos fases: cargar los datos (consulta a la base de datos) y
+# construir la especificación (función pura sobre datos serializables), de
+# modo que la segunda fase pueda ejecutarse en otro proceso.
+GRAFICOS = {
+    'stock': (datos_stock_productos, spec_stock_productos),
+    'precio-ventas': (datos_precio_ventas_producto, spec_precio_ventas_producto),
+    'ganancias': (datos_historial_ganancias, spec_historial_ganancias),
+    'ventas-producto': (lambda id_store: None, spec_ventas_producto_por_fecha),
+}
+
+
+def a_json(spec):
+    """Serializa una especificación a JSON apto para incrustar en HTML"""
+    return json.dumps(spec, cls=DjangoJSONEncoder, separators=(',', ':')).translate(_ESCAPES_HTML)
+
+
+def cargar_datos(nombre, id_store):
+    """Primera fase: obtiene los datos del gráfico desde la base de datos"""
+    return GRAFICOS[nombre][0](id_store)
+
+
+def construir_json(nombre, datos):
+    """Segunda fase: construye y serializa la especificación del gráfico"""
+    return a_json(GRAFICOS[nombre][1](datos))
+
+
+def error_json(nombre, e):
+    """JSON del gráfico de error (registrando la excepción)"""
+    print(f"❌ Error generando gráfico {nombre}: {e}")
+    traceback.print_exc()
+    return a_json(spec_error(e))
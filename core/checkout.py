@@ -0,0 +1,422 @@
+"""
+Registro atómico de ventas (checkout).
+
+Una venta se registra con una cantidad fija de consultas, sin importar la
+cantidad de líneas, y todo dentro de una única transacción:
+
+1. Lee los productos vendidos y reserva su stock con los bloqueos
+   consultivos del libro de stock (ver ``core/stock_ledger.py``), tomados en
+   orden de ``id_product`` para que no se produzcan deadlocks.
+2. Rechaza la venta si algún producto no existe, está inactivo o no tiene
+   stock suficiente.
+3. Inserta la venta, todas sus líneas de ``sales_bag`` en un solo INSERT, y
+   descuenta el stock agregando sus movimientos al libro en otro INSERT, sin
+   actualizar la fila del producto.
+4. Registra el movimiento de auditoría, actualiza el resumen diario y deja
+   en la bandeja de salida (ver ``core/alerts.py``) las alertas de los
+   productos que quedaron con stock bajo.
+
+Cada línea guarda el precio de venta y el costo unitarios del producto al
+momento de la venta, y la utilidad de la venta se calcula al registrarla.
+
+Si cualquier paso falla, la transacción se revierte completa.
+
+``registrar_ventas_lote`` aplica el mismo proceso a cientos de ventas de una
+caja a la vez (p. ej. al reconectarse), con sentencias de varias filas y una
+clave de idempotencia por venta para que los reintentos no las dupliquen.
+"""
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from . import alerts, chart_cache, rollups, stock_ledger
+from .metrics import STOCK_BAJO
+
+
+class VentaInvalida(ValueError):
+    """Los datos de la venta no son válidos (productos, cantidades o pago)"""
+
+
+class StockInsuficiente(VentaInvalida):
+    """Alguna línea dejaría el stock de un producto en negativo"""
+
+    def __init__(self, faltantes):
+        # faltantes: lista de (nombre, stock disponible, cantidad pedida)
+        self.faltantes = faltantes
+        detalle = ', '.join(
+            f'{nombre} (disponible {stock:g}, pedido {cantidad:g})' for nombre, stock, cantidad in faltantes
+        )
+        super().__init__(f'Stock insuficiente: {detalle}')
+
+
+@dataclass
+class VentaRegistrada:
+    id_sale: str
+    fecha: object
+    total: Decimal
+    utilidad: Decimal
+    items: Decimal
+    # (id_product, nombre, stock restante) de los productos que quedaron con stock bajo
+    productos_stock_bajo: list = field(default_factory=list)
+
+
+def _agrupar_lineas(lineas):
+    """
+    Normaliza las líneas recibidas del formulario
+
+    Args:
+        lineas (list): Diccionarios con ``id_product`` y ``quantity``
+
+    Returns:
+        OrderedDict: cantidad por id_product (str), ordenado por id_product
+    """
+    cantidades = {}
+    for linea in lineas:
+        try:
+            id_product = str(uuid.UUID(str(linea['id_product'])))
+            cantidad = Decimal(str(linea['quantity']))
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise VentaInvalida('Línea de venta inválida')
+        if cantidad <= 0:
+            raise VentaInvalida('Las cantidades deben ser mayores que cero')
+        # Un mismo producto en varias líneas se descuenta una sola vez
+        cantidades[id_product] = cantidades.get(id_product, Decimal('0')) + cantidad
+
+    if not cantidades:
+        raise VentaInvalida('Debes agregar al menos un producto a la venta')
+    return OrderedDict(sorted(cantidades.items()))
+
+
+def _valores(filas, tipos):
+    """Arma ``VALUES (%s::tipo, ...), ...`` y sus parámetros para una lista de tuplas"""
+    fila_sql = '(' + ', '.join(f'%s::{tipo}' for tipo in tipos) + ')'
+    params = []
+    for fila in filas:
+        params.extend(fila)
+    return ', '.join([fila_sql] * len(filas)), params
+
+
+def registrar_venta(id_store, user_id, lineas, metodo_pago, fecha=None):
+    """
+    Registra una venta completa de forma atómica
+
+    Args:
+        id_store: UUID de la tienda
+        user_id: UUID del usuario que registra la venta
+        lineas (list): Diccionarios con ``id_product`` y ``quantity``. El
+            precio se toma del producto bloqueado, no del formulario.
+        metodo_pago (str): Método de pago
+        fecha (date): Fecha de la venta (por defecto, hoy)
+
+    Returns:
+        VentaRegistrada
+
+    Raises:
+        VentaInvalida: Datos inválidos o productos inexistentes en la tienda
+        StockInsuficiente: Alguna línea supera el stock disponible
+    """
+    cantidades = _agrupar_lineas(lineas)
+    if not metodo_pago:
+        raise VentaInvalida('Debes seleccionar un método de pago')
+
+    fecha = fecha or datetime.now().date()
+    id_store = str(id_store)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # 1. Leer los productos y reservar su stock
+        cursor.execute("""
+            SELECT id_product, name, price_sale, price_buy
+            FROM products
+            WHERE id_product = ANY(%s::uuid[]) AND id_store = %s AND status_product = true
+        """, [list(cantidades), id_store])
+        productos = {str(fila[0]): fila[1:] for fila in cursor.fetchall()}
+
+        # 2. Validar existencia y stock
+        if len(productos) != len(cantidades):
+            raise VentaInvalida('Algún producto no existe, está inactivo o no pertenece a tu tienda')
+
+        stock = stock_ledger.reservar_stock(cursor, cantidades)
+        faltantes = [
+            (productos[id_product][0], stock[id_product], cantidad)
+            for id_product, cantidad in cantidades.items()
+            if stock[id_product] < cantidad
+        ]
+        if faltantes:
+            raise StockInsuficiente(faltantes)
+
+        total = sum(productos[id_product][1] * cantidad for id_product, cantidad in cantidades.items())
+        utilidad = sum(
+            (productos[id_product][1] - productos[id_product][2]) * cantidad
+            for id_product, cantidad in cantidades.items()
+        )
+        items = sum(cantidades.values())
+
+        # 3. Venta, líneas y stock
+        cursor.execute("""
+            INSERT INTO sales (date_sale, items, total, pay_method, state, utility, id_store)
+            VALUES (%s, %s, %s, %s, true, %s, %s)
+            RETURNING id_sale
+        """, [fecha, items, total, metodo_pago, utilidad, id_store])
+        id_sale = str(cursor.fetchone()[0])
+
+        valores, params = _valores(
+            [
+                (id_sale, id_product, cantidad, productos[id_product][1], productos[id_product][2])
+                for id_product, cantidad in cantidades.items()
+            ],
+            ('uuid', 'uuid', 'numeric', 'numeric', 'numeric'),
+        )
+        cursor.execute(f"""
+            INSERT INTO sales_bag (id_sale, id_product, quantitity, unit_price, unit_cost)
+            VALUES {valores}
+        """, params)
+
+        stock_ledger.registrar_movimientos(cursor, [
+            (id_product, id_store, -cantidad, 'venta', id_sale, user_id)
+            for id_product, cantidad in cantidades.items()
+        ])
+
+        # 4. Auditoría y resumen diario
+        cursor.execute("""
+            INSERT INTO sales_movement (type_movement, type_action, date_movement, id_sale, id_user)
+            VALUES ('venta', 'creacion', %s, %s, %s)
+        """, [datetime.now(), id_sale, str(user_id)])
+
+        rollups.registrar_venta_en_rollup(cursor, id_store, fecha, total, utilidad, items)
+
+        productos_stock_bajo = [
+            (id_product, productos[id_product][0], stock[id_product] - cantidad)
+            for id_product, cantidad in cantidades.items()
+            if stock[id_product] - cantidad < STOCK_BAJO
+        ]
+        alerts.encolar_alertas_stock_bajo(cursor, id_store, user_id, productos_stock_bajo)
+        chart_cache.invalidar_tienda_al_confirmar(id_store)
+
+    return VentaRegistrada(
+        id_sale=id_sale,
+        fecha=fecha,
+        total=total,
+        utilidad=utilidad,
+        items=items,
+        productos_stock_bajo=productos_stock_bajo,
+    )
+
+
+# =====================================================
+# VENTAS EN LOTE (CAJAS)
+# =====================================================
+
+def _validar_venta_lote(venta):
+    """
+    Valida una venta recibida en lote
+
+    Returns:
+        tuple: (clave, cantidades, metodo_pago, fecha)
+    """
+    if not isinstance(venta, dict):
+        raise VentaInvalida('Cada venta debe ser un objeto JSON')
+
+    clave = venta.get('clave')
+    if not isinstance(clave, str) or not clave.strip() or len(clave) > 200:
+        raise VentaInvalida('clave es obligatoria (texto de hasta 200 caracteres)')
+
+    productos = venta.get('productos')
+    if not isinstance(productos, list):
+        raise VentaInvalida('productos debe ser una lista')
+    cantidades = _agrupar_lineas(productos)
+
+    metodo_pago = str(venta.get('metodo_pago') or '').strip()
+    if not metodo_pago:
+        raise VentaInvalida('Debes seleccionar un método de pago')
+
+    fecha = datetime.now().date()
+    if venta.get('fecha'):
+        try:
+            fecha = date.fromisoformat(str(venta['fecha']))
+        except ValueError:
+            raise VentaInvalida('fecha debe tener el formato AAAA-MM-DD')
+        if fecha > datetime.now().date():
+            raise VentaInvalida('fecha no puede ser futura')
+
+    return clave.strip(), cantidades, metodo_pago, fecha
+
+
+def registrar_ventas_lote(id_store, user_id, ventas):
+    """
+    Registra un lote de ventas de una caja en una sola transacción
+
+    Cada venta es un diccionario ``{'clave', 'productos', 'metodo_pago',
+    'fecha'}``; ``clave`` la genera la caja y es única por tienda: si ya se
+    registró una venta con esa clave, no se vuelve a registrar y se devuelve
+    la venta existente. Las ventas inválidas o sin stock se rechazan una por
+    una sin afectar al resto del lote. El stock se asigna a las ventas en el
+    orden en que llegan.
+
+    Las alertas de los productos que quedan con stock bajo se agregan a la
+    bandeja de salida en la misma transacción.
+
+    Returns:
+        list: Un diccionario por venta, en el mismo orden, con ``clave``,
+        ``estado`` ('creada', 'existente' o 'rechazada'), ``id_sale`` y
+        ``error``.
+    """
+    id_store = str(id_store)
+    resultados = [{'clave': None, 'estado': None, 'id_sale': None, 'error': None} for _ in ventas]
+    validas = {}  # clave -> (índice, cantidades, metodo_pago, fecha)
+
+    for indice, venta in enumerate(ventas):
+        resultado = resultados[indice]
+        try:
+            clave, cantidades, metodo_pago, fecha = _validar_venta_lote(venta)
+        except VentaInvalida as e:
+            resultado['clave'] = venta.get('clave') if isinstance(venta, dict) else None
+            resultado.update(estado='rechazada', error=str(e))
+            continue
+        resultado['clave'] = clave
+        if clave in validas:
+            resultado.update(estado='rechazada', error='clave repetida dentro del lote')
+            continue
+        validas[clave] = (indice, cantidades, metodo_pago, fecha)
+
+    if not validas:
+        return resultados
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # 1. Reservar las claves. Si otra solicitud con las mismas claves está en
+        #    curso, el INSERT espera a que termine y luego las omite.
+        ids_nuevos = {clave: str(uuid.uuid4()) for clave in validas}
+        valores, params = _valores(
+            [(id_store, clave, id_sale) for clave, id_sale in ids_nuevos.items()],
+            ('uuid', 'text', 'uuid'),
+        )
+        cursor.execute(f"""
+            INSERT INTO sale_ingest_key (id_store, idempotency_key, id_sale)
+            VALUES {valores}
+            ON CONFLICT (id_store, idempotency_key) DO NOTHING
+            RETURNING idempotency_key
+        """, params)
+        reservadas = {fila[0] for fila in cursor.fetchall()}
+
+        existentes = [clave for clave in validas if clave not in reservadas]
+        if existentes:
+            cursor.execute("""
+                SELECT idempotency_key, id_sale
+                FROM sale_ingest_key
+                WHERE id_store = %s AND idempotency_key = ANY(%s)
+            """, [id_store, existentes])
+            for clave, id_sale in cursor.fetchall():
+                resultados[validas[clave][0]].update(estado='existente', id_sale=str(id_sale))
+
+        pendientes = [(clave, *validas[clave][1:]) for clave in validas if clave in reservadas]
+
+        # 2. Catálogo y stock de todos los productos del lote
+        ids_producto = sorted({id_product for _, cantidades, _, _ in pendientes for id_product in cantidades})
+        productos = {}
+        stock = {}
+        if ids_producto:
+            cursor.execute("""
+                SELECT id_product, name, price_sale, price_buy
+                FROM products
+                WHERE id_product = ANY(%s::uuid[]) AND id_store = %s AND status_product = true
+            """, [ids_producto, id_store])
+            productos = {str(fila[0]): fila[1:] for fila in cursor.fetchall()}
+
+            pedido = {}
+            for _, cantidades, _, _ in pendientes:
+                for id_product, cantidad in cantidades.items():
+                    if id_product in productos:
+                        pedido[id_product] = pedido.get(id_product, Decimal('0')) + cantidad
+            if pedido:
+                stock = stock_ledger.reservar_stock(cursor, pedido)
+
+        # 3. Asignar el stock venta por venta, en orden de llegada
+        aceptadas = []
+        rechazadas = []
+        for clave, cantidades, metodo_pago, fecha in pendientes:
+            resultado = resultados[validas[clave][0]]
+            if any(id_product not in productos for id_product in cantidades):
+                resultado.update(
+                    estado='rechazada',
+                    error='Algún producto no existe, está inactivo o no pertenece a tu tienda'
+                )
+                rechazadas.append(clave)
+                continue
+            faltantes = [
+                (productos[id_product][0], stock[id_product], cantidad)
+                for id_product, cantidad in cantidades.items()
+                if stock[id_product] < cantidad
+            ]
+            if faltantes:
+                resultado.update(estado='rechazada', error=str(StockInsuficiente(faltantes)))
+                rechazadas.append(clave)
+                continue
+            for id_product, cantidad in cantidades.items():
+                stock[id_product] -= cantidad
+            aceptadas.append((clave, ids_nuevos[clave], cantidades, metodo_pago, fecha))
+
+        # Liberar las claves rechazadas para que la caja pueda reintentar corregida
+        if rechazadas:
+            cursor.execute("""
+                DELETE FROM sale_ingest_key
+                WHERE id_store = %s AND idempotency_key = ANY(%s)
+            """, [id_store, rechazadas])
+
+        if not aceptadas:
+            return resultados
+
+        # 4. Ventas, líneas, movimientos de stock, auditoría y resumen diario
+        ventas_sql = []
+        lineas_sql = []
+        movimientos = []
+        resumen = []
+        for clave, id_sale, cantidades, metodo_pago, fecha in aceptadas:
+            total = sum(productos[id_product][1] * cantidad for id_product, cantidad in cantidades.items())
+            utilidad = sum(
+                (productos[id_product][1] - productos[id_product][2]) * cantidad
+                for id_product, cantidad in cantidades.items()
+            )
+            items = sum(cantidades.values())
+            ventas_sql.append((id_sale, fecha, items, total, metodo_pago, True, utilidad, id_store))
+            for id_product, cantidad in cantidades.items():
+                lineas_sql.append((id_sale, id_product, cantidad, productos[id_product][1], productos[id_product][2]))
+                movimientos.append((id_product, id_store, -cantidad, 'venta', id_sale, user_id))
+            resumen.append((id_store, fecha, total, utilidad, items, 1, 0))
+            resultados[validas[clave][0]].update(estado='creada', id_sale=id_sale)
+
+        valores, params = _valores(
+            ventas_sql, ('uuid', 'date', 'numeric', 'numeric', 'text', 'boolean', 'numeric', 'uuid')
+        )
+        cursor.execute(f"""
+            INSERT INTO sales (id_sale, date_sale, items, total, pay_method, state, utility, id_store)
+            VALUES {valores}
+        """, params)
+
+        valores, params = _valores(lineas_sql, ('uuid', 'uuid', 'numeric', 'numeric', 'numeric'))
+        cursor.execute(f"""
+            INSERT INTO sales_bag (id_sale, id_product, quantitity, unit_price, unit_cost)
+            VALUES {valores}
+        """, params)
+
+        stock_ledger.registrar_movimientos(cursor, movimientos)
+
+        cursor.execute("""
+            INSERT INTO sales_movement (type_movement, type_action, date_movement, id_sale, id_user)
+            SELECT 'venta', 'creacion', %s, id_sale, %s
+            FROM unnest(%s::uuid[]) AS id_sale
+        """, [datetime.now(), str(user_id), [id_sale for _, id_sale, _, _, _ in aceptadas]])
+
+        rollups.actualizar_rollup(cursor, resumen)
+
+        vendidos = {id_product for _, _, cantidades, _, _ in aceptadas for id_product in cantidades}
+        alerts.encolar_alertas_stock_bajo(cursor, id_store, user_id, [
+            (id_product, productos[id_product][0], stock[id_product])
+            for id_product in sorted(vendidos)
+            if stock[id_product] < STOCK_BAJO
+        ])
+        chart_cache.invalidar_tienda_al_confirmar(id_store)
+
+    return resultados
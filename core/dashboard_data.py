@@ -0,0 +1,152 @@
+"""
+Datos de los gráficos BI del dashboard.
+
+Cada ``formato_*`` arma el diccionario que devuelve la API correspondiente
+(``api_ventas_por_dia``, ``api_ventas_por_mes``, etc.) a partir de filas ya
+consultadas, de modo que las APIs individuales y el paquete
+``/api/dashboard-bundle/`` devuelven exactamente la misma forma.
+
+``paquete_dashboard`` arma todos los conjuntos con tres consultas: el resumen
+diario del último año (del que salen ventas por día, por mes y la comparación
+de períodos), las ventas por producto (de las que salen el top de productos y
+las ventas por categoría) y el estado del inventario.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from . import analytics, rollups
+from .metrics import STOCK_BAJO
+
+
+DIAS_VENTAS_POR_DIA = 30
+DIAS_VENTAS_POR_MES = 365
+LIMITE_PRODUCTOS_MAS_VENDIDOS = 10
+
+
+def formato_ventas_por_dia(filas):
+    """filas: (día, total, cantidad_ventas)"""
+    return {
+        'labels': [dia.strftime('%d/%m') for dia, total, cantidad in filas],
+        'ventas': [float(total) for dia, total, cantidad in filas],
+        'cantidad': [int(cantidad) for dia, total, cantidad in filas]
+    }
+
+
+def formato_ventas_por_mes(filas):
+    """filas: (primer día del mes, total, cantidad_ventas)"""
+    return {
+        'labels': [mes.strftime('%B %Y') for mes, total, cantidad in filas],
+        'ventas': [float(total) for mes, total, cantidad in filas],
+        'cantidad': [int(cantidad) for mes, total, cantidad in filas]
+    }
+
+
+def formato_productos_mas_vendidos(productos):
+    """productos: (nombre, cantidad vendida, ingresos)"""
+    return {
+        'labels': [nombre for nombre, cantidad, ingresos in productos],
+        'cantidades': [cantidad for nombre, cantidad, ingresos in productos],
+        'ingresos': [ingresos for nombre, cantidad, ingresos in productos]
+    }
+
+
+def formato_ventas_por_categoria(categorias):
+    """categorias: (categoría, cantidad vendida, ingresos)"""
+    return {
+        'labels': [categoria for categoria, cantidad, ingresos in categorias],
+        'cantidades': [cantidad for categoria, cantidad, ingresos in categorias],
+        'ingresos': [ingresos for categoria, cantidad, ingresos in categorias]
+    }
+
+
+def formato_estado_inventario(disponibles, stock_bajo, agotados):
+    return {
+        'labels': ['Disponible', 'Stock Bajo', 'Agotado'],
+        'valores': [disponibles, stock_bajo, agotados],
+        'colores': ['#10b981', '#f59e0b', '#ef4444']
+    }
+
+
+def formato_comparacion_periodos(mes_anterior, mes_actual):
+    """mes_anterior, mes_actual: {'total', 'cantidad'}"""
+    return {
+        'labels': ['Mes Anterior', 'Mes Actual'],
+        'ventas': [
+            float(mes_anterior['total'] or 0),
+            float(mes_actual['total'] or 0)
+        ],
+        'cantidad': [
+            mes_anterior['cantidad'] or 0,
+            mes_actual['cantidad'] or 0
+        ]
+    }
+
+
+def limites_comparacion(hoy):
+    """Devuelve (inicio mes actual, inicio mes anterior, fin mes anterior)"""
+    primer_dia_mes_actual = hoy.replace(day=1)
+    ultimo_dia_mes_anterior = primer_dia_mes_actual - timedelta(days=1)
+    return primer_dia_mes_actual, ultimo_dia_mes_anterior.replace(day=1), ultimo_dia_mes_anterior
+
+
+def _totales(filas, desde, hasta=None):
+    total = 0
+    cantidad = 0
+    for dia, total_dia, cantidad_dia in filas:
+        if dia >= desde and (hasta is None or dia <= hasta):
+            total += total_dia
+            cantidad += cantidad_dia
+    return {'total': total, 'cantidad': int(cantidad)}
+
+
+def _agrupar_por_mes(filas):
+    meses = defaultdict(lambda: [0, 0])
+    for dia, total, cantidad in filas:
+        mes = meses[dia.replace(day=1)]
+        mes[0] += total
+        mes[1] += cantidad
+    return [(mes, total, cantidad) for mes, (total, cantidad) in sorted(meses.items())]
+
+
+def _agrupar_por_categoria(productos):
+    categorias = defaultdict(lambda: [0.0, 0.0])
+    for nombre, categoria, cantidad, ingresos in productos:
+        fila = categorias[categoria]
+        fila[0] += cantidad
+        fila[1] += ingresos
+    return sorted(
+        ((categoria, cantidad, ingresos) for categoria, (cantidad, ingresos) in categorias.items()),
+        key=lambda fila: fila[2],
+        reverse=True,
+    )
+
+
+def paquete_dashboard(id_store, hoy):
+    """
+    Todos los conjuntos de datos BI del dashboard en un solo diccionario
+
+    Las claves coinciden con los nombres de las APIs individuales.
+    """
+    # Resumen diario del último año: alcanza también para el mes anterior
+    filas = rollups.ventas_por_dia(id_store, desde=hoy - timedelta(days=DIAS_VENTAS_POR_MES))
+    inicio_ventas_por_dia = hoy - timedelta(days=DIAS_VENTAS_POR_DIA)
+    inicio_mes_actual, inicio_mes_anterior, fin_mes_anterior = limites_comparacion(hoy)
+
+    productos = analytics.ventas_por_producto(id_store)
+    mas_vendidos = sorted(
+        ((nombre, cantidad, ingresos) for nombre, categoria, cantidad, ingresos in productos),
+        key=lambda fila: fila[1],
+        reverse=True,
+    )[:LIMITE_PRODUCTOS_MAS_VENDIDOS]
+
+    return {
+        'ventas_por_dia': formato_ventas_por_dia([f for f in filas if f[0] >= inicio_ventas_por_dia]),
+        'ventas_por_mes': formato_ventas_por_mes(_agrupar_por_mes(filas)),
+        'productos_mas_vendidos': formato_productos_mas_vendidos(mas_vendidos),
+        'ventas_por_categoria': formato_ventas_por_categoria(_agrupar_por_categoria(productos)),
+        'estado_inventario': formato_estado_inventario(*analytics.estado_inventario(id_store, STOCK_BAJO)),
+        'comparacion_periodos': formato_comparacion_periodos(
+            _totales(filas, inicio_mes_anterior, fin_mes_anterior),
+            _totales(filas, inicio_mes_actual),
+        ),
+    }
@@ -0,0 +1,169 @@
+"""
+Almacén de imágenes de productos direccionado por contenido.
+
+Las imágenes se guardan como archivos cuyo nombre es el SHA-256 de su
+contenido (``<raíz>/ab/cd/abcd...``), y ``products.image_sha256`` guarda solo
+esa referencia. Dos productos con la misma imagen comparten el archivo, y un
+archivo nunca cambia después de escrito, por lo que puede cachearse sin
+límite. La raíz se configura con ``settings.IMAGENES_PRODUCTOS_DIR``.
+Cuando ningún producto referencia un archivo se borra (ver
+``thumbnails.eliminar_si_no_referenciada``).
+
+La columna ``products.image`` (bytea) queda solo para las imágenes que aún
+no se movieron con el comando ``migrar_imagenes``; ``mover_imagen_de_fila``
+mueve una sola la primera vez que se pide.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+_BLOQUE = 64 * 1024
+
+
+def raiz():
+    return str(getattr(settings, 'IMAGENES_PRODUCTOS_DIR', settings.BASE_DIR / 'media' / 'productos'))
+
+
+def ruta_imagen(sha256):
+    """Ruta del archivo de una imagen; ValueError si la referencia no es válida"""
+    if not sha256 or not _SHA256.match(sha256):
+        raise ValueError('Referencia de imagen inválida')
+    return os.path.join(raiz(), sha256[:2], sha256[2:4], sha256)
+
+
+def _bloques(origen):
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        datos = bytes(origen)
+        for inicio in range(0, len(datos), _BLOQUE):
+            yield datos[inicio:inicio + _BLOQUE]
+    elif hasattr(origen, 'chunks'):
+        # UploadedFile de Django: se lee por partes sin cargarlo entero en memoria
+        yield from origen.chunks(_BLOQUE)
+    else:
+        while True:
+            bloque = origen.read(_BLOQUE)
+            if not bloque:
+                return
+            yield bloque
+
+
+def guardar_imagen(origen):
+    """
+    Guarda una imagen y devuelve su SHA-256
+
+    Args:
+        origen: bytes, archivo subido o archivo abierto en modo binario
+
+    Returns:
+        str: SHA-256 (hex) del contenido, la referencia a guardar en
+        ``products.image_sha256``
+    """
+    os.makedirs(raiz(), exist_ok=True)
+    resumen = hashlib.sha256()
+
+    # Escribir en un temporal dentro de la raíz para que el rename sea atómico
+    descriptor, temporal = tempfile.mkstemp(dir=raiz(), prefix='.subida-')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            for bloque in _bloques(origen):
+                resumen.update(bloque)
+                archivo.write(bloque)
+
+        sha256 = resumen.hexdigest()
+        destino = ruta_imagen(sha256)
+        if os.path.exists(destino):
+            return sha256  # misma imagen ya guardada
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, destino)
+        return sha256
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def mover_imagen_de_fila(id_product):
+    """
+    Mueve al almacén la imagen que un producto aún guarda en ``products.image``
+
+    Returns:
+        str: SHA-256 de la imagen del producto, o None si no tiene imagen
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT image_sha256, image FROM products
+            WHERE id_product = %s
+            FOR UPDATE
+        """, [str(id_product)])
+        fila = cursor.fetchone()
+        if not fila:
+            return None
+        sha256, imagen = fila
+        if sha256 or imagen is None:
+            return sha256  # ya la movió otra solicitud, o no tiene imagen
+
+        sha256 = guardar_imagen(imagen)
+        cursor.execute(
+            "UPDATE products SET image_sha256 = %s, image = NULL WHERE id_product = %s",
+            [sha256, str(id_product)],
+        )
+    return sha256
+
+
+def anotar_tiene_imagen(productos):
+    """Agrega ``tiene_imagen`` a un queryset de Products sin leer la columna bytea"""
+    return productos.annotate(tiene_imagen=ExpressionWrapper(
+        Q(image_sha256__isnull=False) | Q(image__isnull=False),
+        output_field=BooleanField(),
+    ))
+
+
+def tipo_contenido(cabecera):
+    """
+    Deduce el content type de una imagen por sus primeros bytes
+
+    Las imágenes se subieron sin validar el formato, así que no se puede
+    suponer JPEG; lo desconocido se sirve como binario genérico.
+    """
+    cabecera = bytes(cabecera[:16])
+    if cabecera.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if cabecera.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if cabecera[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'image/webp'
+    if cabecera[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    if cabecera.startswith(b'BM'):
+        return 'image/bmp'
+    return 'application/octet-stream'
+
+
+def tipo_contenido_archivo(archivo):
+    """Como ``tipo_contenido``, leyendo la cabecera de un archivo abierto sin moverlo"""
+    posicion = archivo.tell()
+    cabecera = archivo.read(16)
+    archivo.seek(posicion)
+    return tipo_contenido(cabecera)
+
+
+def abrir_imagen(sha256):
+    """Abre el archivo de una imagen en modo binario; FileNotFoundError si no existe"""
+    return open(ruta_imagen(sha256), 'rb')
+
+
+def eliminar_imagen(sha256):
+    """Borra el archivo de una imagen; debe llamarse solo si ningún producto la referencia"""
+    try:
+        os.remove(ruta_imagen(sha256))
+    except FileNotFoundError:
+        pass
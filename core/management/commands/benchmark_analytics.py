@@ -0,0 +1,169 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import analytics
+
+
+# Versión anterior: los IDs de venta de la tienda se reunían desde
+# sales_movement y se enviaban de vuelta como parámetro de ANY(%s)
+SQL_IDS_VENTAS_ANTERIOR = """
+    SELECT DISTINCT sm.id_sale
+    FROM sales_movement sm
+    INNER JOIN users u ON u.id_user = sm.id_user
+    WHERE u.id_store = %s AND sm.type_movement = 'venta'
+"""
+
+SQL_PRODUCTOS_MAS_VENDIDOS_ANTERIOR = """
+    SELECT p.name, SUM(sb.quantitity) as total_vendido, SUM(s.total) as ingresos
+    FROM sales_bag sb
+    INNER JOIN products p ON sb.id_product = p.id_product
+    INNER JOIN sales s ON sb.id_sale = s.id_sale
+    WHERE s.id_sale = ANY(%s) AND s.state = true
+    GROUP BY p.id_product, p.name
+    ORDER BY total_vendido DESC
+    LIMIT 10
+"""
+
+SQL_VENTAS_POR_CATEGORIA_ANTERIOR = """
+    SELECT p.category, SUM(sb.quantitity) as total_vendido, SUM(s.total) as ingresos
+    FROM sales_bag sb
+    INNER JOIN products p ON sb.id_product = p.id_product
+    INNER JOIN sales s ON sb.id_sale = s.id_sale
+    WHERE s.id_sale = ANY(%s) AND s.state = true
+    GROUP BY p.category
+    ORDER BY ingresos DESC
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los planes de las consultas BI anteriores (lista de IDs de venta) '
+        'con las consultas por tienda de core/analytics.py sobre datos generados. '
+        'Los datos se generan dentro de una transacción que se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', type=int, default=2_000_000, help='Ventas a generar en la tienda medida')
+        parser.add_argument('--productos', type=int, default=500, help='Productos de la tienda medida')
+        parser.add_argument(
+            '--otras-tiendas',
+            type=int,
+            default=4,
+            help='Tiendas adicionales con la misma cantidad de ventas (para que el filtro por tienda importe)',
+        )
+        parser.add_argument('--planes', action='store_true', help='Muestra los planes completos de EXPLAIN')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                inicio = time.perf_counter()
+                id_store = self._generar_tienda(cursor, options['ventas'], options['productos'])
+                for _ in range(options['otras_tiendas']):
+                    self._generar_tienda(cursor, options['ventas'], options['productos'])
+                cursor.execute('ANALYZE stores, users, products, sales, sales_bag, sales_movement')
+                self.stdout.write(
+                    f'Datos generados en {time.perf_counter() - inicio:.1f}s '
+                    f'({options["ventas"]:,} ventas x {options["otras_tiendas"] + 1} tiendas)'
+                )
+
+                comparaciones = [
+                    ('Productos más vendidos', SQL_PRODUCTOS_MAS_VENDIDOS_ANTERIOR,
+                     analytics.SQL_PRODUCTOS_MAS_VENDIDOS, [id_store, 10]),
+                    ('Ventas por categoría', SQL_VENTAS_POR_CATEGORIA_ANTERIOR,
+                     analytics.SQL_VENTAS_POR_CATEGORIA, [id_store]),
+                ]
+                for titulo, sql_anterior, sql_nuevo, params in comparaciones:
+                    self._comparar(cursor, titulo, id_store, sql_anterior, sql_nuevo, params, options['planes'])
+
+            transaction.set_rollback(True)
+
+    def _generar_tienda(self, cursor, ventas, productos):
+        """Genera una tienda con un usuario, productos y ventas de una línea cada una"""
+        cursor.execute("""
+            INSERT INTO stores (id_store, name, direction, phone, administrator_name)
+            VALUES (gen_random_uuid(), 'Benchmark', '-', '-', '-')
+            RETURNING id_store
+        """)
+        id_store = str(cursor.fetchone()[0])
+
+        cursor.execute("""
+            INSERT INTO users (id_user, id_store, username, password, type_user, state_user)
+            VALUES (gen_random_uuid(), %s, 'benchmark-' || gen_random_uuid(), '-', true, true)
+            RETURNING id_user
+        """, [id_store])
+        id_user = str(cursor.fetchone()[0])
+
+        cursor.execute("""
+            INSERT INTO products (id_product, name, price_sale, stock, description, image,
+                                  id_store, price_buy, category, status_product)
+            SELECT gen_random_uuid(), 'Producto ' || n, 1000 + n, 100, '', ''::bytea,
+                   %s, 500 + n, 'Categoría ' || (n %% 20), true
+            FROM generate_series(1, %s) AS n
+        """, [id_store, productos])
+
+        cursor.execute("""
+            WITH productos AS (
+                SELECT array_agg(id_product) AS ids FROM products WHERE id_store = %(id_store)s
+            ),
+            nuevas AS (
+                INSERT INTO sales (id_sale, date_sale, items, total, pay_method, state, utility, id_store)
+                SELECT gen_random_uuid(), CURRENT_DATE - (n %% 730), 1 + n %% 5, 1000 + n %% 9000,
+                       'efectivo', n %% 20 <> 0, 0, %(id_store)s
+                FROM generate_series(1, %(ventas)s) AS n
+                RETURNING id_sale, items
+            ),
+            lineas AS (
+                INSERT INTO sales_bag (id_sales_bag, id_sale, id_product, quantitity)
+                SELECT gen_random_uuid(), v.id_sale,
+                       p.ids[1 + floor(random() * array_length(p.ids, 1))::int], v.items
+                FROM nuevas v CROSS JOIN productos p
+            )
+            INSERT INTO sales_movement (id_movement, type_movement, type_action, date_movement, id_sale, id_user)
+            SELECT gen_random_uuid(), 'venta', 'crear', now(), v.id_sale, %(id_user)s
+            FROM nuevas v
+        """, {'id_store': id_store, 'id_user': id_user, 'ventas': ventas})
+
+        return id_store
+
+    def _explain(self, cursor, sql, params):
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    def _comparar(self, cursor, titulo, id_store, sql_anterior, sql_nuevo, params, mostrar_planes):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{titulo}'))
+
+        # Anterior: reunir los IDs y luego consultar con ANY(%s)
+        inicio = time.perf_counter()
+        cursor.execute(SQL_IDS_VENTAS_ANTERIOR, [id_store])
+        ids = [fila[0] for fila in cursor.fetchall()]
+        ms_ids = (time.perf_counter() - inicio) * 1000
+        plan_anterior = self._explain(cursor, sql_anterior, [ids])
+
+        plan_nuevo = self._explain(cursor, sql_nuevo, params)
+
+        ms_anterior = ms_ids + plan_anterior['Planning Time'] + plan_anterior['Execution Time']
+        ms_nuevo = plan_nuevo['Planning Time'] + plan_nuevo['Execution Time']
+        self.stdout.write(
+            f'  Anterior: {ms_anterior:,.1f} ms '
+            f'(IDs: {len(ids):,} en {ms_ids:,.1f} ms, '
+            f'plan {plan_anterior["Planning Time"]:,.1f} ms, ejecución {plan_anterior["Execution Time"]:,.1f} ms)'
+        )
+        self.stdout.write(
+            f'  Por tienda: {ms_nuevo:,.1f} ms '
+            f'(plan {plan_nuevo["Planning Time"]:,.1f} ms, ejecución {plan_nuevo["Execution Time"]:,.1f} ms)'
+        )
+        if ms_nuevo > 0:
+            self.stdout.write(self.style.SUCCESS(f'  {ms_anterior / ms_nuevo:,.1f}x más rápido'))
+
+        if mostrar_planes:
+            for nombre, sql, params_plan in (('anterior', sql_anterior, [ids]), ('por tienda', sql_nuevo, params)):
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params_plan)
+                self.stdout.write(f'\n  Plan {nombre}:')
+                for (linea,) in cursor.fetchall():
+                    self.stdout.write(f'    {linea}')
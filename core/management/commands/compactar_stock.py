@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.stock_ledger import compactar_stock
+
+
+class Command(BaseCommand):
+    help = 'Suma los movimientos pendientes del libro de stock al saldo de cada producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tienda', help='UUID de la tienda (por defecto, todas)')
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            help='Repite la compactación cada N segundos (por defecto, una sola vez)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            productos = compactar_stock(options['tienda'])
+            self.stdout.write(self.style.SUCCESS(f'Stock compactado: {productos} productos actualizados'))
+
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import alerts
+from core.transports import ErrorTransporte, obtener_transporte
+
+
+class Command(BaseCommand):
+    help = 'Envía las alertas pendientes de la bandeja de salida respetando el límite de envíos por segundo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Tiendas por pasada (por defecto, 100)')
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            help='Sigue despachando y revisa la bandeja cada N segundos (por defecto, una sola pasada)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            obtener_transporte()
+        except ErrorTransporte as e:
+            raise CommandError(str(e))
+
+        if not alerts.tomar_turno_despachador():
+            raise CommandError('Ya hay otro despachador de alertas activo')
+
+        configuracion = alerts.configuracion_despacho()
+        balde = alerts.BaldeFichas(configuracion['TASA'], configuracion['RAFAGA'])
+        try:
+            while True:
+                resultado = alerts.despachar_pendientes(options['lote'], balde)
+                if any(resultado.values()):
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Emails: {resultado['emails']}, alertas enviadas: {resultado['enviadas']}, "
+                        f"reprogramadas: {resultado['reprogramadas']}, "
+                        f"fallidas: {resultado['fallidas']}, "
+                        f"descartadas: {resultado['descartadas']}"
+                    ))
+
+                if not options['intervalo']:
+                    return
+                time.sleep(options['intervalo'])
+        finally:
+            alerts.liberar_turno_despachador()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Products
+from core.thumbnails import generar_miniaturas
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas que falten de las imágenes del almacén (p. ej. después de migrar_imagenes)'
+
+    def handle(self, *args, **options):
+        hashes = (
+            Products.objects.filter(image_sha256__isnull=False)
+            .order_by('image_sha256')
+            .values_list('image_sha256', flat=True)
+            .distinct()
+        )
+
+        generadas = 0
+        for sha256 in hashes.iterator():
+            try:
+                generadas += generar_miniaturas(sha256)
+            except Exception as e:
+                self.stderr.write(f'Error en {sha256}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Miniaturas generadas: {generadas}'))
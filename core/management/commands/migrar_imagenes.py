@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.image_store import guardar_imagen
+
+
+class Command(BaseCommand):
+    help = 'Mueve las imágenes guardadas en products.image (bytea) al almacén de imágenes, por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Productos por lote (por defecto, 100)')
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No vacía products.image después de mover la imagen',
+        )
+
+    def handle(self, *args, **options):
+        ultimo = None
+        movidas = 0
+
+        while True:
+            # Cada lote en su propia transacción: solo se bloquean sus filas
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id_product, image
+                    FROM products
+                    WHERE image IS NOT NULL AND image_sha256 IS NULL
+                      AND (%s::uuid IS NULL OR id_product > %s::uuid)
+                    ORDER BY id_product
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, [ultimo, ultimo, options['lote']])
+                filas = cursor.fetchall()
+                if not filas:
+                    break
+
+                referencias = [(str(id_product), guardar_imagen(imagen)) for id_product, imagen in filas]
+                cursor.execute(f"""
+                    UPDATE products p
+                    SET image_sha256 = v.sha256
+                        {'' if options['conservar'] else ', image = NULL'}
+                    FROM (VALUES {', '.join(['(%s::uuid, %s)'] * len(referencias))}) AS v(id_product, sha256)
+                    WHERE p.id_product = v.id_product
+                """, [valor for referencia in referencias for valor in referencia])
+
+            ultimo = referencias[-1][0]
+            movidas += len(referencias)
+            self.stdout.write(f'Imágenes movidas: {movidas}')
+
+        self.stdout.write(self.style.SUCCESS(f'Migración terminada: {movidas} imágenes movidas al almacén'))
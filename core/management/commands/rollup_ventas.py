@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollups import reconstruir_rollup, verificar_rollup
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de ventas desde el historial y verifica que no tenga diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tienda', help='UUID de la tienda (por defecto, todas)')
+        parser.add_argument(
+            '--reconstruir',
+            action='store_true',
+            help='Reconstruye el resumen antes de verificarlo',
+        )
+
+    def handle(self, *args, **options):
+        id_store = options['tienda']
+
+        if options['reconstruir']:
+            filas = reconstruir_rollup(id_store)
+            self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido: {filas} filas (tienda, día)'))
+
+        diferencias = verificar_rollup(id_store)
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('El resumen diario coincide con el historial de ventas'))
+            return
+
+        for fila in diferencias:
+            self.stdout.write(
+                f"{fila['id_store']} {fila['day']}: "
+                f"total {fila['total_actual']} (esperado {fila['total_esperado']}), "
+                f"ventas {fila['ventas_actuales']} (esperado {fila['ventas_esperadas']}), "
+                f"canceladas {fila['canceladas_actuales']} (esperado {fila['canceladas_esperadas']})"
+            )
+        raise CommandError(
+            f'Se encontraron {len(diferencias)} diferencias; ejecuta con --reconstruir para corregirlas'
+        )
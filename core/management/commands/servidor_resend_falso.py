@@ -0,0 +1,138 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from core.transports import MAX_LOTE_RESEND
+
+
+class _Estado:
+    """Contadores y límite de tasa compartidos entre las solicitudes"""
+
+    def __init__(self, tasa, latencia, fallos):
+        self.tasa = tasa
+        self.latencia = latencia
+        self.fallos = fallos
+        self.solicitudes = 0
+        self.emails = 0
+        self.rechazadas = 0
+        self._recientes = []
+        self._lock = threading.Lock()
+
+    def admitir(self):
+        """False si la solicitud supera ``tasa`` por segundo (como el 429 de Resend)"""
+        with self._lock:
+            ahora = time.monotonic()
+            self._recientes = [t for t in self._recientes if ahora - t < 1]
+            if self.tasa and len(self._recientes) >= self.tasa:
+                self.rechazadas += 1
+                return False
+            self._recientes.append(ahora)
+            self.solicitudes += 1
+            return True
+
+    def contar(self, emails):
+        with self._lock:
+            self.emails += emails
+
+
+def _crear_manejador(estado, stdout):
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # conexiones persistentes, como la API real
+
+        def _responder(self, status, cuerpo):
+            datos = json.dumps(cuerpo).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _error(self, status, nombre, mensaje):
+            self._responder(status, {'statusCode': status, 'name': nombre, 'message': mensaje})
+
+        def do_POST(self):
+            largo = int(self.headers.get('Content-Length') or 0)
+            cuerpo = self.rfile.read(largo)
+
+            if self.path not in ('/emails', '/emails/batch'):
+                return self._error(404, 'not_found', 'Ruta no encontrada')
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self._error(401, 'missing_api_key', 'Falta la API key')
+            if not estado.admitir():
+                return self._error(429, 'rate_limit_exceeded', 'Demasiadas solicitudes')
+
+            try:
+                datos = json.loads(cuerpo)
+            except ValueError:
+                return self._error(422, 'validation_error', 'JSON inválido')
+
+            mensajes = datos if self.path == '/emails/batch' else [datos]
+            if not isinstance(mensajes, list) or not 1 <= len(mensajes) <= MAX_LOTE_RESEND:
+                return self._error(422, 'validation_error', f'Se esperaban de 1 a {MAX_LOTE_RESEND} emails')
+            for mensaje in mensajes:
+                if not isinstance(mensaje, dict) or not all(mensaje.get(campo) for campo in ('from', 'to', 'subject')):
+                    return self._error(422, 'validation_error', 'Cada email necesita from, to y subject')
+
+            if estado.latencia:
+                time.sleep(estado.latencia)
+            if estado.fallos and random.random() < estado.fallos:
+                return self._error(500, 'application_error', 'Fallo simulado')
+
+            estado.contar(len(mensajes))
+            ids = [{'id': str(uuid.uuid4())} for _ in mensajes]
+            if self.path == '/emails/batch':
+                self._responder(200, {'data': ids})
+            else:
+                self._responder(200, ids[0])
+
+        def log_message(self, formato, *args):
+            stdout.write(f'{self.address_string()} {formato % args}')
+
+    return Manejador
+
+
+class Command(BaseCommand):
+    help = (
+        'Servidor HTTP local que imita la API de Resend (/emails y /emails/batch) '
+        'para probar el envío de alertas sin acceso a la red'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--puerto', type=int, default=8025, help='Puerto (por defecto, 8025)')
+        parser.add_argument(
+            '--tasa',
+            type=int,
+            default=2,
+            help='Solicitudes por segundo antes de responder 429 (0 = sin límite; por defecto, 2)',
+        )
+        parser.add_argument('--latencia', type=float, default=0, help='Segundos de demora por solicitud')
+        parser.add_argument(
+            '--fallos',
+            type=float,
+            default=0,
+            help='Proporción de solicitudes que responden 500 (0 a 1)',
+        )
+
+    def handle(self, *args, **options):
+        estado = _Estado(options['tasa'], options['latencia'], options['fallos'])
+        servidor = ThreadingHTTPServer(('127.0.0.1', options['puerto']), _crear_manejador(estado, self.stdout))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resend falso en http://127.0.0.1:{options['puerto']} "
+            f"(usar ALERTAS_TRANSPORTE['URL'] y cualquier RESEND_API_KEY)"
+        ))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            self.stdout.write(
+                f'Solicitudes: {estado.solicitudes}, emails: {estado.emails}, '
+                f'rechazadas por tasa: {estado.rechazadas}'
+            )
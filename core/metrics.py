@@ -0,0 +1,144 @@
+"""
+Cálculo de los KPIs del dashboard por tienda.
+
+Todos los indicadores que muestra ``core/dashboard.html`` se obtienen con dos
+consultas de agregación condicional (``COUNT(*) FILTER (WHERE ...)``): una sobre
+el catálogo (productos, usuarios y categorías) y otra sobre el resumen diario de
+ventas (ver ``core/rollups.py``). El valor del inventario se calcula en SQL en
+lugar de recorrer los productos en Python.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.db import connection
+
+from .stock_ledger import SQL_PENDIENTES_TIENDA
+
+
+# Umbral bajo el cual un producto se considera con stock bajo
+STOCK_BAJO = 10
+
+
+@contextmanager
+def _medir_grupo(perfil, grupo):
+    """Registra en ``perfil`` cuántas consultas y cuántos ms costó un grupo de KPIs"""
+    consultas = []
+
+    def contar(execute, sql, params, many, context):
+        consultas.append(sql)
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    with connection.execute_wrapper(contar):
+        yield
+    perfil[grupo] = {
+        'consultas': len(consultas),
+        'ms': round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+def _fila_como_dict(cursor):
+    columnas = [col[0] for col in cursor.description]
+    return dict(zip(columnas, cursor.fetchone()))
+
+
+def _kpis_catalogo(id_store):
+    """Productos, valor del inventario, usuarios y categorías en una sola consulta"""
+    with connection.cursor() as cursor:
+        # Stock actual = saldo compactado + movimientos pendientes del libro de stock
+        cursor.execute(f"""
+            SELECT
+                COUNT(*) FILTER (WHERE p.status_product) AS productos_activos,
+                COUNT(*) FILTER (WHERE p.status_product AND p.stock_actual = 0) AS productos_sin_stock,
+                COUNT(*) FILTER (
+                    WHERE p.status_product AND p.stock_actual > 0 AND p.stock_actual < %(stock_bajo)s
+                ) AS productos_stock_bajo,
+                COALESCE(SUM(p.price_buy * p.stock_actual) FILTER (WHERE p.status_product), 0) AS valor_inventario,
+                (SELECT COUNT(*) FROM users u WHERE u.id_store = %(id_store)s) AS total_usuarios,
+                (SELECT COUNT(*) FROM users u
+                 WHERE u.id_store = %(id_store)s AND u.state_user) AS usuarios_activos,
+                (SELECT COUNT(*) FROM users u
+                 WHERE u.id_store = %(id_store)s AND u.type_user) AS usuarios_admin,
+                (SELECT COUNT(*) FROM category c WHERE c.id_store = %(id_store)s) AS total_categorias
+            FROM (
+                SELECT p.status_product, p.price_buy, p.stock + COALESCE(m.delta, 0) AS stock_actual
+                FROM products p
+                LEFT JOIN {SQL_PENDIENTES_TIENDA} m ON m.id_product = p.id_product
+                WHERE p.id_store = %(id_store)s
+            ) p
+        """, {'id_store': id_store, 'stock_bajo': STOCK_BAJO})
+        return _fila_como_dict(cursor)
+
+
+def resumen_catalogo(id_store):
+    """Contadores de la página de productos (activos, con stock bajo o agotados, categorías) en una sola consulta"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                COUNT(*) AS productos_activos,
+                COUNT(*) FILTER (WHERE p.stock_actual < %(stock_bajo)s) AS productos_stock_bajo,
+                (SELECT COUNT(*) FROM category c WHERE c.id_store = %(id_store)s) AS total_categorias
+            FROM (
+                SELECT p.stock + COALESCE(m.delta, 0) AS stock_actual
+                FROM products p
+                LEFT JOIN {SQL_PENDIENTES_TIENDA} m ON m.id_product = p.id_product
+                WHERE p.id_store = %(id_store)s AND p.status_product
+            ) p
+        """, {'id_store': str(id_store), 'stock_bajo': STOCK_BAJO})
+        return _fila_como_dict(cursor)
+
+
+def _kpis_ventas(id_store, hoy):
+    """Totales generales y por período (mes, semana, hoy) desde el resumen diario"""
+    primer_dia_mes = hoy.replace(day=1)
+    inicio_semana = hoy - timedelta(days=7)
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT
+                COALESCE(SUM(r.sale_count + r.cancel_count), 0) AS total_ventas,
+                COALESCE(SUM(r.sale_count), 0) AS ventas_activas,
+                COALESCE(SUM(r.cancel_count), 0) AS ventas_canceladas,
+                COALESCE(SUM(r.total), 0) AS ingresos_totales,
+                COALESCE(SUM(r.total) FILTER (WHERE r.day >= %(mes)s), 0) AS ingresos_mes,
+                COALESCE(SUM(r.sale_count) FILTER (WHERE r.day >= %(mes)s), 0) AS cantidad_ventas_mes,
+                COALESCE(SUM(r.total) FILTER (WHERE r.day >= %(semana)s), 0) AS ingresos_semana,
+                COALESCE(SUM(r.sale_count) FILTER (WHERE r.day >= %(semana)s), 0) AS cantidad_ventas_semana,
+                COALESCE(SUM(r.total) FILTER (WHERE r.day = %(hoy)s), 0) AS ingresos_hoy,
+                COALESCE(SUM(r.sale_count) FILTER (WHERE r.day = %(hoy)s), 0) AS cantidad_ventas_hoy,
+                COALESCE(SUM(r.utility) FILTER (WHERE r.day >= %(mes)s), 0) AS utilidad_mes
+            FROM sales_daily_rollup r
+            WHERE r.id_store = %(id_store)s
+        """, {'id_store': id_store, 'mes': primer_dia_mes, 'semana': inicio_semana, 'hoy': hoy})
+        return _fila_como_dict(cursor)
+
+
+def calcular_kpis_tienda(user_store):
+    """
+    Calcula todos los KPIs del dashboard para una tienda
+
+    Args:
+        user_store (Stores): Tienda del usuario autenticado
+
+    Returns:
+        tuple: (kpis, perfil) donde ``kpis`` es un diccionario con las mismas
+        claves que usa la plantilla del dashboard y ``perfil`` indica, por
+        grupo de KPIs, la cantidad de consultas y el tiempo en milisegundos.
+    """
+    id_store = str(user_store.id_store)
+    hoy = datetime.now().date()
+    perfil = {}
+
+    with _medir_grupo(perfil, 'catalogo'):
+        kpis = _kpis_catalogo(id_store)
+
+    with _medir_grupo(perfil, 'ventas'):
+        kpis.update(_kpis_ventas(id_store, hoy))
+
+    # Promedio de venta del mes
+    kpis['promedio_venta'] = 0
+    if kpis['cantidad_ventas_mes'] > 0:
+        kpis['promedio_venta'] = kpis['ingresos_mes'] / kpis['cantidad_ventas_mes']
+
+    return kpis, perfil
@@ -12,6 +12,84 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
+        # Tablas que existían antes de las migraciones (los modelos son
+        # managed = False). En las bases ya creadas no hacen nada; en una base
+        # nueva (p. ej. la de pruebas) crean el esquema sobre el que trabajan
+        # las migraciones siguientes.
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS super_admin (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS stores (
+                    id_store UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    name TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    phone TEXT NOT NULL,
+                    administrator_name TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS category (
+                    id_category UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    name_category TEXT NOT NULL,
+                    id_store UUID NOT NULL REFERENCES stores (id_store)
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    id_user UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    id_store UUID REFERENCES stores (id_store),
+                    username TEXT NOT NULL UNIQUE,
+                    password TEXT NOT NULL,
+                    type_user BOOLEAN NOT NULL DEFAULT FALSE,
+                    state_user BOOLEAN NOT NULL DEFAULT TRUE
+                );
+                CREATE TABLE IF NOT EXISTS users_info (
+                    id_user_info UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    id_user UUID NOT NULL UNIQUE REFERENCES users (id_user),
+                    name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    rut TEXT NOT NULL,
+                    born_date DATE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS products (
+                    id_product UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    name TEXT NOT NULL,
+                    price_sale NUMERIC(10, 0) NOT NULL,
+                    stock NUMERIC(10, 2) NOT NULL,
+                    description TEXT NOT NULL,
+                    image BYTEA NOT NULL,
+                    id_store UUID REFERENCES stores (id_store),
+                    price_buy NUMERIC(10, 0) NOT NULL,
+                    category TEXT NOT NULL,
+                    status_product BOOLEAN NOT NULL DEFAULT TRUE
+                );
+                CREATE TABLE IF NOT EXISTS sales (
+                    id_sale UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    date_sale DATE NOT NULL,
+                    items NUMERIC(10, 2) NOT NULL,
+                    total NUMERIC(10, 2) NOT NULL,
+                    pay_method TEXT NOT NULL,
+                    state BOOLEAN NOT NULL DEFAULT TRUE,
+                    utility NUMERIC(10, 2),
+                    id_store UUID REFERENCES stores (id_store)
+                );
+                CREATE TABLE IF NOT EXISTS sales_bag (
+                    id_sales_bag UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    id_sale UUID NOT NULL REFERENCES sales (id_sale),
+                    id_product UUID NOT NULL REFERENCES products (id_product),
+                    quantitity NUMERIC(10, 2) NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sales_movement (
+                    id_movement UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    type_movement TEXT NOT NULL,
+                    type_action TEXT NOT NULL,
+                    date_movement TIMESTAMP NOT NULL,
+                    id_sale UUID REFERENCES sales (id_sale),
+                    id_product UUID REFERENCES products (id_product),
+                    id_user UUID NOT NULL REFERENCES users (id_user)
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
         migrations.CreateModel(
             name='Users',
             fields=[
@@ -0,0 +1,46 @@
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_superadmin'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS sales_daily_rollup (
+                    id_rollup UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    id_store UUID NOT NULL REFERENCES stores (id_store),
+                    day DATE NOT NULL,
+                    total NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                    utility NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                    items NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                    sale_count INTEGER NOT NULL DEFAULT 0,
+                    cancel_count INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (id_store, day)
+                );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS sales_daily_rollup;",
+        ),
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id_rollup', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('utility', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('items', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('sale_count', models.IntegerField()),
+                ('cancel_count', models.IntegerField()),
+                ('id_store', models.ForeignKey(db_column='id_store', on_delete=models.DO_NOTHING, to='core.stores')),
+            ],
+            options={
+                'db_table': 'sales_daily_rollup',
+                'managed': False,
+                'unique_together': {('id_store', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_salesdailyrollup'),
+    ]
+
+    operations = [
+        # Las ventas anteriores a que se guardara sales.id_store se asignan a
+        # la tienda del usuario que las registró (desde sales_movement)
+        migrations.RunSQL(
+            sql="""
+                UPDATE sales s
+                SET id_store = u.id_store
+                FROM sales_movement sm
+                INNER JOIN users u ON u.id_user = sm.id_user
+                WHERE sm.id_sale = s.id_sale
+                  AND s.id_store IS NULL
+                  AND u.id_store IS NOT NULL;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS sales_id_store_date_sale_idx ON sales (id_store, date_sale);
+                CREATE INDEX IF NOT EXISTS sales_bag_id_sale_idx ON sales_bag (id_sale);
+                CREATE INDEX IF NOT EXISTS sales_bag_id_product_idx ON sales_bag (id_product);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS sales_id_store_date_sale_idx;
+                DROP INDEX IF EXISTS sales_bag_id_sale_idx;
+                DROP INDEX IF EXISTS sales_bag_id_product_idx;
+            """,
+        ),
+    ]
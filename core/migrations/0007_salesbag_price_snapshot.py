@@ -0,0 +1,81 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_sales_store_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE sales_bag
+                    ADD COLUMN IF NOT EXISTS unit_price NUMERIC(10, 2),
+                    ADD COLUMN IF NOT EXISTS unit_cost NUMERIC(10, 2);
+            """,
+            reverse_sql="""
+                ALTER TABLE sales_bag
+                    DROP COLUMN IF EXISTS unit_price,
+                    DROP COLUMN IF EXISTS unit_cost;
+            """,
+            state_operations=[
+                migrations.AddField(
+                    model_name='salesbag',
+                    name='unit_price',
+                    field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+                ),
+                migrations.AddField(
+                    model_name='salesbag',
+                    name='unit_cost',
+                    field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+                ),
+            ],
+        ),
+        # Las líneas anteriores no guardaron el precio de la venta: se usa el
+        # precio actual del producto, que es lo que mostraban los gráficos
+        migrations.RunSQL(
+            sql="""
+                UPDATE sales_bag sb
+                SET unit_price = p.price_sale,
+                    unit_cost = p.price_buy
+                FROM products p
+                WHERE p.id_product = sb.id_product
+                  AND sb.unit_price IS NULL;
+
+                UPDATE sales s
+                SET utility = l.utility
+                FROM (
+                    SELECT id_sale, SUM((unit_price - unit_cost) * quantitity) AS utility
+                    FROM sales_bag
+                    GROUP BY id_sale
+                ) l
+                WHERE l.id_sale = s.id_sale
+                  AND s.utility IS NULL;
+
+                UPDATE sales_daily_rollup r
+                SET utility = u.utility
+                FROM (
+                    SELECT id_store, date_sale, COALESCE(SUM(utility) FILTER (WHERE state), 0) AS utility
+                    FROM sales
+                    WHERE id_store IS NOT NULL
+                    GROUP BY id_store, date_sale
+                ) u
+                WHERE u.id_store = r.id_store
+                  AND u.date_sale = r.day;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Índice de cobertura: las sumas de ganancia por venta no leen la tabla
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS sales_bag_id_sale_snapshot_idx
+                    ON sales_bag (id_sale) INCLUDE (id_product, quantitity, unit_price, unit_cost);
+                DROP INDEX IF EXISTS sales_bag_id_sale_idx;
+            """,
+            reverse_sql="""
+                CREATE INDEX IF NOT EXISTS sales_bag_id_sale_idx ON sales_bag (id_sale);
+                DROP INDEX IF EXISTS sales_bag_id_sale_snapshot_idx;
+            """,
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_salesbag_price_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS stock_movement (
+                    id_stock_movement BIGSERIAL PRIMARY KEY,
+                    id_product UUID NOT NULL REFERENCES products (id_product),
+                    id_store UUID NOT NULL REFERENCES stores (id_store),
+                    delta NUMERIC(10, 2) NOT NULL,
+                    reason TEXT NOT NULL,
+                    id_sale UUID REFERENCES sales (id_sale),
+                    id_user UUID REFERENCES users (id_user),
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    compacted BOOLEAN NOT NULL DEFAULT FALSE
+                );
+                CREATE INDEX IF NOT EXISTS stock_movement_id_product_idx
+                    ON stock_movement (id_product, id_stock_movement);
+                -- Solo los movimientos sin compactar se suman al stock
+                CREATE INDEX IF NOT EXISTS stock_movement_pending_idx
+                    ON stock_movement (id_store, id_product) INCLUDE (delta)
+                    WHERE NOT compacted;
+            """,
+            reverse_sql="DROP TABLE IF EXISTS stock_movement;",
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id_stock_movement', models.BigAutoField(primary_key=True, serialize=False)),
+                ('delta', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reason', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('compacted', models.BooleanField(default=False)),
+                ('id_product', models.ForeignKey(db_column='id_product', on_delete=models.DO_NOTHING, to='core.products')),
+                ('id_store', models.ForeignKey(db_column='id_store', on_delete=models.DO_NOTHING, to='core.stores')),
+                ('id_sale', models.ForeignKey(blank=True, db_column='id_sale', null=True, on_delete=models.DO_NOTHING, to='core.sales')),
+                ('id_user', models.ForeignKey(blank=True, db_column='id_user', null=True, on_delete=models.DO_NOTHING, to='core.users')),
+            ],
+            options={
+                'db_table': 'stock_movement',
+                'managed': False,
+            },
+        ),
+    ]
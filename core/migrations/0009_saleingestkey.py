@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_stockmovement'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS sale_ingest_key (
+                    id_store UUID NOT NULL REFERENCES stores (id_store),
+                    idempotency_key TEXT NOT NULL,
+                    id_sale UUID NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (id_store, idempotency_key)
+                );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS sale_ingest_key;",
+        ),
+        migrations.CreateModel(
+            name='SaleIngestKey',
+            fields=[
+                ('idempotency_key', models.TextField(primary_key=True, serialize=False)),
+                ('id_sale', models.UUIDField()),
+                ('created_at', models.DateTimeField()),
+                ('id_store', models.ForeignKey(db_column='id_store', on_delete=models.DO_NOTHING, to='core.stores')),
+            ],
+            options={
+                'db_table': 'sale_ingest_key',
+                'managed': False,
+                'unique_together': {('id_store', 'idempotency_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_saleingestkey'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS alert_outbox (
+                    id_alert BIGSERIAL PRIMARY KEY,
+                    id_store UUID NOT NULL REFERENCES stores (id_store),
+                    id_user UUID REFERENCES users (id_user),
+                    kind TEXT NOT NULL,
+                    payload JSONB NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pendiente',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    last_error TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    sent_at TIMESTAMPTZ
+                );
+                -- El despachador solo recorre las alertas pendientes
+                CREATE INDEX IF NOT EXISTS alert_outbox_pending_idx
+                    ON alert_outbox (next_attempt_at, id_alert)
+                    WHERE status = 'pendiente';
+            """,
+            reverse_sql="DROP TABLE IF EXISTS alert_outbox;",
+        ),
+        migrations.CreateModel(
+            name='AlertOutbox',
+            fields=[
+                ('id_alert', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.TextField()),
+                ('payload', models.JSONField()),
+                ('status', models.TextField(default='pendiente')),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('id_store', models.ForeignKey(db_column='id_store', on_delete=models.DO_NOTHING, to='core.stores')),
+                ('id_user', models.ForeignKey(blank=True, db_column='id_user', null=True, on_delete=models.DO_NOTHING, to='core.users')),
+            ],
+            options={
+                'db_table': 'alert_outbox',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_alertoutbox'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS stock_alert_state (
+                    id_product UUID PRIMARY KEY REFERENCES products (id_product),
+                    id_store UUID NOT NULL REFERENCES stores (id_store),
+                    armed BOOLEAN NOT NULL DEFAULT TRUE,
+                    last_alerted_at TIMESTAMPTZ,
+                    last_stock NUMERIC(10, 2)
+                );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS stock_alert_state;",
+        ),
+        migrations.CreateModel(
+            name='StockAlertState',
+            fields=[
+                ('id_product', models.OneToOneField(db_column='id_product', on_delete=models.DO_NOTHING, primary_key=True, serialize=False, to='core.products')),
+                ('armed', models.BooleanField(default=True)),
+                ('last_alerted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_stock', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('id_store', models.ForeignKey(db_column='id_store', on_delete=models.DO_NOTHING, to='core.stores')),
+            ],
+            options={
+                'db_table': 'stock_alert_state',
+                'managed': False,
+            },
+        ),
+    ]
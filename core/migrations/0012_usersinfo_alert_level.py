@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_stockalertstate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE users_info
+                    ADD COLUMN IF NOT EXISTS alert_level TEXT NOT NULL DEFAULT 'medio';
+            """,
+            reverse_sql="ALTER TABLE users_info DROP COLUMN IF EXISTS alert_level;",
+            state_operations=[
+                migrations.AddField(
+                    model_name='usersinfo',
+                    name='alert_level',
+                    field=models.TextField(default='medio'),
+                ),
+            ],
+        ),
+    ]
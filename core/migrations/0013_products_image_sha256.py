@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+
+def restaurar_imagenes(apps, schema_editor):
+    """Vuelve a copiar a products.image las imágenes que solo están en el almacén"""
+    from core.image_store import abrir_imagen
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id_product, image_sha256 FROM products
+            WHERE image IS NULL AND image_sha256 IS NOT NULL
+        """)
+        pendientes = cursor.fetchall()
+        for id_product, sha256 in pendientes:
+            try:
+                with abrir_imagen(sha256.strip()) as archivo:
+                    contenido = archivo.read()
+            except FileNotFoundError:
+                continue  # lo informa la verificación de reverse_sql
+            cursor.execute("UPDATE products SET image = %s WHERE id_product = %s", [contenido, id_product])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_usersinfo_alert_level'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE products
+                    ADD COLUMN IF NOT EXISTS image_sha256 CHAR(64),
+                    ALTER COLUMN image DROP NOT NULL;
+            """,
+            # Al revertir, restaurar_imagenes ya copió las imágenes del
+            # almacén; si queda algún producto sin imagen no se puede volver
+            # a exigir NOT NULL
+            reverse_sql="""
+                DO $$
+                BEGIN
+                    IF EXISTS (SELECT 1 FROM products WHERE image IS NULL) THEN
+                        RAISE EXCEPTION 'Hay productos sin products.image y sin su archivo en el almacén de imágenes; no se puede restaurar NOT NULL';
+                    END IF;
+                END $$;
+                ALTER TABLE products ALTER COLUMN image SET NOT NULL;
+                ALTER TABLE products DROP COLUMN IF EXISTS image_sha256;
+            """,
+            state_operations=[
+                migrations.AddField(
+                    model_name='products',
+                    name='image_sha256',
+                    field=models.CharField(blank=True, max_length=64, null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restaurar_imagenes),
+    ]
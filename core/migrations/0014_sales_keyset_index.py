@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_products_image_sha256'),
+    ]
+
+    operations = [
+        # El listado de ventas pagina por (date_sale, id_sale): con id_sale en
+        # el índice las páginas se leen directo del índice, sin ordenar las
+        # ventas del mismo día. Sirve también a las consultas por rango de
+        # fechas que usaban el índice anterior.
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS sales_id_store_date_sale_id_sale_idx
+                    ON sales (id_store, date_sale, id_sale);
+                DROP INDEX IF EXISTS sales_id_store_date_sale_idx;
+            """,
+            reverse_sql="""
+                CREATE INDEX IF NOT EXISTS sales_id_store_date_sale_idx ON sales (id_store, date_sale);
+                DROP INDEX IF EXISTS sales_id_store_date_sale_id_sale_idx;
+            """,
+        ),
+    ]
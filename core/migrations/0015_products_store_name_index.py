@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sales_keyset_index'),
+    ]
+
+    operations = [
+        # La tabla de productos pagina los productos activos de la tienda por
+        # (name, id_product): cada página es un rango de este índice
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS products_id_store_name_id_product_idx
+                    ON products (id_store, name, id_product)
+                    WHERE status_product;
+            """,
+            reverse_sql="DROP INDEX IF EXISTS products_id_store_name_id_product_idx;",
+        ),
+    ]
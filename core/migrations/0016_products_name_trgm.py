@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_products_store_name_index'),
+    ]
+
+    operations = [
+        # Índice de trigramas sobre el nombre de los productos activos: sirve
+        # a las búsquedas por subcadena (ILIKE '%...%') y por similitud (%)
+        # sin recorrer toda la tabla (ver core/search.py). pg_trgm es una
+        # extensión "trusted" desde PostgreSQL 13: no requiere superusuario.
+        migrations.RunSQL(
+            sql="""
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS products_name_trgm_idx
+                    ON products USING gin (name gin_trgm_ops)
+                    WHERE status_product;
+            """,
+            reverse_sql="DROP INDEX IF EXISTS products_name_trgm_idx;",
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_products_name_trgm'),
+    ]
+
+    operations = [
+        # 0005 creó el resumen diario vacío: solo las ventas registradas
+        # después quedaron en él. Se reconstruye completo desde ``sales`` (con
+        # id_store ya asignado por 0006 y la utilidad calculada por 0007),
+        # como ``rollups.reconstruir_rollup``, para que los KPIs y gráficos
+        # incluyan el historial sin correr ``rollup_ventas --reconstruir``.
+        migrations.RunSQL(
+            sql="""
+                LOCK TABLE sales_daily_rollup IN EXCLUSIVE MODE;
+                DELETE FROM sales_daily_rollup;
+                INSERT INTO sales_daily_rollup
+                    (id_store, day, total, utility, items, sale_count, cancel_count)
+                SELECT
+                    s.id_store,
+                    s.date_sale,
+                    COALESCE(SUM(s.total) FILTER (WHERE s.state), 0),
+                    COALESCE(SUM(s.utility) FILTER (WHERE s.state), 0),
+                    COALESCE(SUM(s.items) FILTER (WHERE s.state), 0),
+                    COUNT(*) FILTER (WHERE s.state),
+                    COUNT(*) FILTER (WHERE NOT s.state)
+                FROM sales s
+                WHERE s.id_store IS NOT NULL
+                GROUP BY s.id_store, s.date_sale;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_fill_sales_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS data_version (
+                    key TEXT PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS data_version;",
+        ),
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('key', models.TextField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'data_version',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_dataversion'),
+    ]
+
+    operations = [
+        # Emails que ya recibieron cada alerta: un reintento solo vuelve a
+        # enviarla a los destinatarios cuyo envío falló
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE alert_outbox
+                    ADD COLUMN IF NOT EXISTS delivered_to JSONB NOT NULL DEFAULT '[]'::jsonb;
+            """,
+            reverse_sql="ALTER TABLE alert_outbox DROP COLUMN IF EXISTS delivered_to;",
+            state_operations=[
+                migrations.AddField(
+                    model_name='alertoutbox',
+                    name='delivered_to',
+                    field=models.JSONField(default=list),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_alertoutbox_delivered_to'),
+    ]
+
+    operations = [
+        # El stock actual de un producto suma sus movimientos sin compactar
+        # por id_product, sin la tienda: stock_movement_pending_idx empieza por
+        # id_store y no sirve para esa búsqueda
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS stock_movement_pending_product_idx
+                    ON stock_movement (id_product) INCLUDE (delta)
+                    WHERE NOT compacted;
+            """,
+            reverse_sql="DROP INDEX IF EXISTS stock_movement_pending_product_idx;",
+        ),
+    ]
@@ -1,6 +1,5 @@
 from django.db import models
 import uuid
-from threading import Thread
 
 
 # Modelo de SuperAdmin
@@ -68,6 +67,9 @@ class UsersInfo(models.Model):
     email = models.TextField()
     rut = models.TextField()
     born_date = models.DateField()
+    # Alertas de stock que recibe si es administrador: 'critico' (sin stock),
+    # 'alto' (menos de 5), 'medio' (todo stock bajo) o 'ninguno'
+    alert_level = models.TextField(default='medio')
 
     class Meta:
         managed = False
@@ -77,6 +79,13 @@ class UsersInfo(models.Model):
         return self.name
 
 
+class ProductosManager(models.Manager):
+    """No lee la columna ``image`` (bytea) salvo que se pida explícitamente"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('image')
+
+
 # Modelo de Productos
 class Products(models.Model):
     id_product = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -84,12 +93,17 @@ class Products(models.Model):
     price_sale = models.DecimalField(max_digits=10, decimal_places=0)
     stock = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
-    image = models.BinaryField()
+    # Imagen antigua guardada en la fila; las nuevas van al almacén de
+    # imágenes (ver core/image_store.py) y aquí queda NULL
+    image = models.BinaryField(blank=True, null=True)
+    image_sha256 = models.CharField(max_length=64, blank=True, null=True)
     id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store', blank=True, null=True)
     price_buy = models.DecimalField(max_digits=10, decimal_places=0)
     category = models.TextField()
     status_product = models.BooleanField()
 
+    objects = ProductosManager()
+
     class Meta:
         managed = False
         db_table = 'products'
@@ -97,64 +111,50 @@ class Products(models.Model):
     def __str__(self):
         return self.name
     
-    def _enviar_alerta_asincrona(self, producto_name, stock_actual, store_name, to_email):
-        """Función auxiliar para enviar email en segundo plano"""
-        from .notifications import enviar_alerta_stock_bajo
-        import time
-        
-        # Respetar límite de Resend: 2 requests/segundo
-        time.sleep(0.6)  # Esperar 600ms entre emails
-        
-        enviar_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Para que save() sepa si image_sha256 cambió
+        instancia._image_sha256_leido = instancia.__dict__.get('image_sha256')
+        return instancia
     
     def save(self, *args, **kwargs):
         """
-        Sobrescribe el método save para enviar alertas automáticas 
-        cuando el stock está bajo (de forma asíncrona para no bloquear)
+        Sobrescribe el método save para no pisar el stock al actualizar
+
+        El stock de un producto existente cambia solo a través del libro de
+        movimientos (ver ``core/stock_ledger.py``), que la compactación suma a
+        ``stock``. Guardar todos los campos de una instancia leída antes de una
+        compactación devolvería el saldo a un valor viejo, por eso al
+        actualizar se omite ``stock``. Para fijar el stock usar
+        ``stock_ledger.ajustar_stock``. Los campos diferidos que no se leyeron
+        (como ``image``) tampoco se escriben, para no tener que leerlos.
+
+        ``image_sha256`` solo se escribe si cambió desde que se leyó la
+        instancia: la normalización de imágenes en segundo plano (ver
+        ``core/thumbnails.py``) lo reemplaza por el de la imagen normalizada,
+        y una instancia leída antes no debe volver a poner el anterior.
         """
         if not self.id_product:
             self.id_product = uuid.uuid4()
-        # Extraer user_id si viene en kwargs
-        user_id = kwargs.pop('user_id', None)
+        # user_id ya no se usa aquí; se acepta por compatibilidad con las vistas
+        kwargs.pop('user_id', None)
         
-        # Si es una actualización (no una creación)
-        if self.pk:
-            # Obtener el producto anterior de la BD
-            try:
-                old_product = Products.objects.get(pk=self.pk)
-                old_stock = float(old_product.stock)
-                new_stock = float(self.stock)
-                
-                # Solo enviar alerta si el stock cambió y está bajo
-                if old_stock != new_stock and new_stock < 10:
-                    # Obtener el email del usuario logueado desde la sesión
-                    user_email = None
-                    
-                    if user_id:
-                        try:
-                            # Buscar el email en UsersInfo usando el user_id
-                            user_info = UsersInfo.objects.get(id_user=user_id)
-                            user_email = user_info.email
-                        except UsersInfo.DoesNotExist:
-                            # Si no se encuentra, usar email de prueba
-                            user_email = "el.nico.taz36@gmail.com"
-                    else:
-                        # Si no hay user_id, usar email de prueba
-                        user_email = "el.nico.taz36@gmail.com"
-                    
-                    # Enviar email en segundo plano
-                    thread = Thread(
-                        target=self._enviar_alerta_asincrona,
-                        args=(self.name, int(new_stock), self.id_store.name, user_email)
-                    )
-                    thread.daemon = True
-                    thread.start()
-            
-            except Products.DoesNotExist:
-                pass  # Es una creación, no una actualización
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            diferidos = self.get_deferred_fields()
+            omitidos = {'stock'}
+            if self.image_sha256 == getattr(self, '_image_sha256_leido', self.image_sha256):
+                omitidos.add('image_sha256')
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in omitidos and f.attname not in diferidos
+            ]
         
-        # Guardar normalmente (sin esperar al envío de email)
         super().save(*args, **kwargs)
+        
+        # Invalidar los gráficos cacheados de la tienda
+        from .chart_cache import invalidar_tienda_al_confirmar
+        invalidar_tienda_al_confirmar(self.id_store_id)
 
 
 # Modelo de Ventas
@@ -182,6 +182,9 @@ class SalesBag(models.Model):
     id_sale = models.ForeignKey(Sales, models.DO_NOTHING, db_column='id_sale')
     id_product = models.ForeignKey(Products, models.DO_NOTHING, db_column='id_product')
     quantitity = models.DecimalField(max_digits=10, decimal_places=2)
+    # Precio de venta y costo unitarios al momento de la venta
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
     class Meta:
         managed = False
@@ -208,3 +211,117 @@ class SalesMovement(models.Model):
     def __str__(self):
         return f"Movimiento {self.type_movement} - {self.date_movement}"
 
+
+
+# Resumen diario de ventas por tienda (se mantiene al crear y cancelar ventas)
+class SalesDailyRollup(models.Model):
+    id_rollup = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store')
+    day = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    utility = models.DecimalField(max_digits=14, decimal_places=2)
+    items = models.DecimalField(max_digits=14, decimal_places=2)
+    sale_count = models.IntegerField()
+    cancel_count = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'sales_daily_rollup'
+        unique_together = (('id_store', 'day'),)
+    
+    def __str__(self):
+        return f"Resumen {self.id_store_id} - {self.day}"
+
+
+# Libro de movimientos de stock (solo se agregan filas)
+class StockMovement(models.Model):
+    id_stock_movement = models.BigAutoField(primary_key=True)
+    id_product = models.ForeignKey(Products, models.DO_NOTHING, db_column='id_product')
+    id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store')
+    delta = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.TextField()  # 'venta', 'cancelacion' o 'ajuste'
+    id_sale = models.ForeignKey(Sales, models.DO_NOTHING, db_column='id_sale', blank=True, null=True)
+    id_user = models.ForeignKey(Users, models.DO_NOTHING, db_column='id_user', blank=True, null=True)
+    created_at = models.DateTimeField()
+    # True cuando el delta ya se sumó a products.stock
+    compacted = models.BooleanField(default=False)
+
+    class Meta:
+        managed = False
+        db_table = 'stock_movement'
+
+    def __str__(self):
+        return f"{self.reason} {self.delta} ({self.id_product_id})"
+
+
+# Claves de idempotencia de las ventas recibidas en lote desde las cajas
+class SaleIngestKey(models.Model):
+    # La clave primaria real es (id_store, idempotency_key)
+    idempotency_key = models.TextField(primary_key=True)
+    id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store')
+    id_sale = models.UUIDField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'sale_ingest_key'
+        unique_together = (('id_store', 'idempotency_key'),)
+
+    def __str__(self):
+        return f"{self.idempotency_key} -> {self.id_sale}"
+
+
+# Alertas por enviar: se agregan en la misma transacción que las origina y
+# las envía el comando despachar_alertas (ver core/alerts.py)
+class AlertOutbox(models.Model):
+    id_alert = models.BigAutoField(primary_key=True)
+    id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store')
+    id_user = models.ForeignKey(Users, models.DO_NOTHING, db_column='id_user', blank=True, null=True)
+    kind = models.TextField()  # 'stock_bajo'
+    payload = models.JSONField()
+    status = models.TextField(default='pendiente')  # 'pendiente', 'enviada' o 'fallida'
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    sent_at = models.DateTimeField(blank=True, null=True)
+    delivered_to = models.JSONField(default=list)  # emails que ya la recibieron
+
+    class Meta:
+        managed = False
+        db_table = 'alert_outbox'
+
+    def __str__(self):
+        return f"{self.kind} #{self.id_alert} ({self.status})"
+
+
+# Estado de la alerta de stock bajo de cada producto: se alerta al cruzar el
+# umbral hacia abajo y se vuelve a armar al reponer stock (ver core/alerts.py)
+class StockAlertState(models.Model):
+    id_product = models.OneToOneField(Products, models.DO_NOTHING, db_column='id_product', primary_key=True)
+    id_store = models.ForeignKey(Stores, models.DO_NOTHING, db_column='id_store')
+    armed = models.BooleanField(default=True)
+    last_alerted_at = models.DateTimeField(blank=True, null=True)
+    last_stock = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'stock_alert_state'
+
+    def __str__(self):
+        return f"Alerta {self.id_product_id} ({'armada' if self.armed else 'disparada'})"
+
+
+# Versiones de datos compartidas por todos los procesos: invalidan las cachés
+# en memoria de gráficos y destinatarios (ver core/versions.py)
+class DataVersion(models.Model):
+    key = models.TextField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'data_version'
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
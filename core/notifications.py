@@ -1,20 +1,24 @@
-import resend
 from django.conf import settings
-import os
 
-# Configurar la API key de Resend
-resend.api_key = os.environ.get('RESEND_API_KEY', 're_TA8Vy3p8_NRAoVZGiRFFvnZJ6jz64eZfG')
+from .transports import obtener_transporte
 
 
-def enviar_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email):
+def remitente():
+    return getattr(settings, 'ALERTAS_REMITENTE', "Sistema de Inventario <onboarding@resend.dev>")
+
+
+def mensaje_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email):
     """
-    Envía un email de alerta cuando el stock de un producto está bajo
+    Arma el email de alerta cuando el stock de un producto está bajo
     
     Args:
         producto_name (str): Nombre del producto
         stock_actual (int): Cantidad actual en stock
         store_name (str): Nombre de la tienda
         to_email (str): Email del destinatario
+    
+    Returns:
+        dict: Mensaje con ``from``, ``to``, ``subject`` y ``html``
     """
     
     # Determinar el nivel de urgencia
@@ -184,21 +188,33 @@ def enviar_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email):
     </html>
     """
     
+    return {
+        "from": remitente(),
+        "to": [to_email],
+        "subject": f"🚨 Alerta de Stock Bajo: {producto_name} ({stock_actual} unidades restantes)",
+        "html": html_content
+    }
+
+
+def enviar_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email):
+    """
+    Envía un email de alerta cuando el stock de un producto está bajo
+    
+    Args:
+        producto_name (str): Nombre del producto
+        stock_actual (int): Cantidad actual en stock
+        store_name (str): Nombre de la tienda
+        to_email (str): Email del destinatario
+    """
     try:
-        params = {
-            "from": "Sistema de Inventario <onboarding@resend.dev>",
-            "to": [to_email],
-            "subject": f"🚨 Alerta de Stock Bajo: {producto_name} ({stock_actual} unidades restantes)",
-            "html": html_content
-        }
-        
-        email = resend.Emails.send(params)
+        mensaje = mensaje_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email)
+        id_email, = obtener_transporte().enviar_lote([mensaje])
         
         print(f"✅ Email de alerta enviado exitosamente!")
         print(f"   📧 Para: {to_email}")
         print(f"   📦 Producto: {producto_name}")
         print(f"   📊 Stock: {stock_actual}")
-        print(f"   🆔 ID Email: {email.get('id', 'N/A')}")
+        print(f"   🆔 ID Email: {id_email or 'N/A'}")
         
         return True
         
@@ -207,14 +223,17 @@ def enviar_alerta_stock_bajo(producto_name, stock_actual, store_name, to_email):
         return False
 
 
-def enviar_alerta_stock_critico_multiple(productos_bajos, store_name, to_email):
+def mensaje_stock_critico_multiple(productos_bajos, store_name, to_email):
     """
-    Envía un resumen de múltiples productos con stock bajo
+    Arma el resumen de múltiples productos con stock bajo
     
     Args:
         productos_bajos (list): Lista de diccionarios con info de productos
         store_name (str): Nombre de la tienda
         to_email (str): Email del destinatario
+    
+    Returns:
+        dict: Mensaje con ``from``, ``to``, ``subject`` y ``html``
     """
     
     # Construir tabla de productos
@@ -273,15 +292,26 @@ def enviar_alerta_stock_critico_multiple(productos_bajos, store_name, to_email):
     </html>
     """
     
+    return {
+        "from": remitente(),
+        "to": [to_email],
+        "subject": f"🚨 Reporte de Stock: {len(productos_bajos)} productos con stock bajo",
+        "html": html_content
+    }
+
+
+def enviar_alerta_stock_critico_multiple(productos_bajos, store_name, to_email):
+    """
+    Envía un resumen de múltiples productos con stock bajo
+    
+    Args:
+        productos_bajos (list): Lista de diccionarios con info de productos
+        store_name (str): Nombre de la tienda
+        to_email (str): Email del destinatario
+    """
     try:
-        params = {
-            "from": "Sistema de Inventario <onboarding@resend.dev>",
-            "to": [to_email],
-            "subject": f"🚨 Reporte de Stock: {len(productos_bajos)} productos con stock bajo",
-            "html": html_content
-        }
-        
-        email = resend.Emails.send(params)
+        mensaje = mensaje_stock_critico_multiple(productos_bajos, store_name, to_email)
+        obtener_transporte().enviar_lote([mensaje])
         print(f"✅ Reporte de múltiples productos enviado a {to_email}")
         return True
         
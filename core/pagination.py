@@ -0,0 +1,125 @@
+"""
+Paginación por cursor (keyset) para listados largos.
+
+En lugar de OFFSET, cada página pide las filas que vienen después (o antes)
+de la última fila vista según el orden del listado. El costo de una página no
+depende de cuántas haya antes, y las filas insertadas mientras se navega no
+desplazan las páginas siguientes: no se repiten ni se saltan filas.
+
+El orden debe terminar en un campo único (la clave primaria) para que el
+cursor identifique una posición exacta.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+_MAXIMO_POR_PAGINA = 200
+
+
+def tamano_pagina(request, por_defecto, maximo=_MAXIMO_POR_PAGINA):
+    """Tamaño de página pedido en ``?por_pagina=``, acotado entre 1 y ``maximo``"""
+    try:
+        tamano = int(request.GET.get('por_pagina', por_defecto))
+    except (TypeError, ValueError):
+        tamano = por_defecto
+    return max(1, min(tamano, maximo))
+
+
+def codificar_cursor(valores):
+    texto = json.dumps([str(valor) for valor in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def leer_cursor(cursor, tipos):
+    """
+    Decodifica un cursor de ``codificar_cursor``
+
+    Args:
+        cursor (str): Cursor recibido en la URL
+        tipos (tuple): Función que convierte cada valor (p. ej.
+            ``date.fromisoformat``, ``uuid.UUID``)
+
+    Returns:
+        list o None si el cursor falta o no es válido
+    """
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            return None
+        return [tipo(valor) for tipo, valor in zip(tipos, valores)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _filtro_posterior(orden, valores):
+    """Q de las filas que van después de ``valores`` en ``orden``"""
+    filtro = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        comparacion = 'lt' if campo.startswith('-') else 'gt'
+        filtro |= Q(**iguales, **{f'{nombre}__{comparacion}': valor})
+        iguales[nombre] = valor
+
+    # Cota sobre el primer campo: la única condición que el índice puede usar
+    # directamente, el OR de arriba solo descarta los empates
+    primero = orden[0].lstrip('-')
+    cota = 'lte' if orden[0].startswith('-') else 'gte'
+    return Q(**{f'{primero}__{cota}': valores[0]}) & filtro
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+def paginar(queryset, orden, tamano, despues=None, antes=None):
+    """
+    Devuelve una página de ``queryset`` ordenado por ``orden``
+
+    Args:
+        queryset: QuerySet ya filtrado
+        orden (list): Campos del orden, p. ej. ``['-date_sale', '-id_sale']``;
+            el último debe ser único
+        tamano (int): Filas por página
+        despues (list): Valores (de ``leer_cursor``) de la última fila de la
+            página anterior; la página empieza después de ella
+        antes (list): Valores de la primera fila de la página siguiente; la
+            página termina antes de ella
+
+    Returns:
+        dict: ``filas`` (lista), ``siguiente`` y ``anterior`` (cursores para
+        ``?despues=`` y ``?antes=``, o None si no hay más páginas)
+    """
+    campos = [campo.lstrip('-') for campo in orden]
+
+    def cursor(fila):
+        return codificar_cursor([getattr(fila, campo) for campo in campos])
+
+    if antes is not None:
+        invertido = _invertir(orden)
+        filas = list(queryset.filter(_filtro_posterior(invertido, antes)).order_by(*invertido)[:tamano + 1])
+        if not filas:
+            # Nada antes del cursor: mostrar la primera página
+            return paginar(queryset, orden, tamano)
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        return {
+            'filas': filas,
+            'anterior': cursor(filas[0]) if hay_mas else None,
+            'siguiente': cursor(filas[-1]) if filas else None,
+        }
+
+    if despues is not None:
+        queryset = queryset.filter(_filtro_posterior(orden, despues))
+    filas = list(queryset.order_by(*orden)[:tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    return {
+        'filas': filas,
+        'anterior': cursor(filas[0]) if despues is not None and filas else None,
+        'siguiente': cursor(filas[-1]) if hay_mas else None,
+    }
@@ -0,0 +1,105 @@
+"""
+Directorio de destinatarios de alertas por tienda.
+
+Las alertas de stock de una tienda se envían a sus administradores activos
+con email, según el nivel que eligió cada uno (``users_info.alert_level``):
+
+- ``critico``: solo productos sin stock
+- ``alto``: productos con menos de 5 unidades
+- ``medio``: todo producto con stock bajo
+- ``ninguno``: no recibe alertas
+
+El directorio de cada tienda se guarda en memoria del proceso junto con la
+versión con que se leyó. La versión vive en la base de datos, como la de los
+gráficos (ver ``core/versions.py``), y se incrementa al crear o modificar
+usuarios o tiendas, por lo que todos los procesos, incluido el despachador,
+releen el directorio en su siguiente uso.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from . import versions
+
+# Nivel mínimo -> stock por debajo del cual se recibe la alerta
+_LIMITE_NIVEL = {
+    'critico': 1,
+    'alto': 5,
+    'medio': None,  # cualquier alerta de stock bajo
+}
+NIVELES = ('critico', 'alto', 'medio', 'ninguno')
+
+_directorios = {}
+_lock = threading.Lock()
+
+
+def _clave_version(id_store):
+    return f'destinatarios_tienda:{id_store}'
+
+
+def invalidar_destinatarios(id_store):
+    """Obliga a releer el directorio de la tienda en todos los procesos"""
+    if not id_store:
+        return
+    versions.incrementar(_clave_version(id_store))
+
+
+def invalidar_destinatarios_al_confirmar(id_store):
+    if not id_store:
+        return
+    versions.incrementar_al_confirmar(_clave_version(id_store))
+
+
+def _leer_directorio(id_store):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM stores WHERE id_store = %s", [str(id_store)])
+        fila = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT ui.email, ui.alert_level
+            FROM users u
+            INNER JOIN users_info ui ON ui.id_user = u.id_user
+            WHERE u.id_store = %s
+              AND u.type_user AND u.state_user
+              AND ui.email <> '' AND ui.alert_level <> 'ninguno'
+            ORDER BY ui.email
+        """, [str(id_store)])
+        destinatarios = [(email, nivel) for email, nivel in cursor.fetchall() if nivel in _LIMITE_NIVEL]
+
+    return {
+        'tienda': fila[0] if fila else 'Tienda',
+        'destinatarios': destinatarios,
+    }
+
+
+def directorio_tienda(id_store):
+    """
+    Devuelve el directorio vigente de una tienda
+
+    Returns:
+        dict: ``tienda`` (nombre) y ``destinatarios``, lista de
+        (email, nivel)
+    """
+    id_store = str(id_store)
+    version = versions.version(_clave_version(id_store))
+    with _lock:
+        guardado = _directorios.get(id_store)
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+
+    directorio = _leer_directorio(id_store)
+    with _lock:
+        _directorios[id_store] = (version, directorio)
+    return directorio
+
+
+def recibe_alerta(nivel, stock):
+    """True si un destinatario con ese nivel recibe la alerta de un producto con ese stock"""
+    limite = _LIMITE_NIVEL.get(nivel)
+    return nivel in _LIMITE_NIVEL and (limite is None or stock < limite)
+
+
+def email_respaldo():
+    """Destinatario de las tiendas sin administradores que reciban alertas (None = descartar)"""
+    return getattr(settings, 'ALERTAS_EMAIL_RESPALDO', None)
@@ -0,0 +1,242 @@
+"""
+Resumen diario de ventas por tienda (tabla ``sales_daily_rollup``).
+
+Cada fila acumula, para una tienda y un día, el total y la utilidad de las
+ventas completadas, la cantidad de items, la cantidad de ventas completadas y
+la cantidad de ventas canceladas. Las vistas que crean o cancelan ventas
+actualizan el resumen dentro de su propia transacción, de modo que los
+gráficos y APIs de análisis leen pocas filas en lugar de recorrer ``sales``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+
+def _decimal(valor):
+    return Decimal(str(valor)) if valor is not None else Decimal('0')
+
+
+def actualizar_rollup(cursor, movimientos):
+    """
+    Aplica deltas al resumen diario con un único INSERT ... ON CONFLICT
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        movimientos (list): Tuplas (id_store, dia, total, utilidad, items,
+            delta_ventas, delta_canceladas)
+    """
+    # Agrupar por (tienda, día): ON CONFLICT no puede tocar la misma fila dos veces
+    acumulado = defaultdict(lambda: [Decimal('0'), Decimal('0'), Decimal('0'), 0, 0])
+    for id_store, dia, total, utilidad, items, delta_ventas, delta_canceladas in movimientos:
+        if not id_store:
+            continue
+        fila = acumulado[(str(id_store), dia)]
+        fila[0] += _decimal(total)
+        fila[1] += _decimal(utilidad)
+        fila[2] += _decimal(items)
+        fila[3] += delta_ventas
+        fila[4] += delta_canceladas
+
+    if not acumulado:
+        return
+
+    valores = []
+    params = []
+    for (id_store, dia), (total, utilidad, items, ventas, canceladas) in acumulado.items():
+        valores.append("(%s::uuid, %s::date, %s::numeric, %s::numeric, %s::numeric, %s::integer, %s::integer)")
+        params.extend([id_store, dia, total, utilidad, items, ventas, canceladas])
+
+    cursor.execute(f"""
+        INSERT INTO sales_daily_rollup AS r
+            (id_store, day, total, utility, items, sale_count, cancel_count)
+        VALUES {', '.join(valores)}
+        ON CONFLICT (id_store, day) DO UPDATE SET
+            total = r.total + EXCLUDED.total,
+            utility = r.utility + EXCLUDED.utility,
+            items = r.items + EXCLUDED.items,
+            sale_count = r.sale_count + EXCLUDED.sale_count,
+            cancel_count = r.cancel_count + EXCLUDED.cancel_count
+    """, params)
+
+
+def registrar_venta_en_rollup(cursor, id_store, fecha, total, utilidad, items):
+    """Suma una venta completada al resumen del día"""
+    actualizar_rollup(cursor, [(id_store, fecha, total, utilidad, items, 1, 0)])
+
+
+def registrar_cancelaciones_en_rollup(cursor, ventas):
+    """
+    Descuenta ventas canceladas del resumen
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        ventas (list): Tuplas (id_store, date_sale, total, utility, items) de
+            ventas que pasaron de completadas a canceladas
+    """
+    actualizar_rollup(cursor, [
+        (id_store, fecha, -_decimal(total), -_decimal(utilidad), -_decimal(items), -1, 1)
+        for id_store, fecha, total, utilidad, items in ventas
+    ])
+
+
+# =====================================================
+# LECTURAS PARA GRÁFICOS Y APIs
+# =====================================================
+
+def ventas_por_dia(id_store, desde=None):
+    """Lista de (día, total, cantidad_ventas) con al menos una venta completada"""
+    query = """
+        SELECT day, total, sale_count
+        FROM sales_daily_rollup
+        WHERE id_store = %s AND sale_count > 0
+    """
+    params = [str(id_store)]
+    if desde:
+        query += " AND day >= %s"
+        params.append(desde)
+    query += " ORDER BY day"
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def ventas_por_mes(id_store, desde):
+    """Lista de (primer día del mes, total, cantidad_ventas) desde una fecha"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT date_trunc('month', day)::date AS mes, SUM(total), SUM(sale_count)
+            FROM sales_daily_rollup
+            WHERE id_store = %s AND day >= %s AND sale_count > 0
+            GROUP BY mes
+            ORDER BY mes
+        """, [str(id_store), desde])
+        return cursor.fetchall()
+
+
+def totales_periodo(id_store, desde, hasta=None):
+    """Total y cantidad de ventas completadas entre dos fechas (inclusive)"""
+    query = """
+        SELECT COALESCE(SUM(total), 0), COALESCE(SUM(sale_count), 0)
+        FROM sales_daily_rollup
+        WHERE id_store = %s AND day >= %s
+    """
+    params = [str(id_store), desde]
+    if hasta:
+        query += " AND day <= %s"
+        params.append(hasta)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        total, cantidad = cursor.fetchone()
+    return {'total': total, 'cantidad': int(cantidad)}
+
+
+def conteo_ventas(id_store, desde=None, hasta=None):
+    """
+    Ventas completadas, canceladas e ingresos de la tienda, opcionalmente
+    entre dos fechas (inclusive)
+    """
+    query = """
+        SELECT COALESCE(SUM(sale_count), 0), COALESCE(SUM(cancel_count), 0), COALESCE(SUM(total), 0)
+        FROM sales_daily_rollup
+        WHERE id_store = %s
+    """
+    params = [str(id_store)]
+    if desde:
+        query += " AND day >= %s"
+        params.append(desde)
+    if hasta:
+        query += " AND day <= %s"
+        params.append(hasta)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        completadas, canceladas, total = cursor.fetchone()
+    return {'completadas': int(completadas), 'canceladas': int(canceladas), 'total': total}
+
+
+# =====================================================
+# RECONSTRUCCIÓN Y VERIFICACIÓN
+# =====================================================
+
+_AGREGADO_VENTAS = """
+    SELECT
+        s.id_store,
+        s.date_sale AS day,
+        COALESCE(SUM(s.total) FILTER (WHERE s.state), 0) AS total,
+        COALESCE(SUM(s.utility) FILTER (WHERE s.state), 0) AS utility,
+        COALESCE(SUM(s.items) FILTER (WHERE s.state), 0) AS items,
+        COUNT(*) FILTER (WHERE s.state) AS sale_count,
+        COUNT(*) FILTER (WHERE NOT s.state) AS cancel_count
+    FROM sales s
+    WHERE s.id_store IS NOT NULL {filtro}
+    GROUP BY s.id_store, s.date_sale
+"""
+
+
+def reconstruir_rollup(id_store=None):
+    """
+    Reconstruye el resumen desde el historial de ventas
+
+    Bloquea la tabla de resumen en modo EXCLUSIVE durante la reconstrucción,
+    de modo que las ventas concurrentes esperan y se aplican sobre el
+    resultado final en lugar de perderse.
+
+    Returns:
+        int: Cantidad de filas (tienda, día) generadas
+    """
+    filtro = "AND s.id_store = %s" if id_store else ""
+    params = [str(id_store)] if id_store else []
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE sales_daily_rollup IN EXCLUSIVE MODE")
+            if id_store:
+                cursor.execute("DELETE FROM sales_daily_rollup WHERE id_store = %s", params)
+            else:
+                cursor.execute("DELETE FROM sales_daily_rollup")
+            cursor.execute(f"""
+                INSERT INTO sales_daily_rollup
+                    (id_store, day, total, utility, items, sale_count, cancel_count)
+                {_AGREGADO_VENTAS.format(filtro=filtro)}
+            """, params)
+            return cursor.rowcount
+
+
+def verificar_rollup(id_store=None):
+    """
+    Compara el resumen con el historial de ventas
+
+    Returns:
+        list: Diccionarios con las filas (tienda, día) que difieren; vacía si
+        el resumen está al día.
+    """
+    filtro = "AND s.id_store = %s" if id_store else ""
+    filtro_rollup = "WHERE id_store = %s" if id_store else ""
+    params = [str(id_store)] * 2 if id_store else []
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH esperado AS ({_AGREGADO_VENTAS.format(filtro=filtro)}),
+            actual AS (SELECT * FROM sales_daily_rollup {filtro_rollup})
+            SELECT
+                COALESCE(e.id_store, a.id_store) AS id_store,
+                COALESCE(e.day, a.day) AS day,
+                e.total AS total_esperado, a.total AS total_actual,
+                e.sale_count AS ventas_esperadas, a.sale_count AS ventas_actuales,
+                e.cancel_count AS canceladas_esperadas, a.cancel_count AS canceladas_actuales
+            FROM esperado e
+            FULL OUTER JOIN actual a ON a.id_store = e.id_store AND a.day = e.day
+            WHERE e.id_store IS NULL
+               OR a.id_store IS NULL
+               OR e.total <> a.total
+               OR e.utility <> a.utility
+               OR e.items <> a.items
+               OR e.sale_count <> a.sale_count
+               OR e.cancel_count <> a.cancel_count
+            ORDER BY 1, 2
+        """, params)
+        columnas = [col[0] for col in cursor.description]
+        return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
@@ -0,0 +1,84 @@
+"""
+Búsqueda de productos por nombre.
+
+Las búsquedas usan el índice de trigramas ``products_name_trgm_idx``
+(extensión ``pg_trgm``, ver la migración 0016) en lugar de recorrer la tabla:
+
+- ``filtrar_por_nombre``: productos cuyo nombre contiene el término
+  (``ILIKE``), para la tabla de productos.
+- ``buscar_productos``: los mejores resultados para un autocompletado. Además
+  de las subcadenas, acepta nombres parecidos (errores de tipeo) con el
+  operador de similitud ``%``, y ordena primero los que empiezan con el
+  término y luego por similitud.
+
+El índice es parcial sobre ``status_product``: las consultas deben filtrar
+los productos activos para que el planificador lo use.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .stock_ledger import sql_stock_actual
+
+LIMITE_MAXIMO = 50
+
+
+def _escapar_like(termino):
+    return termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filtrar_por_nombre(productos, termino):
+    """Filtra un queryset de Products por los nombres que contienen ``termino``"""
+    return productos.filter(id_product__in=RawSQL(
+        "SELECT id_product FROM products WHERE status_product AND name ILIKE %s",
+        [f'%{_escapar_like(termino)}%'],
+    ))
+
+
+def buscar_productos(id_store, termino, limite=10, con_stock=False):
+    """
+    Productos activos de la tienda que coinciden con ``termino``
+
+    Args:
+        id_store: Tienda del usuario
+        termino (str): Texto buscado
+        limite (int): Cantidad máxima de resultados (hasta ``LIMITE_MAXIMO``)
+        con_stock (bool): Solo productos con stock disponible
+
+    Returns:
+        list: Diccionarios con id_product, name, price_sale y stock_actual,
+        los más relevantes primero
+    """
+    termino = termino.strip()
+    if not termino:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    escapado = _escapar_like(termino)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id_product, name, price_sale, stock_actual
+            FROM (
+                SELECT
+                    p.id_product, p.name, p.price_sale,
+                    {sql_stock_actual('p')} AS stock_actual,
+                    p.name ILIKE %(prefijo)s AS al_inicio,
+                    similarity(p.name, %(termino)s) AS puntaje
+                FROM products p
+                WHERE p.id_store = %(id_store)s AND p.status_product
+                  AND (p.name ILIKE %(contiene)s OR p.name %% %(termino)s)
+            ) p
+            WHERE NOT %(con_stock)s OR p.stock_actual > 0
+            ORDER BY p.al_inicio DESC, p.puntaje DESC, p.name
+            LIMIT %(limite)s
+        """, {
+            'id_store': str(id_store),
+            'termino': termino,
+            'prefijo': f'{escapado}%',
+            'contiene': f'%{escapado}%',
+            'con_stock': con_stock,
+            'limite': limite,
+        })
+        return [
+            {'id_product': str(id_product), 'name': name, 'price_sale': price_sale, 'stock_actual': stock_actual}
+            for id_product, name, price_sale, stock_actual in cursor.fetchall()
+        ]
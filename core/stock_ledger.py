@@ -0,0 +1,222 @@
+"""
+Libro de movimientos de stock (tabla ``stock_movement``).
+
+Las ventas, cancelaciones y ajustes ya no actualizan ``products.stock``: cada
+cambio se agrega como una fila con su delta, de modo que las ventas no
+bloquean la fila de ``products`` (que leen el catálogo, las ediciones y los
+listados) y queda un registro de cada cambio de stock.
+
+El stock actual de un producto es ``products.stock`` (saldo compactado) más la
+suma de sus movimientos con ``compacted = false``. ``compactar_stock`` suma
+periódicamente esos movimientos al saldo y los marca como compactados en la
+misma sentencia; los montos de las filas nunca cambian. Un movimiento que aún
+no se confirmó no es visible para la compactación, por lo que se suma en la
+siguiente y ninguno se pierde.
+
+Para no vender más de lo disponible, ``reservar_stock`` toma un bloqueo
+consultivo exclusivo por producto antes de leer el stock y lo mantiene hasta
+el final de la transacción. Es intencional: las ventas simultáneas de un
+mismo producto se validan una después de la otra, cada una contra el stock
+que dejó la anterior, y dos cajas que venden el mismo producto sí se
+esperan. Las ventas de productos distintos no se esperan entre sí, y las
+cancelaciones no toman el bloqueo porque solo suman stock.
+
+El stock actual se lee con el índice parcial por ``id_product`` de los
+movimientos sin compactar (migración 0020), sin recorrer el historial.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+# Deltas sin compactar por producto de una tienda, para unir a ``products p``
+# en consultas que usan el parámetro con nombre ``%(id_store)s``
+SQL_PENDIENTES_TIENDA = """
+    (SELECT id_product, SUM(delta) AS delta
+     FROM stock_movement
+     WHERE id_store = %(id_store)s AND NOT compacted
+     GROUP BY id_product)
+"""
+
+
+def sql_stock_actual(alias='p'):
+    """Expresión SQL del stock actual de la fila ``alias`` de products"""
+    return f"""({alias}.stock + COALESCE((
+        SELECT SUM(m.delta) FROM stock_movement m
+        WHERE m.id_product = {alias}.id_product AND NOT m.compacted
+    ), 0))"""
+
+
+def anotar_stock_actual(productos):
+    """Agrega ``stock_actual`` (saldo más movimientos pendientes) a un queryset de Products"""
+    from .models import StockMovement
+
+    pendientes = StockMovement.objects.filter(
+        id_product=OuterRef('pk'),
+        compacted=False
+    ).values('id_product').annotate(total=Sum('delta')).values('total')
+
+    return productos.annotate(
+        stock_actual=F('stock') + Coalesce(
+            Subquery(pendientes, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+def stock_actual(cursor, ids_producto):
+    """Devuelve {id_product (str): stock actual} de los productos indicados"""
+    cursor.execute(f"""
+        SELECT p.id_product, {sql_stock_actual('p')}
+        FROM products p
+        WHERE p.id_product = ANY(%s::uuid[])
+    """, [list(ids_producto)])
+    return {str(id_product): stock for id_product, stock in cursor.fetchall()}
+
+
+def registrar_movimientos(cursor, movimientos):
+    """
+    Agrega movimientos al libro con un solo INSERT
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        movimientos (list): Tuplas (id_product, id_store, delta, motivo,
+            id_sale, id_user)
+    """
+    if not movimientos:
+        return
+
+    fila_sql = '(%s::uuid, %s::uuid, %s::numeric, %s, %s::uuid, %s::uuid, %s)'
+    params = []
+    ahora = datetime.now()
+    for id_product, id_store, delta, motivo, id_sale, id_user in movimientos:
+        params.extend([
+            str(id_product), str(id_store), delta, motivo,
+            str(id_sale) if id_sale else None,
+            str(id_user) if id_user else None,
+            ahora,
+        ])
+
+    cursor.execute(f"""
+        INSERT INTO stock_movement (id_product, id_store, delta, reason, id_sale, id_user, created_at)
+        VALUES {', '.join([fila_sql] * len(movimientos))}
+    """, params)
+
+
+def registrar_devoluciones(cursor, ids_venta, user_id=None):
+    """
+    Devuelve al stock las líneas de ventas canceladas con un solo INSERT ... SELECT
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        ids_venta (list): UUIDs de las ventas canceladas
+        user_id: UUID del usuario que cancela
+
+    Returns:
+        list: IDs (str) de los productos que recuperaron stock
+    """
+    cursor.execute("""
+        INSERT INTO stock_movement (id_product, id_store, delta, reason, id_sale, id_user, created_at)
+        SELECT sb.id_product, s.id_store, SUM(sb.quantitity), 'cancelacion', sb.id_sale, %s::uuid, %s
+        FROM sales_bag sb
+        INNER JOIN sales s ON s.id_sale = sb.id_sale
+        WHERE sb.id_sale = ANY(%s::uuid[])
+        GROUP BY sb.id_sale, sb.id_product, s.id_store
+        RETURNING id_product
+    """, [str(user_id) if user_id else None, datetime.now(), list(ids_venta)])
+    return sorted({str(fila[0]) for fila in cursor.fetchall()})
+
+
+def reservar_stock(cursor, cantidades):
+    """
+    Toma los bloqueos necesarios para descontar stock y devuelve el stock actual
+
+    Debe llamarse dentro de la transacción que registrará los movimientos: los
+    bloqueos consultivos se liberan al terminarla.
+
+    Args:
+        cursor: Cursor de la transacción en curso
+        cantidades (dict): Cantidad a descontar por id_product (str)
+
+    Returns:
+        dict: Stock actual por id_product (str), leído después de tomar los
+        bloqueos. Los productos inexistentes no aparecen.
+    """
+    ids = sorted(cantidades)
+
+    # Bloqueo exclusivo por producto, siempre en orden de id_product para no
+    # producir deadlocks
+    cursor.execute("""
+        SELECT pg_advisory_xact_lock(hashtextextended(b.id_product::text, 0))
+        FROM (
+            SELECT id_product
+            FROM unnest(%s::uuid[]) AS id_product
+            ORDER BY id_product
+        ) b
+    """, [ids])
+
+    # Leer después de los bloqueos: incluye las ventas del mismo producto que
+    # terminaron mientras se esperaba
+    return stock_actual(cursor, ids)
+
+
+def ajustar_stock(id_store, id_product, nuevo_stock, user_id=None):
+    """
+    Fija el stock de un producto registrando un ajuste por la diferencia
+
+    Returns:
+        Decimal: Delta registrado (0 si el stock ya era ese)
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Exclusivo: ninguna venta puede cambiar el stock mientras se calcula la diferencia
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtextextended(%s::uuid::text, 0))",
+            [str(id_product)]
+        )
+        actual = stock_actual(cursor, [id_product]).get(str(id_product))
+        if actual is None:
+            return 0
+        delta = nuevo_stock - actual
+        if delta:
+            registrar_movimientos(cursor, [(id_product, id_store, delta, 'ajuste', None, user_id)])
+    return delta
+
+
+def compactar_stock(id_store=None):
+    """
+    Suma los movimientos pendientes al saldo de products.stock
+
+    Marca los movimientos como compactados y actualiza el saldo en una sola
+    sentencia, por lo que ninguna lectura ve un movimiento contado dos veces.
+
+    Returns:
+        int: Cantidad de productos actualizados
+    """
+    filtro = ''
+    params = []
+    if id_store:
+        filtro = 'AND id_store = %s'
+        params.append(str(id_store))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH compactados AS (
+                UPDATE stock_movement
+                SET compacted = TRUE
+                WHERE NOT compacted {filtro}
+                RETURNING id_product, delta
+            ),
+            totales AS (
+                SELECT id_product, SUM(delta) AS delta
+                FROM compactados
+                GROUP BY id_product
+            )
+            UPDATE products p
+            SET stock = p.stock + t.delta
+            FROM totales t
+            WHERE p.id_product = t.id_product
+        """, params)
+        return cursor.rowcount
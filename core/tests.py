@@ -1,3 +1,1398 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import (
+    alerts, analytics, cancellation, chart_cache, chart_executor, charts, checkout, image_store, metrics, pagination,
+    recipients, rollups, search, stock_ledger, thumbnails, transports, uploads,
+)
+from .management.commands import servidor_resend_falso
+from .models import Category, Products, Stores, Users, UsersInfo
+
+
+class VentasTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tienda = Stores.objects.create(
+            id_store=uuid.uuid4(), name='Tienda', direction='Calle 1', phone='123', administrator_name='Ana'
+        )
+        cls.usuario = Users.objects.create(
+            id_store=cls.tienda, username='caja', password='x', type_user=False, state_user=True
+        )
+        cls.producto = cls.crear_producto('Café', 10)
+
+    def stock(self):
+        with connection.cursor() as cursor:
+            return stock_ledger.stock_actual(cursor, [self.producto.id_product])[str(self.producto.id_product)]
+
+    @classmethod
+    def crear_producto(cls, nombre, stock, activo=True, precio_compra=Decimal('600')):
+        return Products.objects.create(
+            name=nombre, price_sale=Decimal('1000'), price_buy=precio_compra, stock=Decimal(stock),
+            description='', category='Bebidas', status_product=activo, id_store=cls.tienda,
+        )
+
+    def vender(self, cantidad, fecha=date(2025, 1, 15), producto=None):
+        producto = producto or self.producto
+        return checkout.registrar_venta(
+            self.tienda.id_store, self.usuario.id_user,
+            [{'id_product': producto.id_product, 'quantity': cantidad}], 'efectivo',
+            fecha=fecha,
+        )
+
+    def lote(self, *ventas):
+        return checkout.registrar_ventas_lote(self.tienda.id_store, self.usuario.id_user, [
+            {
+                'clave': clave,
+                'productos': [{'id_product': str(self.producto.id_product), 'quantity': cantidad}],
+                'metodo_pago': 'efectivo',
+            }
+            for clave, cantidad in ventas
+        ])
+
+    def rollup(self, dia=date(2025, 1, 15)):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT total, items, sale_count, cancel_count
+                FROM sales_daily_rollup
+                WHERE id_store = %s AND day = %s
+            """, [str(self.tienda.id_store), dia])
+            return cursor.fetchone()
+
+    def insertar_venta_historica(self, dia, total, completada=True):
+        """Venta registrada sin pasar por el resumen (como las anteriores a 0005)"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO sales (date_sale, items, total, pay_method, state, utility, id_store)
+                VALUES (%s, 1, %s, 'efectivo', %s, %s, %s)
+            """, [dia, total, completada, total / 2, str(self.tienda.id_store)])
+
+
+class CheckoutTests(VentasTestCase):
+
+    def test_venta_descuenta_stock_y_guarda_precios(self):
+        venta = self.vender(3)
+
+        self.assertEqual(venta.total, Decimal('3000'))
+        self.assertEqual(venta.utilidad, Decimal('1200'))
+        self.assertEqual(self.stock(), Decimal('7'))
+
+        # El precio de la línea no cambia si después cambia el del producto
+        Products.objects.filter(pk=self.producto.pk).update(price_sale=Decimal('2000'))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT unit_price, unit_cost FROM sales_bag WHERE id_sale = %s", [venta.id_sale])
+            self.assertEqual(cursor.fetchall(), [(Decimal('1000'), Decimal('600'))])
+
+    def test_sobreventa_rechazada(self):
+        with self.assertRaises(checkout.StockInsuficiente):
+            self.vender(11)
+
+        self.assertEqual(self.stock(), Decimal('10'))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sales WHERE id_store = %s", [str(self.tienda.id_store)])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_lote_no_vende_mas_que_el_stock(self):
+        resultados = self.lote(('caja-1', 6), ('caja-2', 6))
+
+        self.assertEqual([r['estado'] for r in resultados], ['creada', 'rechazada'])
+        self.assertEqual(self.stock(), Decimal('4'))
+
+    def test_clave_repetida_devuelve_la_misma_venta(self):
+        primera, = self.lote(('caja-1', 2))
+        repetida, = self.lote(('caja-1', 2))
+
+        self.assertEqual(primera['estado'], 'creada')
+        self.assertEqual(repetida['estado'], 'existente')
+        self.assertEqual(repetida['id_sale'], primera['id_sale'])
+        self.assertEqual(self.stock(), Decimal('8'))
+
+    def test_clave_rechazada_se_puede_reintentar(self):
+        rechazada, = self.lote(('caja-1', 50))
+        reintento, = self.lote(('caja-1', 5))
+
+        self.assertEqual(rechazada['estado'], 'rechazada')
+        self.assertEqual(reintento['estado'], 'creada')
+
+
+class StockLedgerTests(VentasTestCase):
+
+    def test_compactar_conserva_el_stock(self):
+        self.vender(2)
+        self.vender(1)
+        stock_ledger.ajustar_stock(self.tienda.id_store, self.producto.id_product, Decimal('20'))
+        antes = self.stock()
+
+        self.assertEqual(stock_ledger.compactar_stock(self.tienda.id_store), 1)
+
+        self.assertEqual(self.stock(), antes)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, antes)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM stock_movement WHERE id_product = %s AND NOT compacted",
+                [str(self.producto.id_product)]
+            )
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_ajuste_registra_la_diferencia(self):
+        delta = stock_ledger.ajustar_stock(self.tienda.id_store, self.producto.id_product, Decimal('4'))
+
+        self.assertEqual(delta, Decimal('-6'))
+        self.assertEqual(self.stock(), Decimal('4'))
+
+
+class CancelacionTests(VentasTestCase):
+
+    def test_cancelar_restaura_stock_y_resumen(self):
+        venta = self.vender(4)
+        self.assertEqual(self.rollup(), (Decimal('4000'), Decimal('4'), 1, 0))
+
+        canceladas = cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale])
+
+        self.assertEqual(canceladas, [venta.id_sale])
+        self.assertEqual(self.stock(), Decimal('10'))
+        self.assertEqual(self.rollup(), (Decimal('0'), Decimal('0'), 0, 1))
+
+    def test_cancelar_dos_veces_no_devuelve_stock_dos_veces(self):
+        venta = self.vender(4)
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale])
+
+        self.assertEqual(cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale]), [])
+        self.assertEqual(self.stock(), Decimal('10'))
+        self.assertEqual(self.rollup(), (Decimal('0'), Decimal('0'), 0, 1))
+
+
+class KpisTests(VentasTestCase):
+
+    def test_kpis_del_catalogo_y_ventas(self):
+        self.crear_producto('Té', 3)
+        self.crear_producto('Agua', 0)
+        self.crear_producto('Descontinuado', 50, activo=False)
+        Category.objects.create(name_category='Bebidas', id_store=self.tienda)
+        hoy = datetime.now().date()
+        self.vender(2, fecha=hoy)
+        cancelada = self.vender(1, fecha=hoy)
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [cancelada.id_sale])
+
+        kpis, perfil = metrics.calcular_kpis_tienda(self.tienda)
+
+        self.assertEqual(kpis['productos_activos'], 3)
+        self.assertEqual(kpis['productos_sin_stock'], 1)
+        # Café quedó en 8 y Té en 3, ambos bajo el umbral
+        self.assertEqual(kpis['productos_stock_bajo'], 2)
+        self.assertEqual(kpis['valor_inventario'], Decimal('600') * 11)
+        self.assertEqual(kpis['total_usuarios'], 1)
+        self.assertEqual(kpis['total_categorias'], 1)
+        self.assertEqual(kpis['total_ventas'], 2)
+        self.assertEqual(kpis['ventas_activas'], 1)
+        self.assertEqual(kpis['ventas_canceladas'], 1)
+        self.assertEqual(kpis['ingresos_hoy'], Decimal('2000'))
+        self.assertEqual(kpis['promedio_venta'], Decimal('2000'))
+        # Una consulta por grupo de KPIs
+        self.assertEqual({grupo: datos['consultas'] for grupo, datos in perfil.items()}, {'catalogo': 1, 'ventas': 1})
+
+
+class RollupTests(VentasTestCase):
+
+    def test_ventas_y_cancelaciones_mantienen_el_resumen(self):
+        self.vender(2)
+        venta = self.vender(1)
+        self.vender(1, fecha=date(2025, 1, 16))
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale])
+
+        self.assertEqual(self.rollup(), (Decimal('2000'), Decimal('2'), 1, 1))
+        self.assertEqual(rollups.verificar_rollup(self.tienda.id_store), [])
+
+    def test_reconstruir_incluye_las_ventas_historicas(self):
+        self.vender(2)
+        self.insertar_venta_historica(date(2024, 12, 1), Decimal('500'))
+        self.insertar_venta_historica(date(2024, 12, 1), Decimal('300'), completada=False)
+        self.assertEqual(len(rollups.verificar_rollup(self.tienda.id_store)), 1)
+
+        rollups.reconstruir_rollup(self.tienda.id_store)
+
+        self.assertEqual(rollups.verificar_rollup(self.tienda.id_store), [])
+        self.assertEqual(self.rollup(date(2024, 12, 1)), (Decimal('500'), Decimal('1'), 1, 1))
+        self.assertEqual(self.rollup(), (Decimal('2000'), Decimal('2'), 1, 0))
+
+    def test_migracion_0017_llena_el_resumen(self):
+        self.insertar_venta_historica(date(2024, 12, 1), Decimal('500'))
+        self.insertar_venta_historica(date(2024, 12, 2), Decimal('700'))
+        migracion = importlib.import_module('core.migrations.0017_fill_sales_daily_rollup').Migration
+
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.operations[0].sql)
+
+        self.assertEqual(rollups.verificar_rollup(), [])
+        self.assertEqual(rollups.conteo_ventas(self.tienda.id_store)['completadas'], 2)
+
+
+class CacheLRUTests(SimpleTestCase):
+
+    def test_expulsa_los_menos_usados_por_cantidad(self):
+        cache = chart_cache._CacheLRU(max_entradas=2, max_bytes=1000)
+        cache.set('a', 1, 'x')
+        cache.set('b', 1, 'y')
+        cache.get('a')
+        cache.set('c', 1, 'z')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (1, 'x'))
+        self.assertEqual(cache.get('c'), (1, 'z'))
+
+    def test_respeta_el_limite_de_bytes(self):
+        cache = chart_cache._CacheLRU(max_entradas=10, max_bytes=10)
+        cache.set('a', 1, 'x' * 6)
+        cache.set('b', 1, 'y' * 6)
+        cache.set('grande', 1, 'z' * 11)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('grande'))
+        self.assertEqual(cache.get('b'), (1, 'y' * 6))
+
+
+class ChartCacheTests(VentasTestCase):
+
+    def setUp(self):
+        chart_cache._fragmentos.clear()
+
+    def guardar_grafico(self):
+        _, version = chart_cache.obtener_vigente(self.tienda.id_store, 'stock')
+        chart_cache.guardar(self.tienda.id_store, 'stock', version, '{"data":[]}')
+
+    def test_una_venta_invalida_los_graficos_al_confirmar(self):
+        self.guardar_grafico()
+        self.assertEqual(chart_cache.obtener_vigente(self.tienda.id_store, 'stock')[0], '{"data":[]}')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(1)
+
+        self.assertIsNone(chart_cache.obtener_vigente(self.tienda.id_store, 'stock')[0])
+
+    def test_editar_un_producto_invalida_los_graficos(self):
+        self.guardar_grafico()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.name = 'Café molido'
+            self.producto.save()
+
+        self.assertIsNone(chart_cache.obtener_vigente(self.tienda.id_store, 'stock')[0])
+
+    def test_la_version_no_cambia_si_se_revierte(self):
+        antes = chart_cache.version_datos(self.tienda.id_store)
+
+        with self.captureOnCommitCallbacks(execute=False) as pendientes:
+            with self.assertRaises(checkout.StockInsuficiente):
+                self.vender(100)
+
+        self.assertEqual(pendientes, [])
+        self.assertEqual(chart_cache.version_datos(self.tienda.id_store), antes)
+
+
+class ChartSpecTests(SimpleTestCase):
+
+    def test_stock_colorea_segun_nivel(self):
+        spec = charts.spec_stock_productos([('A', 20), ('B', 3), ('C', 0)])
+
+        barras = spec['data'][0]
+        self.assertEqual(barras['x'], ['A', 'B', 'C'])
+        self.assertEqual(barras['marker']['color'], ['#10b981', '#f59e0b', '#ef4444'])
+        self.assertEqual(spec['layout']['width'], 1600)
+
+    def test_ganancias_acumula_por_dia(self):
+        spec = charts.spec_historial_ganancias([('2025-01-01', 100.0), ('2025-01-02', 50.0)])
+
+        acumulada, del_dia = spec['data']
+        self.assertEqual(acumulada['y'], [100.0, 150.0])
+        self.assertEqual(del_dia['y'], [100.0, 50.0])
+
+    def test_sin_datos_muestra_mensaje(self):
+        for nombre, (_, spec) in charts.GRAFICOS.items():
+            with self.subTest(nombre):
+                resultado = spec([])
+                self.assertEqual(resultado['data'], [])
+                self.assertTrue(resultado['layout']['annotations'])
+
+    def test_json_escapa_html(self):
+        texto = charts.construir_json('stock', [('</script><b>&', 1)])
+
+        self.assertNotIn('<', texto)
+        self.assertNotIn('>', texto)
+        self.assertNotIn('&', texto)
+        self.assertEqual(json.loads(texto)['data'][0]['x'], ['</script><b>&'])
+
+
+def _consulta_lenta(id_store):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_sleep(2)")
+    return []
+
+
+@override_settings(GRAFICOS_EJECUTOR={'TIPO': 'secuencial', 'TIMEOUT': 0.2})
+class ChartExecutorTests(VentasTestCase):
+
+    def setUp(self):
+        chart_cache._fragmentos.clear()
+
+    def test_genera_y_guarda_en_cache(self):
+        fragmento = chart_executor.generar_grafico(self.tienda.id_store, 'stock')
+
+        self.assertEqual(json.loads(fragmento)['data'][0]['x'], ['Café'])
+        self.assertEqual(chart_cache.obtener_vigente(self.tienda.id_store, 'stock')[0], fragmento)
+
+    def test_statement_timeout_corta_la_consulta(self):
+        lento = (_consulta_lenta, charts.spec_stock_productos)
+        with mock.patch.dict(charts.GRAFICOS, {'lento': lento}), \
+                mock.patch('builtins.print'), mock.patch.object(charts.traceback, 'print_exc'):
+            fragmento = chart_executor.generar_grafico(self.tienda.id_store, 'lento')
+
+        self.assertIn('statement timeout', fragmento)
+        self.assertIsNone(chart_cache.obtener_vigente(self.tienda.id_store, 'lento')[0])
+
+        # El límite era local a la transacción del gráfico
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], '0')
+
+
+class DashboardBundleTests(VentasTestCase):
+
+    def setUp(self):
+        chart_cache._fragmentos.clear()
+        sesion = self.client.session
+        sesion['user_id'] = str(self.usuario.id_user)
+        sesion.save()
+
+    def test_revalida_con_etag(self):
+        respuesta = self.client.get('/api/dashboard-bundle/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+        self.assertIsInstance(json.loads(respuesta.content), dict)
+        etag = respuesta['ETag']
+
+        respuesta = self.client.get('/api/dashboard-bundle/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+
+    def test_una_venta_cambia_el_etag(self):
+        etag = self.client.get('/api/dashboard-bundle/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(1, fecha=date.today())
+
+        respuesta = self.client.get('/api/dashboard-bundle/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_sin_sesion(self):
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get('/api/dashboard-bundle/').status_code, 401)
+
+
+class RelojFalso:
+    """Reemplaza time.monotonic y time.sleep: dormir solo avanza el reloj"""
+
+    def __init__(self):
+        self.ahora = 0.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+
+class BaldeFichasTests(SimpleTestCase):
+
+    def setUp(self):
+        self.reloj = RelojFalso()
+        parche = mock.patch.multiple(alerts.time, monotonic=self.reloj.monotonic, sleep=self.reloj.sleep)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_rafaga_sin_esperar(self):
+        balde = alerts.BaldeFichas(tasa=2, capacidad=3)
+        for _ in range(3):
+            balde.tomar()
+
+        self.assertEqual(self.reloj.esperas, [])
+
+    def test_respeta_la_tasa(self):
+        balde = alerts.BaldeFichas(tasa=2, capacidad=1)
+        for _ in range(5):
+            balde.tomar()
+
+        # La primera ficha estaba disponible; las otras cuatro llegan cada 0,5 s
+        self.assertAlmostEqual(self.reloj.ahora, 2.0)
+
+    def test_no_acumula_mas_que_la_capacidad(self):
+        balde = alerts.BaldeFichas(tasa=2, capacidad=2)
+        self.reloj.ahora += 60
+        for _ in range(3):
+            balde.tomar()
+
+        self.assertAlmostEqual(self.reloj.ahora, 60.5)
+
+
+class AlertasTestCase(VentasTestCase):
+
+    def alertas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT status, payload
+                FROM alert_outbox
+                WHERE id_store = %s
+                ORDER BY id_alert
+            """, [str(self.tienda.id_store)])
+            return [
+                (estado, json.loads(payload) if isinstance(payload, str) else payload)
+                for estado, payload in cursor.fetchall()
+            ]
+
+
+class OutboxTests(AlertasTestCase):
+
+    def test_venta_bajo_el_umbral_encola_alerta(self):
+        self.vender(6)
+
+        (estado, payload), = self.alertas()
+        self.assertEqual(estado, alerts.PENDIENTE)
+        self.assertEqual(payload, {'id_product': str(self.producto.id_product), 'producto': 'Café', 'stock': 4})
+
+    def test_venta_rechazada_no_encola(self):
+        with self.assertRaises(checkout.StockInsuficiente):
+            self.vender(11)
+
+        self.assertEqual(self.alertas(), [])
+
+    def test_un_solo_despachador(self):
+        self.assertTrue(alerts.tomar_turno_despachador())
+        self.addCleanup(alerts.liberar_turno_despachador)
+
+        # Otro proceso usa otra conexión y no obtiene el turno
+        otra = connection.copy()
+        try:
+            with otra.cursor() as cursor:
+                cursor.execute(f"SELECT pg_try_advisory_lock({alerts._SQL_TURNO_DESPACHADOR})")
+                self.assertFalse(cursor.fetchone()[0])
+        finally:
+            otra.close()
+
+
+@override_settings(
+    ALERTAS_TRANSPORTE={'TIPO': 'memoria'},
+    ALERTAS_DESPACHO={'VENTANA': 0},
+    ALERTAS_EMAIL_RESPALDO=None,
+)
+class DespachoTestCase(AlertasTestCase):
+
+    def setUp(self):
+        # Transporte y directorio se guardan en memoria entre pruebas
+        transports._local.transporte = None
+        recipients._directorios.clear()
+
+    def crear_admin(self, email, nivel='medio'):
+        admin = Users.objects.create(
+            id_store=self.tienda, username=email, password='x', type_user=True, state_user=True
+        )
+        UsersInfo.objects.create(
+            id_user=admin, name=email, email=email, rut='1-9', born_date=date(1990, 1, 1), alert_level=nivel
+        )
+        return admin
+
+    def despachar(self):
+        return alerts.despachar_pendientes(balde=alerts.BaldeFichas(tasa=1000, capacidad=1000))
+
+
+class DespachoTests(DespachoTestCase):
+
+    def test_un_resumen_por_destinatario(self):
+        self.crear_admin('ana@tienda.cl')
+        self.crear_admin('luis@tienda.cl')
+        otro = self.crear_producto('Té', 10)
+        self.vender(7)
+        self.vender(9, producto=otro)
+
+        resultado = self.despachar()
+
+        self.assertEqual(resultado['emails'], 2)
+        self.assertEqual(resultado['enviadas'], 2)
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['ana@tienda.cl', 'luis@tienda.cl'])
+        self.assertIn('2 productos', mail.outbox[0].subject)
+        self.assertEqual([estado for estado, _ in self.alertas()], [alerts.ENVIADA, alerts.ENVIADA])
+
+        # Una segunda pasada no reenvía nada
+        self.assertEqual(self.despachar()['emails'], 0)
+
+    def test_cada_destinatario_recibe_su_nivel(self):
+        self.crear_admin('ana@tienda.cl', nivel='critico')
+        self.crear_admin('luis@tienda.cl', nivel='alto')
+        self.vender(7)
+
+        resultado = self.despachar()
+
+        self.assertEqual(resultado['emails'], 1)
+        email, = mail.outbox
+        self.assertEqual(email.to, ['luis@tienda.cl'])
+
+    def test_sin_destinatarios_se_descarta(self):
+        self.crear_admin('ana@tienda.cl', nivel='critico')
+        self.vender(7)
+
+        resultado = self.despachar()
+
+        self.assertEqual(resultado['descartadas'], 1)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual([estado for estado, _ in self.alertas()], [alerts.DESCARTADA])
+
+    @override_settings(ALERTAS_DESPACHO={'VENTANA': 300})
+    def test_espera_la_ventana(self):
+        self.crear_admin('ana@tienda.cl')
+        self.vender(7)
+
+        self.assertEqual(self.despachar()['emails'], 0)
+        self.assertEqual([estado for estado, _ in self.alertas()], [alerts.PENDIENTE])
+
+
+class UmbralAlertasTests(AlertasTestCase):
+
+    def setUp(self):
+        self.producto = self.crear_producto('Azúcar', 20)
+
+    def test_alerta_solo_al_cruzar_el_umbral(self):
+        self.vender(5)
+        self.assertEqual(self.alertas(), [])
+
+        self.vender(8)
+        self.vender(1)
+        self.vender(1)
+
+        # Solo la venta que cruzó el umbral alertó
+        self.assertEqual([payload['stock'] for _, payload in self.alertas()], [7])
+
+    def test_reponer_stock_rearma_la_alerta(self):
+        venta = self.vender(12)
+        self.vender(1)
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale])
+        self.assertEqual(self.stock(), Decimal('19'))
+
+        self.vender(12)
+
+        self.assertEqual([payload['stock'] for _, payload in self.alertas()], [8, 7])
+
+    def test_reponer_poco_no_rearma(self):
+        self.vender(12)
+        venta = self.vender(1)
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [venta.id_sale])
+
+        self.vender(1)
+
+        self.assertEqual([payload['stock'] for _, payload in self.alertas()], [8])
+
+    @override_settings(ALERTAS_STOCK_ENFRIAMIENTO=0)
+    def test_vuelve_a_alertar_tras_el_enfriamiento(self):
+        self.vender(12)
+        self.vender(1)
+
+        self.assertEqual([payload['stock'] for _, payload in self.alertas()], [8, 7])
+
+
+def _mensaje_prueba(email):
+    return {'from': 'alertas@tienda.cl', 'to': [email], 'subject': 'Stock bajo', 'html': '<p>Hola</p>'}
+
+
+class TransporteResendTests(SimpleTestCase):
+    """Contra el servidor del comando ``servidor_resend_falso``"""
+
+    def iniciar_servidor(self, tasa=0):
+        self.estado = servidor_resend_falso._Estado(tasa, latencia=0, fallos=0)
+        servidor = ThreadingHTTPServer(
+            ('127.0.0.1', 0), servidor_resend_falso._crear_manejador(self.estado, io.StringIO())
+        )
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return transports.TransporteResend(f'http://127.0.0.1:{servidor.server_port}/', 'clave', timeout=5)
+
+    def test_lote_en_una_solicitud(self):
+        transporte = self.iniciar_servidor()
+
+        ids = transporte.enviar_lote([_mensaje_prueba(f'admin{i}@tienda.cl') for i in range(3)])
+
+        self.assertEqual(len(ids), 3)
+        self.assertTrue(all(ids))
+        self.assertEqual((self.estado.solicitudes, self.estado.emails), (1, 3))
+
+    def test_un_mensaje_usa_el_endpoint_simple(self):
+        transporte = self.iniciar_servidor()
+
+        id_email, = transporte.enviar_lote([_mensaje_prueba('ana@tienda.cl')])
+
+        self.assertTrue(id_email)
+        self.assertEqual(self.estado.emails, 1)
+
+    def test_limite_de_tasa(self):
+        transporte = self.iniciar_servidor(tasa=1)
+        transporte.enviar_lote([_mensaje_prueba('ana@tienda.cl')])
+
+        with self.assertRaisesMessage(transports.ErrorTransporte, '429'):
+            transporte.enviar_lote([_mensaje_prueba('ana@tienda.cl')])
+
+    @override_settings(ALERTAS_TRANSPORTE={'TIPO': 'resend'})
+    def test_falta_la_clave(self):
+        with mock.patch.dict('os.environ', {}, clear=True):
+            with self.assertRaises(transports.ErrorTransporte):
+                transports.crear_transporte()
+
+
+class TransporteIntermitente:
+    """Transporte de a un mensaje que falla la primera vez para ciertos emails"""
+
+    max_lote = 1
+
+    def __init__(self, fallan):
+        self.fallan = set(fallan)
+        self.entregados = []
+
+    def enviar_lote(self, mensajes):
+        email, = mensajes[0]['to']
+        if email in self.fallan:
+            self.fallan.remove(email)
+            raise transports.ErrorTransporte('Fallo simulado')
+        self.entregados.append(email)
+        return [None]
+
+
+class ReintentoDespachoTests(DespachoTestCase):
+
+    def test_reintenta_solo_a_quien_fallo(self):
+        self.crear_admin('ana@tienda.cl')
+        self.crear_admin('luis@tienda.cl')
+        transporte = transports._local.transporte = TransporteIntermitente(['luis@tienda.cl'])
+        self.vender(7)
+
+        with mock.patch('builtins.print'):
+            resultado = self.despachar()
+        self.assertEqual(resultado['reprogramadas'], 1)
+        self.assertEqual(transporte.entregados, ['ana@tienda.cl'])
+
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE alert_outbox SET next_attempt_at = now() WHERE id_store = %s", [
+                str(self.tienda.id_store)
+            ])
+        resultado = self.despachar()
+
+        self.assertEqual(resultado['enviadas'], 1)
+        self.assertEqual(transporte.entregados, ['ana@tienda.cl', 'luis@tienda.cl'])
+        self.assertEqual([estado for estado, _ in self.alertas()], [alerts.ENVIADA])
+
+
+def _imagen(formato='PNG', tamano=(4, 4), color=(200, 30, 30), modo='RGB'):
+    from PIL import Image
+
+    salida = io.BytesIO()
+    Image.new(modo, tamano, color).save(salida, formato)
+    return salida.getvalue()
+
+
+class AlmacenTemporalMixin:
+    """Usa un directorio temporal como raíz del almacén de imágenes"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(IMAGENES_PRODUCTOS_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.raiz = directorio.name
+
+
+class ImageStoreTests(AlmacenTemporalMixin, SimpleTestCase):
+
+    def test_guarda_por_contenido(self):
+        contenido = _imagen()
+        sha256 = image_store.guardar_imagen(contenido)
+
+        self.assertEqual(sha256, hashlib.sha256(contenido).hexdigest())
+        self.assertEqual(
+            image_store.ruta_imagen(sha256),
+            os.path.join(self.raiz, sha256[:2], sha256[2:4], sha256),
+        )
+        with image_store.abrir_imagen(sha256) as archivo:
+            self.assertEqual(archivo.read(), contenido)
+
+    def test_mismo_contenido_mismo_archivo(self):
+        contenido = _imagen()
+        subida = SimpleUploadedFile('foto.png', contenido, content_type='image/png')
+
+        self.assertEqual(image_store.guardar_imagen(contenido), image_store.guardar_imagen(subida))
+        self.assertEqual(image_store.guardar_imagen(io.BytesIO(contenido)), image_store.guardar_imagen(contenido))
+        # Sin temporales olvidados
+        self.assertEqual([nombre for nombre in os.listdir(self.raiz) if nombre.startswith('.')], [])
+
+    def test_rechaza_referencias_invalidas(self):
+        for referencia in (None, '', '../../etc/passwd', 'A' * 64, 'a' * 63):
+            with self.subTest(referencia=referencia):
+                with self.assertRaises(ValueError):
+                    image_store.ruta_imagen(referencia)
+
+    def test_tipo_contenido(self):
+        casos = {
+            'PNG': 'image/png',
+            'JPEG': 'image/jpeg',
+            'GIF': 'image/gif',
+            'WEBP': 'image/webp',
+            'BMP': 'image/bmp',
+        }
+        for formato, tipo in casos.items():
+            with self.subTest(formato):
+                self.assertEqual(image_store.tipo_contenido(_imagen(formato)), tipo)
+        self.assertEqual(image_store.tipo_contenido(b'%PDF-1.4'), 'application/octet-stream')
+
+    def test_eliminar_es_idempotente(self):
+        sha256 = image_store.guardar_imagen(_imagen())
+        image_store.eliminar_imagen(sha256)
+        image_store.eliminar_imagen(sha256)
+
+        self.assertFalse(os.path.exists(image_store.ruta_imagen(sha256)))
+
+
+class ImagenesProductoTests(AlmacenTemporalMixin, VentasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.categoria = Category.objects.create(name_category='Bebidas', id_store=self.tienda)
+        sesion = self.client.session
+        sesion['user_id'] = str(self.usuario.id_user)
+        sesion.save()
+
+    def formulario(self, imagen=None, **cambios):
+        datos = {
+            'name': 'Jugo', 'stock': '10', 'price_sale': '1500', 'price_buy': '900',
+            'category': str(self.categoria.id_category), 'description': 'Naranja',
+            **cambios,
+        }
+        if imagen is not None:
+            datos['image'] = SimpleUploadedFile('foto.png', imagen, content_type='image/png')
+        return datos
+
+    def existe(self, sha256):
+        return os.path.exists(image_store.ruta_imagen(sha256))
+
+    def test_agregar_guarda_la_imagen_en_el_almacen(self):
+        imagen = _imagen()
+        self.client.post('/productos/agregar/', self.formulario(imagen))
+
+        producto = Products.objects.get(name='Jugo')
+        self.assertEqual(producto.image_sha256, hashlib.sha256(imagen).hexdigest())
+        self.assertTrue(self.existe(producto.image_sha256))
+
+    def test_agregar_con_precio_invalido_no_escribe_la_imagen(self):
+        imagen = _imagen()
+        self.client.post('/productos/agregar/', self.formulario(imagen, price_sale='mil'))
+
+        self.assertFalse(Products.objects.filter(name='Jugo').exists())
+        self.assertFalse(self.existe(hashlib.sha256(imagen).hexdigest()))
+
+    def test_editar_borra_la_imagen_reemplazada(self):
+        anterior = image_store.guardar_imagen(_imagen(color=(0, 0, 255)))
+        Products.objects.filter(pk=self.producto.pk).update(image_sha256=anterior)
+
+        nueva = _imagen()
+        self.client.post(f'/productos/editar/{self.producto.id_product}/', self.formulario(nueva))
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.image_sha256, hashlib.sha256(nueva).hexdigest())
+        self.assertTrue(self.existe(self.producto.image_sha256))
+        self.assertFalse(self.existe(anterior))
+
+    def test_editar_conserva_la_imagen_compartida(self):
+        anterior = image_store.guardar_imagen(_imagen(color=(0, 0, 255)))
+        otro = self.crear_producto('Té', 5)
+        Products.objects.filter(pk__in=[self.producto.pk, otro.pk]).update(image_sha256=anterior)
+
+        self.client.post(f'/productos/editar/{self.producto.id_product}/', self.formulario(_imagen()))
+
+        self.assertTrue(self.existe(anterior))
+
+
+@override_settings(MINIATURAS={'TAMANOS': {'lista': 80, 'detalle': 256}})
+class MiniaturasTests(AlmacenTemporalMixin, SimpleTestCase):
+
+    def test_genera_cada_tamano_y_formato(self):
+        from PIL import Image
+
+        sha256 = image_store.guardar_imagen(_imagen(tamano=(800, 400)))
+
+        self.assertEqual(thumbnails.generar_miniaturas(sha256), 4)
+        for tamano, lado in (('lista', 80), ('detalle', 256)):
+            for formato in ('webp', 'jpeg'):
+                with self.subTest(tamano=tamano, formato=formato):
+                    with Image.open(thumbnails.ruta_miniatura(sha256, tamano, formato)) as miniatura:
+                        self.assertEqual(miniatura.size, (lado, lado // 2))
+
+        # Las que ya existen no se regeneran
+        self.assertEqual(thumbnails.generar_miniaturas(sha256), 0)
+
+    def test_jpeg_con_fondo_blanco(self):
+        from PIL import Image
+
+        sha256 = image_store.guardar_imagen(_imagen(tamano=(20, 20), color=(0, 0, 0, 0), modo='RGBA'))
+        thumbnails.generar_miniaturas(sha256)
+
+        with Image.open(thumbnails.ruta_miniatura(sha256, 'lista', 'jpeg')) as miniatura:
+            self.assertEqual(miniatura.mode, 'RGB')
+            self.assertTrue(all(canal > 245 for canal in miniatura.getpixel((10, 10))))
+
+    def test_prefiere_webp_si_el_navegador_lo_acepta(self):
+        sha256 = image_store.guardar_imagen(_imagen())
+        self.assertIsNone(thumbnails.buscar_miniatura(sha256, 'lista'))
+        thumbnails.generar_miniaturas(sha256)
+
+        self.assertEqual(thumbnails.buscar_miniatura(sha256, 'lista')[1], 'image/webp')
+        self.assertEqual(thumbnails.buscar_miniatura(sha256, 'lista', acepta_webp=False)[1], 'image/jpeg')
+
+
+@override_settings(MINIATURAS={'TAMANOS': {'lista': 80, 'detalle': 256}})
+class MiniaturaVistaTests(AlmacenTemporalMixin, VentasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sha256 = image_store.guardar_imagen(_imagen(tamano=(300, 300)))
+        Products.objects.filter(pk=self.producto.pk).update(image_sha256=self.sha256)
+        self.url = f'/productos/imagen/{self.producto.id_product}/lista/'
+
+    def test_sirve_la_miniatura_segun_accept(self):
+        thumbnails.generar_miniaturas(self.sha256)
+
+        webp = self.client.get(self.url, HTTP_ACCEPT='image/webp,*/*')
+        jpeg = self.client.get(self.url, HTTP_ACCEPT='image/*')
+
+        self.assertEqual(webp['Content-Type'], 'image/webp')
+        self.assertEqual(jpeg['Content-Type'], 'image/jpeg')
+        self.assertEqual(webp['Vary'], 'Accept')
+        self.assertNotEqual(webp['ETag'], jpeg['ETag'])
+
+    def test_url_con_hash_es_inmutable(self):
+        thumbnails.generar_miniaturas(self.sha256)
+
+        respuesta = self.client.get(self.url, {'v': self.sha256[:12]})
+
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_sin_miniatura_sirve_el_original_y_la_genera(self):
+        with self.captureOnCommitCallbacks() as pendientes:
+            respuesta = self.client.get(self.url)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['ETag'], f'"{self.sha256}"')
+        self.assertEqual(len(pendientes), 1)
+
+    def test_tamano_desconocido(self):
+        respuesta = self.client.get(f'/productos/imagen/{self.producto.id_product}/enorme/')
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class ImagenVistaTests(AlmacenTemporalMixin, VentasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contenido = _imagen()
+        self.sha256 = hashlib.sha256(self.contenido).hexdigest()
+        self.url = f'/productos/imagen/{self.producto.id_product}/'
+
+    def guardar_en_fila(self):
+        """Imagen anterior al almacén, aún en la columna bytea"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE products SET image = %s, image_sha256 = NULL WHERE id_product = %s",
+                [self.contenido, str(self.producto.id_product)],
+            )
+
+    def test_revalida_con_etag_sin_leer_la_imagen(self):
+        image_store.guardar_imagen(self.contenido)
+        Products.objects.filter(pk=self.producto.pk).update(image_sha256=self.sha256)
+
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['ETag'], f'"{self.sha256}"')
+        self.assertEqual(respuesta['Cache-Control'], 'public, no-cache')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.sha256}"')
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_mueve_la_imagen_de_la_fila_al_almacen(self):
+        self.guardar_en_fila()
+
+        respuesta = self.client.get(self.url)
+
+        self.assertEqual(respuesta['ETag'], f'"{self.sha256}"')
+        self.assertEqual(respuesta['Content-Type'], 'image/png')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT image_sha256, image IS NULL FROM products WHERE id_product = %s",
+                [str(self.producto.id_product)],
+            )
+            self.assertEqual(cursor.fetchone(), (self.sha256, True))
+        self.assertTrue(os.path.exists(image_store.ruta_imagen(self.sha256)))
+
+    def test_sin_imagen(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@override_settings(IMAGENES_SUBIDA={'TAMANO_MAXIMO': 2048, 'PIXELES_MAXIMOS': 10_000})
+class SubidaImagenTests(SimpleTestCase):
+
+    def subir(self, contenido):
+        request = RequestFactory().post('/', {
+            'name': 'Jugo',
+            'image': SimpleUploadedFile('foto.png', contenido, content_type='image/png'),
+        })
+        request.FILES  # procesa la subida con los handlers configurados
+        return request
+
+    def test_descarta_el_archivo_demasiado_grande(self):
+        request = self.subir(_imagen() + b'\0' * 4096)
+
+        self.assertNotIn('image', request.FILES)
+        self.assertEqual(request.POST['name'], 'Jugo')
+        with self.assertRaisesMessage(uploads.ImagenInvalida, 'tamaño máximo'):
+            uploads.validar_imagen(request)
+
+    def test_acepta_una_imagen_valida(self):
+        archivo = uploads.validar_imagen(self.subir(_imagen()))
+
+        self.assertEqual(archivo.read(), _imagen())
+
+    def test_rechaza_lo_que_no_es_imagen(self):
+        with self.assertRaises(uploads.ImagenInvalida):
+            uploads.validar_imagen(self.subir(b'%PDF-1.4 no soy una imagen'))
+
+    def test_rechaza_una_cabecera_sin_imagen(self):
+        with self.assertRaises(uploads.ImagenInvalida):
+            uploads.validar_imagen(self.subir(_imagen()[:24]))
+
+    def test_rechaza_demasiados_pixeles(self):
+        with self.assertRaisesMessage(uploads.ImagenInvalida, '200x100'):
+            uploads.validar_imagen(self.subir(_imagen(tamano=(200, 100))))
+
+    def test_sin_archivo(self):
+        request = RequestFactory().post('/', {'name': 'Jugo'})
+        self.assertIsNone(uploads.validar_imagen(request))
+
+
+@override_settings(IMAGENES_SUBIDA={'LADO_MAXIMO': 100})
+class NormalizacionTests(AlmacenTemporalMixin, VentasTestCase):
+
+    def subir(self, contenido):
+        """Como la vista: guarda la imagen, la asigna y la marca pendiente"""
+        sha256 = image_store.guardar_imagen(contenido)
+        Products.objects.filter(pk=self.producto.pk).update(image_sha256=sha256)
+        thumbnails.marcar_pendiente(sha256)
+        return sha256
+
+    def jpeg_rotado_con_exif(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientación: rotar 90°
+        exif[0x010F] = 'Cámara'
+        salida = io.BytesIO()
+        Image.new('RGB', (400, 200), (10, 120, 10)).save(salida, 'JPEG', exif=exif.tobytes())
+        return salida.getvalue()
+
+    def test_reduce_rota_y_quita_exif(self):
+        from PIL import Image
+
+        original = self.subir(self.jpeg_rotado_con_exif())
+
+        normalizada = thumbnails.normalizar_imagen(original)
+
+        self.assertNotEqual(normalizada, original)
+        with Image.open(image_store.ruta_imagen(normalizada)) as imagen:
+            self.assertEqual(imagen.size, (50, 100))
+            self.assertEqual(dict(imagen.getexif()), {})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.image_sha256, normalizada)
+        # El original con sus metadatos ya no está en el almacén
+        self.assertFalse(os.path.exists(image_store.ruta_imagen(original)))
+        self.assertFalse(thumbnails.pendiente_de_normalizar(original))
+
+    def test_se_sirve_sin_cache_mientras_esta_pendiente(self):
+        original = self.subir(self.jpeg_rotado_con_exif())
+        url = f'/productos/imagen/{self.producto.id_product}/'
+
+        respuesta = self.client.get(url, {'v': original[:12]})
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-store')
+
+        normalizada = thumbnails.normalizar_imagen(original)
+        respuesta = self.client.get(url, {'v': normalizada[:12]})
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_imagen_pequena_no_queda_pendiente(self):
+        original = self.subir(_imagen(formato='JPEG', tamano=(40, 40)))
+
+        normalizada = thumbnails.normalizar_imagen(original)
+
+        self.assertTrue(os.path.exists(image_store.ruta_imagen(normalizada)))
+        self.assertFalse(thumbnails.pendiente_de_normalizar(original))
+
+    def test_subida_repetida_reutiliza_la_normalizacion(self):
+        original = self.subir(self.jpeg_rotado_con_exif())
+        otro = self.crear_producto('Té', 5)
+
+        # Otro producto sube el mismo archivo después de la normalización
+        normalizada = thumbnails.normalizar_imagen(original)
+        image_store.guardar_imagen(self.jpeg_rotado_con_exif())
+        Products.objects.filter(pk=otro.pk).update(image_sha256=original)
+        thumbnails.marcar_pendiente(original)
+
+        # Su propia normalización reutiliza la anterior
+        self.assertEqual(thumbnails.normalizar_imagen(original), normalizada)
+        otro.refresh_from_db()
+        self.assertEqual(otro.image_sha256, normalizada)
+        self.assertFalse(os.path.exists(image_store.ruta_imagen(original)))
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        id_sale = uuid.uuid4()
+        cursor = pagination.codificar_cursor([date(2025, 1, 15), id_sale])
+
+        self.assertNotIn('=', cursor)
+        self.assertEqual(
+            pagination.leer_cursor(cursor, (date.fromisoformat, uuid.UUID)),
+            [date(2025, 1, 15), id_sale],
+        )
+
+    def test_cursor_invalido(self):
+        tipos = (date.fromisoformat, uuid.UUID)
+        otro_largo = pagination.codificar_cursor(['2025-01-15'])
+        mal_tipo = pagination.codificar_cursor(['ayer', uuid.uuid4()])
+        for cursor in (None, '', 'no-es-base64!', otro_largo, mal_tipo, 'bnVsbA'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(pagination.leer_cursor(cursor, tipos))
+
+    def test_tamano_pagina(self):
+        casos = {'': 25, '10': 10, '0': 1, '5000': 200, 'x': 25}
+        for valor, esperado in casos.items():
+            with self.subTest(valor=valor):
+                request = RequestFactory().get('/', {'por_pagina': valor} if valor else {})
+                self.assertEqual(pagination.tamano_pagina(request, 25), esperado)
+
+
+class PaginacionTests(VentasTestCase):
+
+    ORDEN = ['-stock', 'id_product']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Empates en el stock para que el cursor dependa de la clave primaria
+        for i in range(11):
+            cls.crear_producto(f'Producto {i}', i % 4)
+
+    def productos(self):
+        return Products.objects.filter(id_store=self.tienda)
+
+    def valores(self, cursor):
+        return pagination.leer_cursor(cursor, (Decimal, uuid.UUID))
+
+    def test_recorre_todas_las_filas_una_vez(self):
+        esperado = list(self.productos().order_by(*self.ORDEN))
+        vistas = []
+        pagina = pagination.paginar(self.productos(), self.ORDEN, 5)
+        while True:
+            vistas.extend(pagina['filas'])
+            if not pagina['siguiente']:
+                break
+            pagina = pagination.paginar(self.productos(), self.ORDEN, 5, despues=self.valores(pagina['siguiente']))
+
+        self.assertEqual(vistas, esperado)
+
+    def test_volver_a_la_pagina_anterior(self):
+        primera = pagination.paginar(self.productos(), self.ORDEN, 5)
+        segunda = pagination.paginar(self.productos(), self.ORDEN, 5, despues=self.valores(primera['siguiente']))
+
+        de_vuelta = pagination.paginar(self.productos(), self.ORDEN, 5, antes=self.valores(segunda['anterior']))
+
+        self.assertEqual(de_vuelta['filas'], primera['filas'])
+        self.assertIsNone(de_vuelta['anterior'])
+
+    def test_filas_nuevas_no_desplazan_la_pagina_siguiente(self):
+        primera = pagination.paginar(self.productos(), self.ORDEN, 5)
+        siguiente = pagination.paginar(self.productos(), self.ORDEN, 5, despues=self.valores(primera['siguiente']))
+
+        self.crear_producto('Nuevo', 50)
+
+        repetida = pagination.paginar(self.productos(), self.ORDEN, 5, despues=self.valores(primera['siguiente']))
+        self.assertEqual(repetida['filas'], siguiente['filas'])
+
+
+class BusquedaTests(VentasTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.crear_producto('Chocolate amargo', 5)
+        cls.crear_producto('Galletas de chocolate', 0)
+        cls.crear_producto('Chocolate blanco', 3, activo=False)
+        cls.crear_producto('Descuento 100% natural', 1)
+        cls.crear_producto('Descuento 100 natural', 1)
+        otra = Stores.objects.create(
+            id_store=uuid.uuid4(), name='Otra', direction='Calle 2', phone='456', administrator_name='Luis'
+        )
+        Products.objects.create(
+            name='Chocolate de otra tienda', price_sale=Decimal('1000'), price_buy=Decimal('600'),
+            stock=Decimal(5), description='', category='Dulces', status_product=True, id_store=otra,
+        )
+
+    def nombres(self, termino, **opciones):
+        return [producto['name'] for producto in search.buscar_productos(self.tienda.id_store, termino, **opciones)]
+
+    def test_primero_los_que_empiezan_con_el_termino(self):
+        self.assertEqual(self.nombres('chocolate'), ['Chocolate amargo', 'Galletas de chocolate'])
+
+    def test_tolera_errores_de_tipeo(self):
+        self.assertEqual(self.nombres('chocolatte amargo'), ['Chocolate amargo'])
+
+    def test_solo_con_stock(self):
+        self.assertEqual(self.nombres('chocolate', con_stock=True), ['Chocolate amargo'])
+
+    def test_comodines_literales(self):
+        self.assertEqual(self.nombres('100%'), ['Descuento 100% natural'])
+
+    def test_termino_vacio_y_limite(self):
+        self.assertEqual(self.nombres('   '), [])
+        self.assertEqual(len(self.nombres('chocolate', limite=1)), 1)
+
+    def test_filtrar_por_nombre(self):
+        productos = search.filtrar_por_nombre(Products.objects.filter(id_store=self.tienda), 'CHOCO')
+
+        self.assertEqual(
+            sorted(productos.values_list('name', flat=True)),
+            ['Chocolate amargo', 'Galletas de chocolate'],
+        )
+
+    def test_api(self):
+        sesion = self.client.session
+        sesion['user_id'] = str(self.usuario.id_user)
+        sesion.save()
+
+        respuesta = self.client.get('/api/productos/buscar/', {'q': 'choco', 'con_stock': '1'})
+
+        producto, = respuesta.json()['productos']
+        self.assertEqual((producto['nombre'], producto['stock']), ('Chocolate amargo', 5.0))
+        self.assertEqual(self.client.get('/api/productos/buscar/', {'limite': 'x'}).status_code, 400)
+
+
+class DestinatariosTests(DespachoTestCase):
+
+    def test_directorio_en_cache_hasta_invalidarlo(self):
+        self.crear_admin('ana@tienda.cl')
+        self.assertEqual(
+            recipients.directorio_tienda(self.tienda.id_store),
+            {'tienda': 'Tienda', 'destinatarios': [('ana@tienda.cl', 'medio')]},
+        )
+
+        self.crear_admin('luis@tienda.cl', nivel='alto')
+        with self.assertNumQueries(1):
+            directorio = recipients.directorio_tienda(self.tienda.id_store)
+        self.assertEqual(len(directorio['destinatarios']), 1)
+
+        recipients.invalidar_destinatarios(self.tienda.id_store)
+        self.assertEqual(
+            recipients.directorio_tienda(self.tienda.id_store)['destinatarios'],
+            [('ana@tienda.cl', 'medio'), ('luis@tienda.cl', 'alto')],
+        )
+
+    def test_excluye_inactivos_y_sin_alertas(self):
+        self.crear_admin('ana@tienda.cl', nivel='ninguno')
+        inactivo = self.crear_admin('luis@tienda.cl')
+        Users.objects.filter(pk=inactivo.pk).update(state_user=False)
+
+        self.assertEqual(recipients.directorio_tienda(self.tienda.id_store)['destinatarios'], [])
+
+    def test_recibe_alerta_segun_nivel(self):
+        casos = [
+            ('critico', 0, True), ('critico', 1, False),
+            ('alto', 4, True), ('alto', 5, False),
+            ('medio', 9, True),
+            ('ninguno', 0, False), ('desconocido', 0, False),
+        ]
+        for nivel, stock, esperado in casos:
+            with self.subTest(nivel=nivel, stock=stock):
+                self.assertEqual(recipients.recibe_alerta(nivel, stock), esperado)
+
+    @override_settings(ALERTAS_EMAIL_RESPALDO='dueno@tienda.cl')
+    def test_tienda_sin_administradores_usa_el_respaldo(self):
+        self.vender(7)
+
+        self.despachar()
+
+        email, = mail.outbox
+        self.assertEqual(email.to, ['dueno@tienda.cl'])
+
+
+class AnalyticsTests(VentasTestCase):
+
+    def setUp(self):
+        self.chocolate = self.crear_producto('Chocolate', 20, precio_compra=Decimal('300'))
+        Products.objects.filter(pk=self.chocolate.pk).update(category='Dulces')
+        self.vender(3, fecha=date(2025, 1, 10))
+        self.vender(1, fecha=date(2025, 1, 12))
+        self.vender(2, fecha=date(2025, 1, 12), producto=self.chocolate)
+        cancelada = self.vender(5, producto=self.chocolate)
+        cancellation.cancelar_ventas(self.tienda.id_store, self.usuario.id_user, [cancelada.id_sale])
+
+        # Ventas de otra tienda no deben aparecer
+        otra = Stores.objects.create(
+            id_store=uuid.uuid4(), name='Otra', direction='Calle 2', phone='456', administrator_name='Luis'
+        )
+        usuario = Users.objects.create(id_store=otra, username='otra', password='x', type_user=False, state_user=True)
+        producto = Products.objects.create(
+            name='Café', price_sale=Decimal('1000'), price_buy=Decimal('600'), stock=Decimal(10),
+            description='', category='Bebidas', status_product=True, id_store=otra,
+        )
+        checkout.registrar_venta(
+            otra.id_store, usuario.id_user, [{'id_product': producto.id_product, 'quantity': 9}], 'efectivo',
+        )
+
+    def test_productos_mas_vendidos(self):
+        self.assertEqual(
+            analytics.productos_mas_vendidos(self.tienda.id_store),
+            [('Café', 4.0, 4000.0), ('Chocolate', 2.0, 2000.0)],
+        )
+        self.assertEqual(len(analytics.productos_mas_vendidos(self.tienda.id_store, limite=1)), 1)
+
+    def test_ventas_por_categoria(self):
+        self.assertEqual(
+            analytics.ventas_por_categoria(self.tienda.id_store),
+            [('Bebidas', 4.0, 4000.0), ('Dulces', 2.0, 2000.0)],
+        )
+
+    def test_ganancia_por_producto(self):
+        self.assertEqual(
+            analytics.ganancia_por_producto(self.tienda.id_store),
+            [('Café', 1600.0), ('Chocolate', 1400.0)],
+        )
+
+    def test_ventas_producto_por_fecha(self):
+        self.assertEqual(
+            analytics.ventas_producto_por_fecha(self.tienda.id_store, self.producto.id_product),
+            [(date(2025, 1, 10), 3.0), (date(2025, 1, 12), 1.0)],
+        )
+
+    def test_estado_inventario(self):
+        self.crear_producto('Agotado', 0)
+        # Café quedó en 6 (bajo), Chocolate en 18 y Agotado en 0
+        self.assertEqual(analytics.estado_inventario(self.tienda.id_store, metrics.STOCK_BAJO), (1, 1, 1))
+
+
+@override_settings(GRAFICOS_EJECUTOR={'TIPO': 'secuencial'})
+class DashboardGraficosTests(VentasTestCase):
+
+    def setUp(self):
+        chart_cache._fragmentos.clear()
+        sesion = self.client.session
+        sesion['user_id'] = str(self.usuario.id_user)
+        sesion.save()
+
+    def test_dashboard_carga_los_graficos_despues(self):
+        respuesta = self.client.get('/dashboard/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        for nombre in charts.GRAFICOS:
+            self.assertContains(respuesta, f'hx-get="/dashboard/graficos/{nombre}/"')
+        self.assertNotContains(respuesta, 'grafico-stock-spec')
+
+    def test_fragmento_de_un_grafico(self):
+        respuesta = self.client.get('/dashboard/graficos/stock/')
+
+        self.assertContains(respuesta, 'id="grafico-stock-spec"')
+        self.assertContains(respuesta, '"x":["Caf\\u00e9"]')
+
+    def test_grafico_desconocido(self):
+        self.assertEqual(self.client.get('/dashboard/graficos/torta/').status_code, 404)
+
+    def test_sin_sesion(self):
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get('/dashboard/graficos/stock/').status_code, 401)
+
+
+@override_settings(PRODUCTOS_POR_PAGINA=3)
+class TablaProductosTests(VentasTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for nombre in ('Agua', 'Bebida', 'Chicle', 'Dulce', 'Empanada', 'Chocolate'):
+            cls.crear_producto(nombre, 5)
+        cls.crear_producto('Inactivo', 5, activo=False)
+
+    def setUp(self):
+        sesion = self.client.session
+        sesion['user_id'] = str(self.usuario.id_user)
+        sesion.save()
+
+    def tabla(self, consulta=''):
+        respuesta = self.client.get(f'/productos/tabla/?{consulta}')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.context
+
+    def test_recorre_las_paginas_por_nombre(self):
+        nombres = []
+        contexto = self.tabla()
+        while True:
+            nombres.extend(producto.name for producto in contexto['productos'])
+            self.assertEqual(contexto['resultados_filtrados'], 7)
+            if not contexto['pagina_siguiente']:
+                break
+            contexto = self.tabla(contexto['pagina_siguiente'])
+
+        self.assertEqual(nombres, ['Agua', 'Bebida', 'Café', 'Chicle', 'Chocolate', 'Dulce', 'Empanada'])
+
+    def test_paginas_siguientes_no_vuelven_a_contar(self):
+        siguiente = self.tabla()['pagina_siguiente']
+
+        self.assertIn('total=7', siguiente)
+        self.assertEqual(self.tabla(siguiente.replace('total=7', 'total=99'))['resultados_filtrados'], 99)
+
+    def test_filtros_se_conservan_entre_paginas(self):
+        contexto = self.tabla('search=ch&por_pagina=1')
+
+        self.assertEqual(contexto['resultados_filtrados'], 2)
+        self.assertEqual([producto.name for producto in contexto['productos']], ['Chicle'])
+        segunda = self.tabla(contexto['pagina_siguiente'])
+        self.assertEqual([producto.name for producto in segunda['productos']], ['Chocolate'])
+        self.assertIsNone(segunda['pagina_siguiente'])
+
+    def test_stock_actual_en_cada_fila(self):
+        self.vender(4)
+
+        contexto = self.tabla('search=caf')
+
+        producto, = contexto['productos']
+        self.assertEqual(producto.stock_actual, Decimal('6'))
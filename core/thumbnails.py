@@ -0,0 +1,334 @@
+"""
+Miniaturas de las imágenes de productos.
+
+Al subir una imagen se generan en segundo plano versiones reducidas en WebP
+y JPEG para cada tamaño de ``settings.MINIATURAS['TAMANOS']``. Se guardan
+junto al almacén de imágenes (ver ``core/image_store.py``) con el hash de la
+imagen original en el nombre, por lo que nunca cambian y el navegador puede
+cachearlas sin límite mientras la URL incluya ese hash.
+
+Antes de las miniaturas, la imagen subida se normaliza (orientación, sin
+EXIF, lado máximo acotado); ver ``normalizar_imagen``. El original, con sus
+metadatos, se borra del almacén en cuanto ningún producto lo referencia.
+Hasta que termina la normalización la imagen queda marcada como pendiente
+(``pendiente_de_normalizar``) y las vistas la sirven sin permitir que se
+guarde en cachés.
+
+Pillow es opcional: sin Pillow no se generan miniaturas ni se normalizan las
+imágenes, y las vistas sirven la imagen original.
+"""
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import chart_cache, uploads
+from .image_store import eliminar_imagen, guardar_imagen, raiz, ruta_imagen
+
+_FORMATOS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_aviso_sin_pillow = False
+
+
+def configuracion():
+    return {
+        'TAMANOS': {'lista': 80, 'detalle': 256},  # lado máximo en píxeles
+        'CALIDAD': 80,
+        'TRABAJADORES': 2,
+        **getattr(settings, 'MINIATURAS', {}),
+    }
+
+
+def ruta_miniatura(sha256, tamano, formato):
+    ruta_imagen(sha256)  # valida la referencia
+    return os.path.join(raiz(), 'miniaturas', tamano, sha256[:2], f'{sha256}.{formato}')
+
+
+def buscar_miniatura(sha256, tamano, acepta_webp=True):
+    """
+    Devuelve (ruta, content_type) de la miniatura ya generada, o None
+
+    Prefiere WebP si el navegador lo acepta.
+    """
+    formatos = ('webp', 'jpeg') if acepta_webp else ('jpeg',)
+    for formato in formatos:
+        ruta = ruta_miniatura(sha256, tamano, formato)
+        if os.path.exists(ruta):
+            return ruta, _FORMATOS[formato][1]
+    return None
+
+
+def _pillow():
+    global _aviso_sin_pillow
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        if not _aviso_sin_pillow:
+            print("⚠️ Pillow no está instalado: no se generan miniaturas de productos")
+            _aviso_sin_pillow = True
+        return None
+    return Image, ImageOps, features
+
+
+def generar_miniaturas(sha256):
+    """
+    Genera las miniaturas que falten de una imagen del almacén
+
+    Returns:
+        int: Cantidad de archivos generados
+    """
+    pillow = _pillow()
+    if pillow is None:
+        return 0
+    Image, ImageOps, features = pillow
+    config = configuracion()
+
+    formatos = ['jpeg'] + (['webp'] if features.check('webp') else [])
+    pendientes = [
+        (tamano, lado, formato)
+        for tamano, lado in config['TAMANOS'].items()
+        for formato in formatos
+        if not os.path.exists(ruta_miniatura(sha256, tamano, formato))
+    ]
+    if not pendientes:
+        return 0
+
+    with Image.open(ruta_imagen(sha256)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+        for tamano, lado, formato in pendientes:
+            imagen = original.copy()
+            imagen.thumbnail((lado, lado))
+            if formato == 'jpeg' and imagen.mode == 'RGBA':
+                # JPEG no tiene transparencia: fondo blanco
+                fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+                fondo.paste(imagen, mask=imagen.getchannel('A'))
+                imagen = fondo
+
+            destino = ruta_miniatura(sha256, tamano, formato)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.miniatura-')
+            try:
+                with os.fdopen(descriptor, 'wb') as archivo:
+                    imagen.save(archivo, _FORMATOS[formato][0], quality=config['CALIDAD'])
+                os.chmod(temporal, 0o644)
+                os.replace(temporal, destino)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+    return len(pendientes)
+
+
+def _ruta_normalizada(sha256):
+    ruta_imagen(sha256)  # valida la referencia
+    return os.path.join(raiz(), 'normalizadas', sha256[:2], sha256)
+
+
+def _normalizada_de(sha256):
+    """SHA-256 de la versión normalizada de una imagen ya procesada, o None"""
+    try:
+        with open(_ruta_normalizada(sha256)) as archivo:
+            return archivo.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _anotar_normalizada(sha256, normalizada):
+    # Solo el hash: el original puede borrarse y otra subida del mismo archivo
+    # todavía necesita saber a qué imagen apuntar
+    destino = _ruta_normalizada(sha256)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), prefix='.normalizada-')
+    try:
+        with os.fdopen(descriptor, 'w') as archivo:
+            archivo.write(normalizada)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _ruta_pendiente(sha256):
+    ruta_imagen(sha256)  # valida la referencia
+    return os.path.join(raiz(), 'pendientes', sha256[:2], sha256)
+
+
+def marcar_pendiente(sha256):
+    """Marca una imagen subida como aún no normalizada"""
+    destino = _ruta_pendiente(sha256)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    open(destino, 'a').close()
+
+
+def _quitar_pendiente(sha256):
+    try:
+        os.remove(_ruta_pendiente(sha256))
+    except FileNotFoundError:
+        pass
+
+
+def pendiente_de_normalizar(sha256):
+    """
+    True si la imagen es una subida que aún no se normalizó
+
+    Puede conservar sus metadatos (EXIF, GPS): no debe guardarse en cachés.
+    Sin Pillow las imágenes subidas quedan pendientes para siempre.
+    """
+    return os.path.exists(_ruta_pendiente(sha256))
+
+
+def _eliminar_miniaturas(sha256):
+    for tamano in configuracion()['TAMANOS']:
+        for formato in _FORMATOS:
+            try:
+                os.remove(ruta_miniatura(sha256, tamano, formato))
+            except FileNotFoundError:
+                pass
+
+
+def eliminar_si_no_referenciada(sha256):
+    """
+    Borra una imagen del almacén y sus miniaturas si ningún producto la usa
+
+    Debe llamarse fuera de la transacción que dejó de referenciarla o después
+    de confirmarla.
+
+    Returns:
+        bool: True si se borró
+    """
+    if not sha256:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM products WHERE image_sha256 = %s)", [sha256])
+        if cursor.fetchone()[0]:
+            return False
+    eliminar_imagen(sha256)
+    _eliminar_miniaturas(sha256)
+    _quitar_pendiente(sha256)
+    return True
+
+
+def _reencodar(sha256):
+    """Devuelve los bytes de la imagen normalizada, o None si se deja como está"""
+    Image, ImageOps, _ = _pillow()
+    config = uploads.configuracion()
+
+    with Image.open(ruta_imagen(sha256)) as original:
+        if getattr(original, 'is_animated', False):
+            return None
+        imagen = ImageOps.exif_transpose(original)
+        imagen.thumbnail((config['LADO_MAXIMO'], config['LADO_MAXIMO']))
+
+        con_alfa = 'A' in imagen.getbands() or 'transparency' in imagen.info
+        salida = io.BytesIO()
+        if con_alfa:
+            imagen.convert('RGBA').save(salida, 'PNG', optimize=True)
+        else:
+            imagen.convert('RGB').save(salida, 'JPEG', quality=config['CALIDAD'], optimize=True)
+    return salida.getvalue()
+
+
+def normalizar_imagen(sha256):
+    """
+    Reescala y limpia una imagen recién subida
+
+    Aplica la orientación EXIF, descarta los metadatos (EXIF, GPS) y reduce
+    el lado mayor a ``settings.IMAGENES_SUBIDA['LADO_MAXIMO']``. El resultado
+    se guarda en el almacén y los productos que apuntaban a la imagen subida
+    pasan a apuntar a la normalizada, en una transacción que bloquea esas
+    filas. Si después ningún producto referencia el original, se borra del
+    almacén junto con sus miniaturas. Los GIF animados se dejan como están.
+
+    Returns:
+        str: SHA-256 de la imagen que queda en los productos
+    """
+    if _pillow() is None:
+        return sha256
+
+    # Una subida repetida del mismo archivo reutiliza la normalización
+    # anterior: su original puede ya no estar en el almacén
+    normalizada = _normalizada_de(sha256)
+    if normalizada is None:
+        contenido = _reencodar(sha256)
+        if contenido is None:
+            _quitar_pendiente(sha256)
+            return sha256
+        normalizada = guardar_imagen(contenido)
+        if normalizada == sha256:
+            _quitar_pendiente(sha256)
+            return sha256
+        _anotar_normalizada(sha256, normalizada)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id_store FROM products
+            WHERE image_sha256 = %s
+            FOR UPDATE
+        """, [sha256])
+        tiendas = {fila[0] for fila in cursor.fetchall()}
+        cursor.execute(
+            "UPDATE products SET image_sha256 = %s WHERE image_sha256 = %s",
+            [normalizada, sha256],
+        )
+        for id_store in tiendas:
+            chart_cache.invalidar_tienda_al_confirmar(id_store)
+
+    # Fuera de la transacción: un producto que se confirmó mientras tanto con
+    # el original lo sigue usando (y sigue pendiente) hasta su propia
+    # normalización
+    eliminar_si_no_referenciada(sha256)
+    return normalizada
+
+
+def _generar_seguro(sha256):
+    try:
+        generar_miniaturas(sha256)
+    except Exception as e:
+        print(f"❌ Error al generar miniaturas de {sha256}: {e}")
+
+
+def _procesar_seguro(sha256):
+    try:
+        generar_miniaturas(normalizar_imagen(sha256))
+    except Exception as e:
+        print(f"❌ Error al procesar la imagen {sha256}: {e}")
+    finally:
+        connection.close()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=configuracion()['TRABAJADORES'],
+                thread_name_prefix='miniaturas',
+            )
+        return _pool
+
+
+def generar_en_segundo_plano(sha256):
+    """Genera las miniaturas en un hilo cuando se confirme la transacción actual"""
+    if not sha256:
+        return
+    transaction.on_commit(lambda: _obtener_pool().submit(_generar_seguro, sha256))
+
+
+def procesar_en_segundo_plano(sha256):
+    """Normaliza una imagen subida y genera sus miniaturas al confirmar la transacción"""
+    if not sha256:
+        return
+    marcar_pendiente(sha256)
+    transaction.on_commit(lambda: _obtener_pool().submit(_procesar_seguro, sha256))
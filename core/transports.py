@@ -0,0 +1,147 @@
+"""
+Transportes de email para las alertas.
+
+Un transporte recibe mensajes ya armados (diccionarios con ``from``, ``to``,
+``subject`` y ``html``, el formato de la API de Resend) y los entrega. Se
+elige con ``settings.ALERTAS_TRANSPORTE['TIPO']``:
+
+- ``resend``: API HTTP de Resend. Reutiliza la conexión (``requests.Session``)
+  y envía hasta 100 mensajes por solicitud con ``/emails/batch``. La clave se
+  lee de la variable de entorno ``RESEND_API_KEY``; ``URL`` permite apuntar
+  al servidor falso del comando ``servidor_resend_falso``.
+- ``smtp``, ``archivo``, ``consola`` y ``memoria``: backends de email de
+  Django (``EMAIL_HOST``, ``EMAIL_FILE_PATH``, etc.); todos los mensajes de
+  un lote se envían por una misma conexión.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.core import mail
+
+# Mensajes por solicitud del endpoint batch de Resend
+MAX_LOTE_RESEND = 100
+
+_BACKENDS_DJANGO = {
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'archivo': 'django.core.mail.backends.filebased.EmailBackend',
+    'consola': 'django.core.mail.backends.console.EmailBackend',
+    'memoria': 'django.core.mail.backends.locmem.EmailBackend',
+}
+
+
+class ErrorTransporte(Exception):
+    """El transporte no pudo entregar los mensajes"""
+
+
+def configuracion_transporte():
+    configuracion = {
+        'TIPO': 'resend',
+        'URL': 'https://api.resend.com',
+        'TIMEOUT': 10,  # segundos por solicitud HTTP
+    }
+    configuracion.update(getattr(settings, 'ALERTAS_TRANSPORTE', {}))
+    return configuracion
+
+
+class TransporteResend:
+    """Envía por la API HTTP de Resend reutilizando la conexión"""
+
+    max_lote = MAX_LOTE_RESEND
+
+    def __init__(self, url, api_key, timeout=10):
+        import requests
+
+        if not api_key:
+            raise ErrorTransporte('Falta la variable de entorno RESEND_API_KEY')
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._sesion = requests.Session()
+        self._sesion.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+        })
+
+    def _post(self, ruta, cuerpo):
+        import requests
+
+        try:
+            respuesta = self._sesion.post(f'{self.url}{ruta}', json=cuerpo, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ErrorTransporte(f'Error de conexión con Resend: {e}')
+
+        if respuesta.status_code >= 400:
+            try:
+                detalle = respuesta.json().get('message', respuesta.text)
+            except ValueError:
+                detalle = respuesta.text
+            raise ErrorTransporte(f'Resend respondió {respuesta.status_code}: {detalle}')
+        return respuesta.json()
+
+    def enviar_lote(self, mensajes):
+        """
+        Envía hasta ``max_lote`` mensajes en una sola solicitud
+
+        Returns:
+            list: ID asignado a cada mensaje, en el mismo orden
+        """
+        if len(mensajes) == 1:
+            return [self._post('/emails', mensajes[0]).get('id')]
+        datos = self._post('/emails/batch', mensajes).get('data') or []
+        return [email.get('id') for email in datos]
+
+
+class TransporteDjango:
+    """Envía con un backend de email de Django, todo el lote por una conexión"""
+
+    max_lote = MAX_LOTE_RESEND
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def enviar_lote(self, mensajes):
+        emails = []
+        for mensaje in mensajes:
+            email = mail.EmailMultiAlternatives(
+                subject=mensaje['subject'],
+                body='Este mensaje requiere un cliente de email con soporte HTML.',
+                from_email=mensaje['from'],
+                to=mensaje['to'],
+            )
+            email.attach_alternative(mensaje['html'], 'text/html')
+            emails.append(email)
+
+        try:
+            conexion = mail.get_connection(self.backend, fail_silently=False)
+            enviados = conexion.send_messages(emails)
+        except Exception as e:
+            raise ErrorTransporte(f'Error al enviar por {self.backend}: {e}')
+        if enviados != len(emails):
+            raise ErrorTransporte(f'Solo se enviaron {enviados} de {len(emails)} emails')
+        return [email.extra_headers.get('Message-ID') for email in emails]
+
+
+def crear_transporte(configuracion=None):
+    configuracion = configuracion or configuracion_transporte()
+    tipo = configuracion['TIPO']
+
+    if tipo == 'resend':
+        return TransporteResend(
+            configuracion['URL'],
+            os.environ.get('RESEND_API_KEY'),
+            configuracion['TIMEOUT'],
+        )
+    if tipo in _BACKENDS_DJANGO:
+        return TransporteDjango(_BACKENDS_DJANGO[tipo])
+    raise ErrorTransporte(f'Tipo de transporte desconocido: {tipo}')
+
+
+_local = threading.local()
+
+
+def obtener_transporte():
+    """Transporte del hilo actual; se crea una vez para reutilizar su conexión"""
+    transporte = getattr(_local, 'transporte', None)
+    if transporte is None:
+        transporte = _local.transporte = crear_transporte()
+    return transporte
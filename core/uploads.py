@@ -0,0 +1,104 @@
+"""
+Recepción y validación de imágenes subidas.
+
+``LimiteTamanoUploadHandler`` (en ``settings.FILE_UPLOAD_HANDLERS``, antes
+del handler de archivos temporales) cuenta los bytes de cada archivo
+mientras llega y lo descarta apenas supera
+``settings.IMAGENES_SUBIDA['TAMANO_MAXIMO']``, sin esperar a recibirlo
+entero. Los archivos aceptados se escriben por partes a un temporal en disco,
+nunca completos en memoria.
+
+``validar_imagen`` se llama en la vista antes de tocar la base de datos:
+rechaza los archivos descartados por tamaño y los que no son una imagen. La
+decodificación completa, el reescalado y la limpieza de EXIF se hacen
+después, fuera de la solicitud (ver ``core/thumbnails.py``).
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+from .image_store import tipo_contenido
+
+
+class ImagenInvalida(ValueError):
+    """La imagen subida es demasiado grande o no es una imagen"""
+
+
+def configuracion():
+    return {
+        'TAMANO_MAXIMO': 5 * 1024 * 1024,  # bytes
+        'LADO_MAXIMO': 2048,               # píxeles; las más grandes se reducen
+        'PIXELES_MAXIMOS': 40_000_000,     # ancho x alto aceptado al decodificar
+        'CALIDAD': 85,
+        **getattr(settings, 'IMAGENES_SUBIDA', {}),
+    }
+
+
+class LimiteTamanoUploadHandler(FileUploadHandler):
+    """Descarta cada archivo subido en cuanto supera el tamaño máximo"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.recibidos = 0
+        self.maximo = configuracion()['TAMANO_MAXIMO']
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recibidos += len(raw_data)
+        if self.recibidos > self.maximo:
+            # La vista informa el rechazo en lugar de "imagen obligatoria"
+            if self.request is not None:
+                if not hasattr(self.request, 'subidas_rechazadas'):
+                    self.request.subidas_rechazadas = set()
+                self.request.subidas_rechazadas.add(self.field_name)
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def validar_imagen(request, campo='image'):
+    """
+    Devuelve la imagen subida en ``campo`` si es válida
+
+    Returns:
+        UploadedFile o None si no se subió ningún archivo
+
+    Raises:
+        ImagenInvalida: El archivo supera el tamaño máximo o no es una imagen
+    """
+    config = configuracion()
+    maximo_mb = config['TAMANO_MAXIMO'] / (1024 * 1024)
+
+    if campo in getattr(request, 'subidas_rechazadas', ()):
+        raise ImagenInvalida(f'La imagen supera el tamaño máximo de {maximo_mb:g} MB')
+
+    archivo = request.FILES.get(campo)
+    if archivo is None:
+        return None
+    if archivo.size > config['TAMANO_MAXIMO']:
+        raise ImagenInvalida(f'La imagen supera el tamaño máximo de {maximo_mb:g} MB')
+
+    archivo.seek(0)
+    cabecera = archivo.read(16)
+    archivo.seek(0)
+    if tipo_contenido(cabecera) == 'application/octet-stream':
+        raise ImagenInvalida('El archivo no es una imagen válida (JPEG, PNG, GIF, WebP, AVIF o BMP)')
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return archivo
+
+    # Image.open solo lee la cabecera: confirma el formato y las dimensiones
+    # sin decodificar los píxeles
+    try:
+        with Image.open(archivo) as imagen:
+            ancho, alto = imagen.size
+    except Exception:
+        raise ImagenInvalida('El archivo no es una imagen válida o está dañado')
+    finally:
+        archivo.seek(0)
+
+    if ancho * alto > config['PIXELES_MAXIMOS']:
+        raise ImagenInvalida(f'La imagen es demasiado grande ({ancho}x{alto} píxeles)')
+    return archivo
@@ -11,7 +11,9 @@ urlpatterns = [
     
     # Páginas del sistema
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/graficos/<str:nombre>/', views.dashboard_grafico_view, name='dashboard_grafico'),
     path('productos/', views.productos_view, name='productos'),
+    path('productos/tabla/', views.productos_tabla_view, name='productos_tabla'),
     path('ventas/', views.ventas_view, name='ventas'),
     path('usuarios/', views.usuarios_view, name='usuarios'),
     path('usuarios/crear/', views.crear_usuario_view, name='crear_usuario'),
@@ -23,6 +25,7 @@ urlpatterns = [
     path('productos/editar/<uuid:producto_id>/', views.editar_producto_view, name='editar_producto'),
     path('productos/eliminar/<uuid:producto_id>/', views.eliminar_producto_view, name='eliminar_producto'),
     path('productos/imagen/<uuid:producto_id>/', views.producto_imagen_view, name='producto_imagen'),
+    path('productos/imagen/<uuid:producto_id>/<str:tamano>/', views.producto_miniatura_view, name='producto_miniatura'),
     
     # Categorías
     path('categorias/crear/', views.crear_categoria_view, name='crear_categoria'),
@@ -43,8 +46,14 @@ urlpatterns = [
     path('api/ventas-por-dia/', views.api_ventas_por_dia, name='api_ventas_por_dia'),
     path('api/ventas-por-mes/', views.api_ventas_por_mes, name='api_ventas_por_mes'),
     path('api/productos-mas-vendidos/', views.api_productos_mas_vendidos, name='api_productos_mas_vendidos'),
+    path('api/productos/buscar/', views.api_buscar_productos, name='api_buscar_productos'),
     path('api/ventas-por-categoria/', views.api_ventas_por_categoria, name='api_ventas_por_categoria'),
     path('api/estado-inventario/', views.api_estado_inventario, name='api_estado_inventario'),
     path('api/comparacion-periodos/', views.api_comparacion_periodos, name='api_comparacion_periodos'),
+    path('api/dashboard-bundle/', views.api_dashboard_bundle, name='api_dashboard_bundle'),
+    path('api/graficos/', views.api_graficos, name='api_graficos'),
+    path('api/graficos/<str:nombre>/', views.api_grafico, name='api_grafico'),
+    path('api/ventas/cancelar/', views.api_cancelar_ventas, name='api_cancelar_ventas'),
+    path('api/ventas/lote/', views.api_ingerir_ventas, name='api_ingerir_ventas'),
     path('api/ventas-producto-por-fecha/', views.api_ventas_producto_por_fecha, name='api_ventas_producto_por_fecha'),
 ]
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Versiones de datos compartidas entre procesos (tabla ``data_version``).
+
+Las cachés en memoria de cada proceso (gráficos en ``core/chart_cache.py``,
+destinatarios de alertas en ``core/recipients.py``) guardan cada valor junto
+con la versión de los datos con que se calculó, y lo descartan cuando la
+versión cambia. La versión vive en la base de datos y no en la caché de
+Django: sin una caché compartida configurada cada proceso tendría su propia
+copia y nunca vería los incrementos de los demás.
+
+Leer una versión es una búsqueda por clave primaria. El incremento es un solo
+``INSERT ... ON CONFLICT DO UPDATE``, atómico aunque varios procesos
+incrementen a la vez.
+"""
+from django.db import connection, transaction
+
+
+def version(clave):
+    """Versión actual de ``clave`` (0 si nunca se incrementó)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT version FROM data_version WHERE key = %s", [clave])
+        fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def incrementar(clave):
+    """Incrementa la versión de ``clave`` y devuelve la nueva"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO data_version AS d (key, version, updated_at)
+            VALUES (%s, 1, now())
+            ON CONFLICT (key) DO UPDATE SET
+                version = d.version + 1,
+                updated_at = now()
+            RETURNING version
+        """, [clave])
+        return cursor.fetchone()[0]
+
+
+def incrementar_al_confirmar(clave):
+    """
+    Incrementa la versión cuando se confirme la transacción actual
+
+    Fuera de la transacción, para no retener el bloqueo de la fila de la
+    versión (compartida por todas las escrituras de la tienda) hasta el final
+    de cada venta.
+    """
+    transaction.on_commit(lambda: incrementar(clave))
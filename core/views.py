@@ -1,18 +1,25 @@
 from django.shortcuts import render, redirect
+from django.conf import settings
 from django.contrib import messages
 from django.core.signing import Signer, BadSignature
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
 from .models import Users, UsersInfo, Products, Stores, Category, Sales, SalesBag, SalesMovement, SuperAdmin
+from .metrics import calcular_kpis_tienda, resumen_catalogo, STOCK_BAJO
+from . import alerts, analytics, cancellation, checkout, image_store, recipients, rollups, chart_cache, charts, dashboard_data, pagination, search, stock_ledger, thumbnails, uploads
+from .chart_executor import generar_grafico, generar_graficos
 import random
-from django.db import connection
+from django.db import connection, transaction
 from django.db.models import Q, Sum
-from datetime import datetime, timedelta
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import base64
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+from plotly.offline import get_plotlyjs_version
 import bcrypt
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
 
 # Inicializar signer para cookies seguras
 signer = Signer()
@@ -198,354 +205,10 @@ def login_view(request):
 # =====================================================
 # FUNCIONES AUXILIARES PARA GRÁFICOS
 # =====================================================
-# FUNCIONES AUXILIARES PARA GRÁFICOS CON PLOTLY
-# =====================================================
-
-def grafico_stock_productos(user_store):
-    """Genera gráfico de barras vertical de stock por producto con Plotly"""
-    try:
-        # Obtener TODOS los productos con su stock (sin límite)
-        productos = Products.objects.filter(
-            id_store=user_store,
-            status_product=True
-        ).values('name', 'stock').order_by('name')  # Ordenar alfabéticamente
-        
-        if not productos or len(list(productos)) == 0:
-            # Gráfico vacío con mensaje
-            fig = go.Figure()
-            fig.add_annotation(
-                text="No hay productos<br>en el inventario",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=16, color="gray")
-            )
-            fig.update_layout(
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                height=500,
-                plot_bgcolor='white'
-            )
-        else:
-            df = pd.DataFrame(list(productos))
-            df['stock'] = df['stock'].astype(float)
-            
-            # Colores según nivel de stock
-            colors = ['#10b981' if stock >= 10 else '#f59e0b' if stock > 0 else '#ef4444' 
-                     for stock in df['stock']]
-            
-            # Calcular ancho dinámico basado en cantidad de productos
-            num_productos = len(df)
-            ancho_minimo_por_barra = 80  # píxeles por barra
-            ancho_calculado = max(1600, num_productos * ancho_minimo_por_barra)
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                x=df['name'],  # Productos en eje X
-                y=df['stock'],  # Stock en eje Y
-                marker=dict(color=colors, line=dict(color='white', width=2)),
-                text=df['stock'].astype(int),
-                textposition='outside',
-                textfont=dict(size=12, color='black'),
-                hovertemplate='<b>%{x}</b><br>Stock: %{y}<extra></extra>'
-            ))
-            
-            fig.update_layout(
-                title=dict(
-                    text='Stock por Producto',
-                    font=dict(size=18, color='#111827', family='Arial, sans-serif'),
-                    x=0.5,
-                    xanchor='center'
-                ),
-                xaxis=dict(
-                    title=dict(text='Producto', font=dict(size=14, color='#374151')),
-                    tickangle=-45,  # Rotar etiquetas para mejor lectura
-                    gridcolor='#E5E7EB',
-                    showgrid=False
-                ),
-                yaxis=dict(
-                    title=dict(text='Stock Disponible', font=dict(size=14, color='#374151')),
-                    gridcolor='#E5E7EB',
-                    showgrid=True,
-                    rangemode='tozero'
-                ),
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                height=700,
-                width=ancho_calculado,  # Ancho dinámico
-                autosize=False,
-                margin=dict(l=80, r=20, t=80, b=150),  # Más margen abajo para etiquetas rotadas
-                hovermode='closest'
-            )
-        
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False, 'responsive': True})
-    
-    except Exception as e:
-        print(f"❌ Error generando gráfico de stock: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # Gráfico de error
-        fig = go.Figure()
-        fig.add_annotation(
-            text=f"Error al generar gráfico<br>{str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=14, color="red")
-        )
-        fig.update_layout(
-            xaxis=dict(visible=False),
-            yaxis=dict(visible=False),
-            height=500,
-            plot_bgcolor='white'
-        )
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False})
-
-def grafico_precio_ventas_producto(user_store):
-    """Genera gráfico de barras: producto vs ganancia"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    p.name,
-                    SUM((p.price_sale - p.price_buy) * sb.quantitity) as ganancia_total
-                FROM sales_bag sb
-                INNER JOIN products p ON sb.id_product = p.id_product
-                INNER JOIN sales s ON sb.id_sale = s.id_sale
-                WHERE s.id_store = %s AND s.state = true
-                GROUP BY p.id_product, p.name
-                ORDER BY ganancia_total DESC
-            """, [str(user_store.id_store)])
-            
-            rows = cursor.fetchall()
-        
-        fig = go.Figure()
-        
-        if not rows or len(rows) == 0:
-            # Estado vacío
-            fig.add_annotation(
-                text="No hay datos de ventas<br>para mostrar",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=16, color="gray"),
-                bgcolor="white",
-                bordercolor="gray",
-                borderwidth=2,
-                borderpad=10
-            )
-            fig.update_layout(
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                height=700,
-                plot_bgcolor='white'
-            )
-        else:
-            df = pd.DataFrame(rows, columns=['Producto', 'Ganancia'])
-            df['Ganancia'] = df['Ganancia'].astype(float)
-            
-            # Calcular ancho dinámico basado en la cantidad de productos
-            num_productos = len(df)
-            ancho_dinamico = max(1600, num_productos * 80)  # Mínimo 1600px, 80px por producto
-            
-            # Colores: verde para ganancia positiva, rojo para negativa
-            colors = ['#10b981' if g >= 0 else '#ef4444' for g in df['Ganancia']]
-            
-            fig.add_trace(go.Bar(
-                x=df['Producto'],
-                y=df['Ganancia'],
-                marker=dict(
-                    color=colors,
-                    line=dict(color='white', width=2)
-                ),
-                text=[f'${g:,.0f}' for g in df['Ganancia']],
-                textposition='outside',
-                textfont=dict(size=12, color='black'),
-                hovertemplate='<b>%{x}</b><br>Ganancia: $%{y:,.0f}<extra></extra>'
-            ))
-        
-        fig.update_layout(
-            title=dict(
-                text=f'Productos por Ganancia ({num_productos} productos)',
-                font=dict(size=18, color='#111827', family='Arial, sans-serif'),
-                x=0.5,
-                xanchor='center',
-                y=0.98
-            ),
-            xaxis=dict(
-                title=dict(text='Producto', font=dict(size=14, color='#374151')),
-                tickangle=-45,
-                gridcolor='#E5E7EB',
-                showgrid=False
-            ),
-            yaxis=dict(
-                title=dict(text='Ganancia Total ($)', font=dict(size=14, color='#374151')),
-                gridcolor='#E5E7EB',
-                showgrid=True,
-                tickformat='$,.0f'
-            ),
-            hovermode='x unified',
-            height=700,
-            width=ancho_dinamico,
-            autosize=False,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            margin=dict(l=80, r=20, t=80, b=150)
-        )
-        
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False, 'responsive': True})
-        
-    except Exception as e:
-        print(f"❌ Error generando gráfico precio-ventas: {e}")
-        import traceback
-        traceback.print_exc()
-        # Retornar figura de error
-        fig = go.Figure()
-        fig.add_annotation(
-            text=f"Error al generar gráfico<br>{str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=14, color="red")
-        )
-        fig.update_layout(height=500, plot_bgcolor='white')
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False})
+# Las especificaciones de los gráficos se construyen en core/charts.py
 
-def grafico_historial_ganancias(user_store):
-    """Genera gráfico de línea del historial de ganancias en el tiempo"""
-    try:
-        # Obtener ventas agrupadas por fecha
-        ventas = Sales.objects.filter(
-            id_store=user_store,
-            state=True
-        ).values('date_sale').annotate(
-            ganancia_dia=Sum('total')
-        ).order_by('date_sale')
-        
-        fig = go.Figure()
-        
-        if not ventas or len(list(ventas)) == 0:
-            # Estado vacío
-            fig.add_annotation(
-                text="No hay historial de ventas<br>para mostrar",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=16, color="gray"),
-                bgcolor="white",
-                bordercolor="gray",
-                borderwidth=2,
-                borderpad=10
-            )
-        else:
-            df = pd.DataFrame(list(ventas))
-            df['date_sale'] = pd.to_datetime(df['date_sale'])
-            # Convertir a float para evitar problemas con Decimal
-            df['ganancia_dia'] = df['ganancia_dia'].astype(float)
-            
-            # Calcular ganancia acumulada
-            df['ganancia_acumulada'] = df['ganancia_dia'].cumsum()
-            
-            # Línea 1: Ganancia Acumulada (área sombreada)
-            fig.add_trace(go.Scatter(
-                x=df['date_sale'],
-                y=df['ganancia_acumulada'],
-                mode='lines+markers',
-                name='Ganancia Acumulada',
-                line=dict(color='#8b5cf6', width=3),
-                marker=dict(size=8, color='#8b5cf6', line=dict(color='white', width=2)),
-                fill='tozeroy',
-                fillcolor='rgba(139, 92, 246, 0.15)',
-                hovertemplate='<b>%{x|%Y-%m-%d}</b><br>Acumulada: $%{y:,.2f}<extra></extra>'
-            ))
-            
-            # Línea 2: Ganancia por día (siempre será menor que la acumulada)
-            fig.add_trace(go.Scatter(
-                x=df['date_sale'],
-                y=df['ganancia_dia'],
-                mode='lines+markers',
-                name='Ganancia del Día',
-                line=dict(color='#10b981', width=2.5),
-                marker=dict(size=7, color='#10b981', line=dict(color='white', width=1.5)),
-                fill='tozeroy',
-                fillcolor='rgba(16, 185, 129, 0.15)',
-                hovertemplate='<b>%{x|%Y-%m-%d}</b><br>Del día: $%{y:,.2f}<extra></extra>'
-            ))
-        
-        # Configurar diseño con un solo eje Y
-        fig.update_layout(
-            title=dict(text='Historial de Ganancias en el Tiempo', font=dict(size=16, family='Arial Black'), y=0.98),
-            xaxis=dict(title='Fecha', tickangle=45),
-            yaxis=dict(
-                title='Ganancias ($)', 
-                tickformat='$,.0f',
-                side='left'
-            ),
-            hovermode='x unified',
-            height=700,
-            width=1600,
-            autosize=False,
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=-0.15, xanchor="left", x=0),
-            margin=dict(l=60, r=60, t=80, b=150)
-        )
-        
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False, 'responsive': True})
-        
-    except Exception as e:
-        print(f"❌ Error generando gráfico de ganancias: {e}")
-        import traceback
-        traceback.print_exc()
-        # Retornar figura de error
-        fig = go.Figure()
-        fig.add_annotation(
-            text=f"Error al generar gráfico<br>{str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5, showarrow=False,
-            font=dict(size=14, color="red")
-        )
-        fig.update_layout(height=500, plot_bgcolor='white')
-        return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False})
-
-def grafico_ventas_producto_por_fecha():
-    """Genera gráfico de línea vacío que se llenará con JavaScript"""
-    fig = go.Figure()
-    
-    fig.add_annotation(
-        text="Selecciona un producto del menú desplegable<br>para ver su historial de ventas",
-        xref="paper", yref="paper",
-        x=0.5, y=0.5, showarrow=False,
-        font=dict(size=16, color="gray"),
-        bgcolor="white",
-        bordercolor="gray",
-        borderwidth=2,
-        borderpad=10
-    )
-    
-    fig.update_layout(
-        title=dict(
-            text='Ventas por Fecha - Selecciona un Producto',
-            font=dict(size=18, color='#111827', family='Arial, sans-serif'),
-            x=0.5,
-            xanchor='center'
-        ),
-        xaxis=dict(
-            title=dict(text='Fecha', font=dict(size=14, color='#374151')),
-            gridcolor='#E5E7EB',
-            showgrid=True
-        ),
-        yaxis=dict(
-            title=dict(text='Cantidad Vendida', font=dict(size=14, color='#374151')),
-            gridcolor='#E5E7EB',
-            showgrid=True
-        ),
-        height=700,
-        width=1600,
-        autosize=False,
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        margin=dict(l=80, r=20, t=80, b=80)
-    )
-    
-    return fig.to_html(full_html=False, include_plotlyjs='cdn', config={'displayModeBar': False, 'responsive': True}, div_id='grafico_ventas_producto')
+# Copia única de plotly.js que carga el dashboard (los fragmentos no la incluyen)
+PLOTLY_JS_URL = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
 
 # =====================================================
 # FIN FUNCIONES AUXILIARES PARA GRÁFICOS
@@ -579,90 +242,14 @@ def dashboard_view(request):
     except Users.DoesNotExist:
         return redirect('login')
     
-    from django.db.models import Sum, Count, Avg, Q
-    from datetime import datetime, timedelta
-    
-    # === ANÁLISIS DE PRODUCTOS ===
-    productos_activos = Products.objects.filter(id_store=user_store, status_product=True).count()
-    productos_sin_stock = Products.objects.filter(id_store=user_store, status_product=True, stock=0).count()
-    productos_stock_bajo = Products.objects.filter(
-        id_store=user_store, 
-        status_product=True, 
-        stock__gt=0, 
-        stock__lt=10
-    ).count()
-    
-    # Valor del inventario (precio de compra * stock)
-    valor_inventario = 0
-    try:
-        productos_con_stock = Products.objects.filter(
-            id_store=user_store,
-            status_product=True
-        )
-        for producto in productos_con_stock:
-            valor_inventario += (producto.price_buy * producto.stock)
-    except Exception as e:
-        print(f"Error calculando valor inventario: {e}")
-        valor_inventario = 0
+    from django.db.models import Count
     
-    # === ANÁLISIS DE VENTAS ===
-    # Obtener ventas de la tienda directamente por id_store
-    total_ventas = Sales.objects.filter(id_store=user_store).count()
-    ventas_activas = Sales.objects.filter(id_store=user_store, state=True).count()
-    ventas_canceladas = Sales.objects.filter(id_store=user_store, state=False).count()
-    
-    ingresos_totales = Sales.objects.filter(
-        id_store=user_store, 
-        state=True
-    ).aggregate(total=Sum('total'))['total'] or 0
-    
-    # Ventas del mes actual
-    hoy = datetime.now()
-    primer_dia_mes = hoy.replace(day=1)
-    ventas_mes = Sales.objects.filter(
-        id_store=user_store,
-        state=True,
-        date_sale__gte=primer_dia_mes
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_sale')
-    )
-    ingresos_mes = ventas_mes['total'] or 0
-    cantidad_ventas_mes = ventas_mes['cantidad'] or 0
-    
-    # Ventas de la semana
-    inicio_semana = hoy - timedelta(days=7)
-    ventas_semana = Sales.objects.filter(
-        id_store=user_store,
-        state=True,
-        date_sale__gte=inicio_semana
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_sale')
-    )
-    ingresos_semana = ventas_semana['total'] or 0
-    cantidad_ventas_semana = ventas_semana['cantidad'] or 0
-    
-    # Ventas de hoy
-    ventas_hoy = Sales.objects.filter(
-        id_store=user_store,
-        state=True,
-        date_sale=hoy.date()
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_sale')
-    )
-    ingresos_hoy = ventas_hoy['total'] or 0
-    cantidad_ventas_hoy = ventas_hoy['cantidad'] or 0
-    
-    # === ANÁLISIS DE USUARIOS ===
-    total_usuarios = Users.objects.filter(id_store=user_store).count()
-    usuarios_activos = Users.objects.filter(id_store=user_store, state_user=True).count()
-    usuarios_admin = Users.objects.filter(id_store=user_store, type_user=True).count()
+    # === KPIs DE PRODUCTOS, VENTAS, USUARIOS Y CATEGORÍAS ===
+    # Se calculan en dos consultas de agregación condicional (ver core/metrics.py)
+    kpis, perfil_kpis = calcular_kpis_tienda(user_store)
+    logger.debug("KPIs calculados: %s", perfil_kpis)
     
     # === ANÁLISIS DE CATEGORÍAS ===
-    total_categorias = Category.objects.filter(id_store=user_store).count()
-    
     # Productos por categoría (Top 5)
     productos_por_categoria = Products.objects.filter(
         id_store=user_store,
@@ -702,31 +289,13 @@ def dashboard_view(request):
     ).order_by('-date_sale')[:5]
     
     # === PRODUCTOS CON STOCK CRÍTICO ===
-    productos_criticos = Products.objects.filter(
+    productos_criticos = stock_ledger.anotar_stock_actual(Products.objects.filter(
         id_store=user_store,
-        status_product=True,
-        stock__lt=10
-    ).order_by('stock')[:5]
-    
-    # Promedio de venta
-    promedio_venta = 0
-    if cantidad_ventas_mes > 0:
-        promedio_venta = ingresos_mes / cantidad_ventas_mes
+        status_product=True
+    )).filter(stock_actual__lt=10).order_by('stock_actual')[:5]
     
-    # Utilidad del mes (suma de utility de ventas completadas del mes)
-    utilidad_mes = Sales.objects.filter(
-        id_store=user_store,
-        state=True,
-        date_sale__gte=primer_dia_mes
-    ).aggregate(total=Sum('utility'))['total'] or 0
-    
-    # === GENERAR GRÁFICOS ===
-    print("🎨 Generando gráficos...")
-    grafico_stock = grafico_stock_productos(user_store)
-    grafico_precio_ventas = grafico_precio_ventas_producto(user_store)
-    grafico_ganancias = grafico_historial_ganancias(user_store)
-    grafico_ventas_por_producto = grafico_ventas_producto_por_fecha()
-    print("✅ Gráficos generados")
+    # Los gráficos no se generan aquí: la plantilla los pide en paralelo a
+    # dashboard_grafico_view una vez cargada la página
     
     # Lista de productos para el dropdown
     productos_dropdown = Products.objects.filter(
@@ -736,34 +305,34 @@ def dashboard_view(request):
     
     context = {
         # Productos
-        'productos_activos': productos_activos,
-        'productos_sin_stock': productos_sin_stock,
-        'productos_stock_bajo': productos_stock_bajo,
-        'valor_inventario': valor_inventario,
+        'productos_activos': kpis['productos_activos'],
+        'productos_sin_stock': kpis['productos_sin_stock'],
+        'productos_stock_bajo': kpis['productos_stock_bajo'],
+        'valor_inventario': kpis['valor_inventario'],
         
         # Ventas generales
-        'total_ventas': total_ventas,
-        'ventas_activas': ventas_activas,
-        'ventas_canceladas': ventas_canceladas,
-        'ingresos_totales': ingresos_totales,
+        'total_ventas': kpis['total_ventas'],
+        'ventas_activas': kpis['ventas_activas'],
+        'ventas_canceladas': kpis['ventas_canceladas'],
+        'ingresos_totales': kpis['ingresos_totales'],
         
         # Ventas por período
-        'ingresos_mes': ingresos_mes,
-        'cantidad_ventas_mes': cantidad_ventas_mes,
-        'ingresos_semana': ingresos_semana,
-        'cantidad_ventas_semana': cantidad_ventas_semana,
-        'ingresos_hoy': ingresos_hoy,
-        'cantidad_ventas_hoy': cantidad_ventas_hoy,
-        'promedio_venta': promedio_venta,
-        'utilidad_mes': utilidad_mes,
+        'ingresos_mes': kpis['ingresos_mes'],
+        'cantidad_ventas_mes': kpis['cantidad_ventas_mes'],
+        'ingresos_semana': kpis['ingresos_semana'],
+        'cantidad_ventas_semana': kpis['cantidad_ventas_semana'],
+        'ingresos_hoy': kpis['ingresos_hoy'],
+        'cantidad_ventas_hoy': kpis['cantidad_ventas_hoy'],
+        'promedio_venta': kpis['promedio_venta'],
+        'utilidad_mes': kpis['utilidad_mes'],
         
         # Usuarios
-        'total_usuarios': total_usuarios,
-        'usuarios_activos': usuarios_activos,
-        'usuarios_admin': usuarios_admin,
+        'total_usuarios': kpis['total_usuarios'],
+        'usuarios_activos': kpis['usuarios_activos'],
+        'usuarios_admin': kpis['usuarios_admin'],
         
         # Categorías
-        'total_categorias': total_categorias,
+        'total_categorias': kpis['total_categorias'],
         'productos_por_categoria': productos_por_categoria,
         
         # Listas
@@ -775,112 +344,154 @@ def dashboard_view(request):
         'nombre_tienda': user_store.name,
         'id_store': str(user_store.id_store),
         
-        # Gráficos (base64)
-        'grafico_stock': grafico_stock,
-        'grafico_precio_ventas': grafico_precio_ventas,
-        'grafico_ganancias': grafico_ganancias,
-        'grafico_ventas_por_producto': grafico_ventas_por_producto,
+        # Gráficos (se cargan por HTMX)
+        'plotly_js_url': PLOTLY_JS_URL,
         'productos_dropdown': list(productos_dropdown),
     }
     
     return render(request, 'core/dashboard.html', context)
 
-def productos_view(request):
+def dashboard_grafico_view(request, nombre):
+    """Devuelve el fragmento HTML de un gráfico del dashboard (cargado por HTMX)"""
     # Verificar autenticación
     user_id = request.session.get('user_id') or _get_user_from_cookie(request)
     if not user_id:
-        return redirect('login')
+        return HttpResponse(status=401)
     
-    # Obtener el usuario actual y su tienda
+    if nombre not in charts.GRAFICOS:
+        return HttpResponse(status=404)
+    
+    # Obtener el usuario y su tienda
     try:
-        user = Users.objects.get(id_user=user_id)
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
         user_store = user.id_store
-        
         if not user_store:
-            messages.error(request, 'No tienes una tienda asignada.')
-            return redirect('dashboard')
+            return HttpResponse("Usuario sin tienda asignada", status=400)
     except Users.DoesNotExist:
-        return redirect('login')
+        return HttpResponse(status=401)
     
+    context = {
+        'nombre': nombre,
+        'spec_json': generar_grafico(user_store.id_store, nombre),
+    }
+    
+    return render(request, 'core/partials/grafico.html', context)
+
+def _tabla_productos(request, user_store):
+    """Contexto de la tabla de productos: una página de los productos filtrados"""
     # Obtener parámetros de búsqueda y filtrado
     search_query = request.GET.get('search', '').strip()
     category_filter = request.GET.get('category', '').strip()
     
     # Obtener solo productos activos de la tienda del usuario
-    productos = Products.objects.select_related('id_store').filter(
-        status_product=True,
-        id_store=user_store
-    )
+    productos = Products.objects.filter(status_product=True, id_store=user_store)
     
-    # Aplicar filtro de búsqueda si existe
+    # Aplicar filtro de búsqueda si existe (por el índice de trigramas)
     if search_query:
-        productos = productos.filter(name__icontains=search_query)
+        productos = search.filtrar_por_nombre(productos, search_query)
     
     # Aplicar filtro de categoría si existe (filtrar por nombre de categoría en el campo category)
     if category_filter:
         productos = productos.filter(category=category_filter)
     
-    # Ordenar por nombre
-    productos = productos.order_by('name')
+    # Una página por vez, ordenada por nombre (con el id para desempatar); el
+    # stock actual y la imagen se calculan solo para las filas de la página
+    por_pagina = pagination.tamano_pagina(request, getattr(settings, 'PRODUCTOS_POR_PAGINA', 25))
+    tipos_cursor = (str, uuid.UUID)
+    despues = pagination.leer_cursor(request.GET.get('despues'), tipos_cursor)
+    antes = pagination.leer_cursor(request.GET.get('antes'), tipos_cursor)
+    pagina = pagination.paginar(
+        image_store.anotar_tiene_imagen(stock_ledger.anotar_stock_actual(productos)),
+        ['name', 'id_product'],
+        por_pagina,
+        despues=despues,
+        antes=antes,
+    )
     
-    # Obtener solo las categorías de la tienda del usuario
-    categorias = Category.objects.filter(id_store=user_store).order_by('name_category')
+    # El total se cuenta en la primera página (al cambiar los filtros se
+    # vuelve a ella) y los enlaces de página lo llevan en ?total=
+    resultados_filtrados = None
+    if despues is not None or antes is not None:
+        try:
+            resultados_filtrados = max(int(request.GET.get('total', '')), 0)
+        except ValueError:
+            pass
+    if resultados_filtrados is None:
+        resultados_filtrados = productos.count()
+    
+    # Los enlaces de página conservan los filtros
+    filtros = {
+        clave: valor for clave, valor in [
+            ('search', search_query),
+            ('category', category_filter),
+            ('por_pagina', request.GET.get('por_pagina', '')),
+            ('total', resultados_filtrados),
+        ] if valor
+    }
     
-    # Calcular el estado del stock para cada producto
-    productos_con_estado = []
-    productos_activos = 0
-    productos_stock_bajo = 0
+    return {
+        'productos': pagina['filas'],
+        'resultados_filtrados': resultados_filtrados,
+        'stock_bajo': STOCK_BAJO,
+        'search_query': search_query,
+        'category_filter': category_filter,
+        'pagina_anterior': urlencode({**filtros, 'antes': pagina['anterior']}) if pagina['anterior'] else None,
+        'pagina_siguiente': urlencode({**filtros, 'despues': pagina['siguiente']}) if pagina['siguiente'] else None,
+    }
+
+
+def productos_view(request):
+    # Verificar autenticación
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return redirect('login')
     
-    for producto in productos:
-        stock_num = float(producto.stock)
-        
-        # Contar productos activos
-        productos_activos += 1
-        
-        if stock_num == 0:
-            estado = 'agotado'
-            estado_clase = 'bg-red-100 text-red-800'
-            estado_texto = 'Agotado'
-            productos_stock_bajo += 1
-        elif stock_num < 10:
-            estado = 'bajo'
-            estado_clase = 'bg-yellow-100 text-yellow-800'
-            estado_texto = 'Stock Bajo'
-            productos_stock_bajo += 1
-        else:
-            estado = 'disponible'
-            estado_clase = 'bg-green-100 text-green-800'
-            estado_texto = 'En Stock'
-        
-        # Convertir imagen a base64 si existe
-        imagen_base64 = None
-        if producto.image:
-            try:
-                imagen_base64 = base64.b64encode(producto.image).decode('utf-8')
-            except Exception:
-                imagen_base64 = None
+    # Obtener el usuario actual y su tienda
+    try:
+        user = Users.objects.get(id_user=user_id)
+        user_store = user.id_store
         
-        productos_con_estado.append({
-            'producto': producto,
-            'imagen_base64': imagen_base64,
-            'estado': estado,
-            'estado_clase': estado_clase,
-            'estado_texto': estado_texto
-        })
+        if not user_store:
+            messages.error(request, 'No tienes una tienda asignada.')
+            return redirect('dashboard')
+    except Users.DoesNotExist:
+        return redirect('login')
+    
+    # Obtener solo las categorías de la tienda del usuario
+    categorias = Category.objects.filter(id_store=user_store).order_by('name_category')
+    
+    # Contadores de la tienda en una sola consulta de agregación
+    resumen = resumen_catalogo(user_store.id_store)
     
     context = {
-        'productos_con_estado': productos_con_estado,
-        'total_productos': len(productos_con_estado),
-        'productos_activos': productos_activos,
-        'productos_stock_bajo': productos_stock_bajo,
-        'total_categorias': categorias.count(),
+        **_tabla_productos(request, user_store),
+        'total_productos': resumen['productos_activos'],
+        'productos_activos': resumen['productos_activos'],
+        'productos_stock_bajo': resumen['productos_stock_bajo'],
+        'total_categorias': resumen['total_categorias'],
         'categorias': categorias,
-        'search_query': search_query,
-        'category_filter': category_filter,
     }
     
     return render(request, 'core/productos.html', context)
 
+def productos_tabla_view(request):
+    """Devuelve el fragmento HTML de la tabla de productos (filtros y páginas por HTMX)"""
+    # Verificar autenticación
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return HttpResponse(status=401)
+    
+    # Obtener el usuario y su tienda
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return HttpResponse("Usuario sin tienda asignada", status=400)
+    except Users.DoesNotExist:
+        return HttpResponse(status=401)
+    
+    return render(request, 'core/partials/productos_tabla.html', _tabla_productos(request, user_store))
+
 def ventas_view(request):
     # Verificar autenticación
     user_id = request.session.get('user_id') or _get_user_from_cookie(request)
@@ -902,8 +513,18 @@ def ventas_view(request):
     fecha_fin = request.GET.get('fecha_fin', '').strip()
     estado = request.GET.get('estado', '').strip()
     
+    # Las fechas inválidas se ignoran en lugar de fallar en la consulta
+    try:
+        date.fromisoformat(fecha_inicio)
+    except ValueError:
+        fecha_inicio = ''
+    try:
+        date.fromisoformat(fecha_fin)
+    except ValueError:
+        fecha_fin = ''
+    
     # Obtener ventas de la tienda directamente por id_store
-    ventas = Sales.objects.filter(id_store=user_store).order_by('-date_sale')
+    ventas = Sales.objects.filter(id_store=user_store)
     
     # Aplicar filtros
     if search_id:
@@ -919,24 +540,57 @@ def ventas_view(request):
         estado_bool = estado == 'true'
         ventas = ventas.filter(state=estado_bool)
     
-    # Calcular estadísticas solo de la tienda del usuario
-    from django.db.models import Sum
-    total_ventas = Sales.objects.filter(id_store=user_store).count()
-    ventas_activas = Sales.objects.filter(id_store=user_store, state=True).count()
-    ventas_canceladas = Sales.objects.filter(id_store=user_store, state=False).count()
-    total_ingresos = Sales.objects.filter(id_store=user_store, state=True).aggregate(Sum('total'))['total__sum'] or 0
+    # Una página por vez, por cursor sobre (date_sale, id_sale): las ventas
+    # nuevas no desplazan las páginas que se están recorriendo
+    por_pagina = pagination.tamano_pagina(request, getattr(settings, 'VENTAS_POR_PAGINA', 50))
+    tipos_cursor = (date.fromisoformat, uuid.UUID)
+    pagina = pagination.paginar(
+        ventas,
+        ['-date_sale', '-id_sale'],
+        por_pagina,
+        despues=pagination.leer_cursor(request.GET.get('despues'), tipos_cursor),
+        antes=pagination.leer_cursor(request.GET.get('antes'), tipos_cursor),
+    )
+    
+    # Calcular estadísticas solo de la tienda del usuario (desde el resumen diario)
+    resumen = rollups.conteo_ventas(user_store.id_store)
+    
+    # Cantidad de resultados: exacta desde el resumen diario salvo al buscar por
+    # ID, que obligaría a recorrer todas las ventas (se omite)
+    resultados_filtrados = None
+    if not search_id:
+        filtrado = rollups.conteo_ventas(user_store.id_store, fecha_inicio or None, fecha_fin or None)
+        if estado == 'true':
+            resultados_filtrados = filtrado['completadas']
+        elif estado == 'false':
+            resultados_filtrados = filtrado['canceladas']
+        else:
+            resultados_filtrados = filtrado['completadas'] + filtrado['canceladas']
+    
+    # Los enlaces de página conservan los filtros
+    filtros = {
+        clave: valor for clave, valor in [
+            ('search_id', search_id),
+            ('fecha_inicio', fecha_inicio),
+            ('fecha_fin', fecha_fin),
+            ('estado', estado),
+            ('por_pagina', request.GET.get('por_pagina', '')),
+        ] if valor
+    }
     
     context = {
-        'ventas': ventas,
-        'total_ventas': total_ventas,
-        'ventas_activas': ventas_activas,
-        'ventas_canceladas': ventas_canceladas,
-        'total_ingresos': total_ingresos,
+        'ventas': pagina['filas'],
+        'total_ventas': resumen['completadas'] + resumen['canceladas'],
+        'ventas_activas': resumen['completadas'],
+        'ventas_canceladas': resumen['canceladas'],
+        'total_ingresos': resumen['total'],
         'search_id': search_id,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
         'estado': estado,
-        'resultados_filtrados': ventas.count(),
+        'resultados_filtrados': resultados_filtrados,
+        'pagina_anterior': urlencode({**filtros, 'antes': pagina['anterior']}) if pagina['anterior'] else None,
+        'pagina_siguiente': urlencode({**filtros, 'despues': pagina['siguiente']}) if pagina['siguiente'] else None,
     }
     
     return render(request, 'core/ventas.html', context)
@@ -956,123 +610,30 @@ def crear_venta_view(request):
         return redirect('dashboard')
     
     if request.method == 'GET':
-        # Obtener productos disponibles de la tienda
-        productos = Products.objects.filter(id_store_id=id_store_actual, status_product=True, stock__gt=0).order_by('name')
-        
-        context = {
-            'productos': productos
-        }
-        return render(request, 'core/crear_venta.html', context)
+        # Los productos se buscan mientras se escribe (api_buscar_productos)
+        return render(request, 'core/crear_venta.html')
     
     elif request.method == 'POST':
-        import json
-        from datetime import datetime
-        
         try:
             # Obtener datos del formulario
-            productos_json = request.POST.get('productos', '[]')
-            productos_venta = json.loads(productos_json)
+            productos_venta = json.loads(request.POST.get('productos', '[]'))
             metodo_pago = request.POST.get('metodo_pago', '').strip()
             
-            if not productos_venta:
-                messages.error(request, 'Debes agregar al menos un producto a la venta')
-                return redirect('crear_venta')
-            
-            if not metodo_pago:
-                messages.error(request, 'Debes seleccionar un método de pago')
-                return redirect('crear_venta')
-            
-            # Calcular total e items
-            total_venta = 0
-            total_items = 0
-            for item in productos_venta:
-                total_venta += float(item['subtotal'])
-                total_items += int(item['quantity'])
-            
-            # Crear la venta con SQL directo (solo campos que existen en la tabla)
-            with connection.cursor() as cursor:
-                # Insertar venta - campos: date_sale, items, total, pay_method, state
-                cursor.execute("""
-                    INSERT INTO sales (date_sale, items, total, pay_method, state) 
-                    VALUES (%s, %s, %s, %s, %s) 
-                    RETURNING id_sale
-                """, [datetime.now().date(), total_items, total_venta, metodo_pago, True])
-                
-                id_sale_generado = cursor.fetchone()[0]
-                
-                # Insertar productos en sales_bag y actualizar stock
-                for item in productos_venta:
-                    producto_id = item['id_product']
-                    cantidad = int(item['quantity'])
-                    
-                    # Insertar en sales_bag
-                    cursor.execute("""
-                        INSERT INTO sales_bag (id_sale, id_product, quantitity) 
-                        VALUES (%s, %s, %s)
-                    """, [id_sale_generado, producto_id, cantidad])
-                    
-                    # Actualizar stock del producto
-                    cursor.execute("""
-                        UPDATE products 
-                        SET stock = stock - %s 
-                        WHERE id_product = %s
-                        RETURNING stock, name, id_store
-                    """, [cantidad, producto_id])
-                    
-                    # Obtener el stock actualizado y verificar si está bajo
-                    resultado = cursor.fetchone()
-                    if resultado:
-                        nuevo_stock = float(resultado[0])
-                        nombre_producto = resultado[1]
-                        id_store = resultado[2]
-                        
-                        # Si el stock quedó bajo (menos de 10), enviar alerta
-                        if nuevo_stock < 10:
-                            from threading import Thread
-                            from .notifications import enviar_alerta_stock_bajo
-                            import time
-                            
-                            # Obtener el email del usuario logueado
-                            try:
-                                user_info = UsersInfo.objects.get(id_user=user_id)
-                                user_email = user_info.email
-                            except UsersInfo.DoesNotExist:
-                                user_email = "el.nico.taz36@gmail.com"
-                            
-                            # Obtener el nombre de la tienda
-                            try:
-                                store = Stores.objects.get(id_store=id_store)
-                                store_name = store.name
-                            except Stores.DoesNotExist:
-                                store_name = "Tienda"
-                            
-                            # Función para enviar email en segundo plano
-                            def enviar_alerta_async():
-                                time.sleep(0.6)  # Respetar límite de 2 req/seg
-                                enviar_alerta_stock_bajo(nombre_producto, int(nuevo_stock), store_name, user_email)
-                            
-                            # Iniciar thread en segundo plano
-                            thread = Thread(target=enviar_alerta_async)
-                            thread.daemon = True
-                            thread.start()
-            
-            # Registrar movimiento de creación de venta
-            _registrar_movimiento(
-                user_id=user_id,
-                type_movement='venta',
-                type_action='creacion',
-                id_sale=id_sale_generado
-            )
-            
-            messages.success(request, f'Venta registrada exitosamente. ID: {id_sale_generado}')
-            return redirect('ventas')
-            
+            # Venta, líneas, stock, auditoría y resumen diario en una sola transacción
+            venta = checkout.registrar_venta(id_store_actual, user_id, productos_venta, metodo_pago)
         except json.JSONDecodeError:
             messages.error(request, 'Error al procesar los productos')
             return redirect('crear_venta')
+        except checkout.VentaInvalida as e:
+            messages.error(request, str(e))
+            return redirect('crear_venta')
         except Exception as e:
             messages.error(request, f'Error al crear la venta: {str(e)}')
             return redirect('crear_venta')
+        
+        messages.success(request, f'Venta registrada exitosamente. ID: {venta.id_sale}')
+        return redirect('ventas')
+
 
 def detalle_venta_view(request, sale_id):
     # Verificar autenticación
@@ -1144,23 +705,13 @@ def cancelar_venta_view(request, sale_id):
             messages.error(request, 'Venta no encontrada o no tienes permisos para cancelarla')
             return redirect('ventas')
         
-        with connection.cursor() as cursor:
-            # Marcar venta como cancelada
-            cursor.execute("""
-                UPDATE sales 
-                SET state = FALSE 
-                WHERE id_sale = %s
-            """, [sale_id])
-        
-        # Registrar movimiento de eliminación (cancelación)
-        _registrar_movimiento(
-            user_id=user_id,
-            type_movement='venta',
-            type_action='eliminacion',
-            id_sale=sale_id
-        )
+        # Cancelar, restaurar stock, auditar y actualizar el resumen en una transacción
+        canceladas = cancellation.cancelar_ventas(user_store.id_store, user_id, [sale_id])
         
-        messages.success(request, 'Venta cancelada exitosamente')
+        if canceladas:
+            messages.success(request, 'Venta cancelada y stock restaurado exitosamente')
+        else:
+            messages.error(request, 'La venta ya estaba cancelada')
     except Exception as e:
         messages.error(request, f'Error al cancelar la venta: {str(e)}')
     
@@ -1210,10 +761,12 @@ def editar_venta_view(request, sale_id):
                 messages.error(request, 'Venta no encontrada o no tienes permisos para editarla')
                 return redirect('ventas')
             
-            with connection.cursor() as cursor:
-                # Obtener el estado actual de la venta
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Obtener el estado actual de la venta (bloqueando la fila)
                 cursor.execute("""
-                    SELECT state FROM sales WHERE id_sale = %s
+                    SELECT state, id_store, date_sale, total, utility, items
+                    FROM sales WHERE id_sale = %s
+                    FOR UPDATE
                 """, [sale_id])
                 resultado = cursor.fetchone()
                 
@@ -1231,23 +784,10 @@ def editar_venta_view(request, sale_id):
                 # Determinar el tipo de acción para el registro
                 tipo_accion = None
                 
-                # Si se está cancelando la venta (cambio de True a False), restaurar stock
+                # Si se está cancelando la venta (cambio de True a False), restaurar stock.
+                # El servicio también registra el movimiento y actualiza el resumen diario.
                 if estado_actual and not state_bool:
-                    # Obtener los productos de la venta desde sales_bag
-                    cursor.execute("""
-                        SELECT id_product, quantitity 
-                        FROM sales_bag 
-                        WHERE id_sale = %s
-                    """, [sale_id])
-                    productos_venta = cursor.fetchall()
-                    
-                    # Restaurar el stock de cada producto
-                    for producto_id, cantidad in productos_venta:
-                        cursor.execute("""
-                            UPDATE products 
-                            SET stock = stock + %s 
-                            WHERE id_product = %s
-                        """, [cantidad, producto_id])
+                    cancellation.cancelar_ventas(user_store.id_store, user_id, [sale_id])
                     
                     tipo_accion = 'eliminacion'
                     messages.success(request, 'Venta cancelada y stock restaurado exitosamente')
@@ -1262,13 +802,14 @@ def editar_venta_view(request, sale_id):
                     WHERE id_sale = %s
                 """, [pay_method, state_bool, sale_id])
             
-            # Registrar movimiento según el tipo de acción
-            _registrar_movimiento(
-                user_id=user_id,
-                type_movement='venta',
-                type_action=tipo_accion,
-                id_sale=sale_id
-            )
+            # Registrar movimiento de modificación (la cancelación ya quedó registrada)
+            if tipo_accion == 'modificacion':
+                _registrar_movimiento(
+                    user_id=user_id,
+                    type_movement='venta',
+                    type_action=tipo_accion,
+                    id_sale=sale_id
+                )
             
             return redirect('ventas')
             
@@ -1446,6 +987,8 @@ def crear_usuario_view(request):
                     VALUES (%s, %s, %s, %s, %s)
                 """, [id_user_generado, name, email, rut, born_date])
             
+            recipients.invalidar_destinatarios(id_store_actual)
+            
             messages.success(request, f'Usuario "{username}" creado exitosamente en tu tienda')
             return redirect('usuarios')
             
@@ -1467,7 +1010,13 @@ def agregar_producto_view(request):
         price_buy = request.POST.get('price_buy', '').strip()
         category = request.POST.get('category', '').strip()
         description = request.POST.get('description', '').strip()
-        image_file = request.FILES.get('image')
+        
+        # Validar la imagen antes de tocar la base de datos
+        try:
+            image_file = uploads.validar_imagen(request, 'image')
+        except uploads.ImagenInvalida as e:
+            messages.error(request, str(e))
+            return redirect('agregar_producto')
         
         # Validar campos requeridos
         if not name:
@@ -1498,6 +1047,14 @@ def agregar_producto_view(request):
             messages.error(request, 'La imagen del producto es obligatoria')
             return redirect('agregar_producto')
         
+        try:
+            stock_inicial = int(float(stock))
+            precio_venta = int(float(price_sale))
+            precio_compra = int(float(price_buy))
+        except ValueError:
+            messages.error(request, 'Error en los valores numéricos. Verifica el stock y los precios.')
+            return redirect('agregar_producto')
+        
         try:
             # Obtener el usuario actual
             user = Users.objects.get(id_user=user_id)
@@ -1517,19 +1074,28 @@ def agregar_producto_view(request):
                 messages.error(request, 'Categoría no válida o no pertenece a tu tienda')
                 return redirect('agregar_producto')
             
-            # Leer la imagen y convertirla a bytes
-            image_bytes = image_file.read()
+            # Guardar la imagen en el almacén justo antes del INSERT; en la fila
+            # queda solo su hash
+            image_sha256 = image_store.guardar_imagen(image_file)
             
             # Crear el producto usando SQL directo (PostgreSQL genera el UUID automáticamente)
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO products (name, stock, price_sale, price_buy, category, description, image, id_store, status_product) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) 
-                    RETURNING id_product
-                """, [name, int(float(stock)), int(float(price_sale)), int(float(price_buy)), nombre_categoria, description, image_bytes, user_store.id_store, True])
-                
-                # Obtener el id_product generado
-                id_product_generado = cursor.fetchone()[0]
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO products (name, stock, price_sale, price_buy, category, description, image_sha256, id_store, status_product) 
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) 
+                        RETURNING id_product
+                    """, [name, stock_inicial, precio_venta, precio_compra, nombre_categoria, description, image_sha256, user_store.id_store, True])
+                    
+                    # Obtener el id_product generado
+                    id_product_generado = cursor.fetchone()[0]
+            except Exception:
+                # No dejar en el almacén una imagen que ningún producto usa
+                thumbnails.eliminar_si_no_referenciada(image_sha256)
+                raise
+            
+            thumbnails.procesar_en_segundo_plano(image_sha256)
+            chart_cache.invalidar_tienda(user_store.id_store)
             
             # Registrar movimiento de creación de producto
             _registrar_movimiento(
@@ -1646,13 +1212,23 @@ def editar_producto_view(request, producto_id):
             price_buy = request.POST.get('price_buy', '').strip()
             category = request.POST.get('category', '').strip()
             description = request.POST.get('description', '').strip()
-            image_file = request.FILES.get('image')  # Obtener archivo de imagen si existe
+            
+            # Validar la imagen (si se subió una) antes de tocar la base de datos
+            try:
+                image_file = uploads.validar_imagen(request, 'image')
+            except uploads.ImagenInvalida as e:
+                messages.error(request, str(e))
+                return redirect('editar_producto', producto_id=producto_id)
             
             # Validar campos requeridos
             if not all([name, stock, price_sale, price_buy, category, description]):
                 messages.error(request, 'Todos los campos son obligatorios')
                 return redirect('editar_producto', producto_id=producto_id)
             
+            nuevo_stock = int(float(stock))
+            precio_venta = int(float(price_sale))
+            precio_compra = int(float(price_buy))
+            
             # Buscar el producto Y verificar que pertenece a la tienda del usuario
             producto = Products.objects.get(id_product=producto_id, id_store=user_store)
             
@@ -1664,19 +1240,45 @@ def editar_producto_view(request, producto_id):
                 messages.error(request, 'Categoría no válida o no pertenece a tu tienda')
                 return redirect('editar_producto', producto_id=producto_id)
             
-            # Actualizar los datos
+            # Actualizar los datos (el stock se ajusta en el libro de movimientos)
             producto.name = name
-            producto.stock = int(float(stock))
-            producto.price_sale = int(float(price_sale))
-            producto.price_buy = int(float(price_buy))
+            producto.price_sale = precio_venta
+            producto.price_buy = precio_compra
             producto.category = nombre_categoria
             producto.description = description
             
-            # Si se subió una nueva imagen, actualizarla
+            # Si se subió una nueva imagen, guardarla en el almacén y soltar la antigua de la fila
+            imagen_anterior = None
             if image_file:
-                producto.image = image_file.read()
+                imagen_anterior = producto.image_sha256
+                producto.image_sha256 = image_store.guardar_imagen(image_file)
+                producto.image = None
             
-            producto.save(user_id=user_id)
+            try:
+                with transaction.atomic():
+                    producto.save(user_id=user_id)
+                    if image_file:
+                        thumbnails.procesar_en_segundo_plano(producto.image_sha256)
+                    delta_stock = stock_ledger.ajustar_stock(user_store.id_store, producto_id, nuevo_stock, user_id)
+                    
+                    # Si el stock cambió y quedó bajo, dejar la alerta en la bandeja de
+                    # salida (solo si no se alertó ya); si se repuso, volver a armarla
+                    if delta_stock:
+                        with connection.cursor() as cursor:
+                            if nuevo_stock < STOCK_BAJO:
+                                alerts.encolar_alertas_stock_bajo(
+                                    cursor, user_store.id_store, user_id, [(producto_id, name, nuevo_stock)]
+                                )
+                            else:
+                                alerts.rearmar_alertas_stock(cursor, [producto_id])
+            except Exception:
+                if image_file:
+                    thumbnails.eliminar_si_no_referenciada(producto.image_sha256)
+                raise
+            
+            # La imagen reemplazada se borra si ya no la usa ningún producto
+            if imagen_anterior and imagen_anterior != producto.image_sha256:
+                thumbnails.eliminar_si_no_referenciada(imagen_anterior)
             
             # Registrar movimiento de modificación
             _registrar_movimiento(
@@ -1702,7 +1304,9 @@ def editar_producto_view(request, producto_id):
     # GET: Mostrar formulario con datos actuales
     try:
         # Buscar el producto Y verificar que pertenece a la tienda del usuario
-        producto = Products.objects.get(id_product=producto_id, id_store=user_store)
+        producto = image_store.anotar_tiene_imagen(
+            stock_ledger.anotar_stock_actual(Products.objects)
+        ).get(id_product=producto_id, id_store=user_store)
         
         # Obtener solo las categorías de la tienda del usuario
         if user_store:
@@ -1719,20 +1323,10 @@ def editar_producto_view(request, producto_id):
             except Category.DoesNotExist:
                 pass
         
-        # Convertir imagen a base64 si existe
-        imagen_base64 = None
-        if producto.image:
-            try:
-                import base64
-                imagen_base64 = base64.b64encode(bytes(producto.image)).decode('utf-8')
-            except Exception:
-                pass
-        
         context = {
             'producto': producto,
             'categorias': categorias,
             'categoria_actual_id': categoria_actual_id,
-            'imagen_base64': imagen_base64,
         }
         
         return render(request, 'core/editar_producto.html', context)
@@ -1760,7 +1354,12 @@ def desactivar_usuario_view(request, user_id):
                 UPDATE users 
                 SET state_user = FALSE 
                 WHERE id_user = %s
+                RETURNING id_store
             """, [user_id])
+            fila = cursor.fetchone()
+        
+        if fila:
+            recipients.invalidar_destinatarios(fila[0])
         
         messages.success(request, 'Usuario desactivado exitosamente')
     except Exception as e:
@@ -1802,12 +1401,17 @@ def editar_usuario_view(request, user_id):
             email = request.POST.get('email')
             rut = request.POST.get('rut')
             born_date = request.POST.get('born_date')
+            alert_level = request.POST.get('alert_level', 'medio')
             
             # Validaciones básicas
             if not all([username, name, email, rut, born_date]):
                 messages.error(request, 'Todos los campos son requeridos')
                 return redirect('editar_usuario', user_id=user_id)
             
+            if alert_level not in recipients.NIVELES:
+                messages.error(request, 'Nivel de alertas no válido')
+                return redirect('editar_usuario', user_id=user_id)
+            
             # Verificar si el username ya existe (excepto el actual)
             if Users.objects.exclude(id_user=user_id).filter(username=username).exists():
                 messages.error(request, f'El usuario "{username}" ya existe')
@@ -1822,20 +1426,27 @@ def editar_usuario_view(request, user_id):
                         UPDATE users 
                         SET username = %s, password = %s, type_user = %s, state_user = %s 
                         WHERE id_user = %s
+                        RETURNING id_store
                     """, [username, hashed_password, type_user, state_user, user_id])
                 else:
                     cursor.execute("""
                         UPDATE users 
                         SET username = %s, type_user = %s, state_user = %s 
                         WHERE id_user = %s
+                        RETURNING id_store
                     """, [username, type_user, state_user, user_id])
+                fila = cursor.fetchone()
                 
                 # Actualizar información personal
                 cursor.execute("""
                     UPDATE users_info 
-                    SET name = %s, email = %s, rut = %s, born_date = %s 
+                    SET name = %s, email = %s, rut = %s, born_date = %s, alert_level = %s 
                     WHERE id_user = %s
-                """, [name, email, rut, born_date, user_id])
+                """, [name, email, rut, born_date, alert_level, user_id])
+            
+            # Los cambios de rol, estado, email o nivel afectan a quién recibe alertas
+            if fila:
+                recipients.invalidar_destinatarios(fila[0])
             
             messages.success(request, f'Usuario "{username}" actualizado exitosamente')
             return redirect('usuarios')
@@ -1936,20 +1547,107 @@ def historial_movimientos_view(request):
         return redirect('dashboard')
 
 
+# Las URLs de imágenes con ?v=<hash> no cambian nunca; las demás se revalidan con ETag
+_CACHE_IMAGEN_INMUTABLE = 'public, max-age=31536000, immutable'
+_CACHE_IMAGEN_REVALIDAR = 'public, no-cache'
+# Subida aún sin normalizar: puede tener EXIF/GPS, no se guarda en ninguna caché
+_CACHE_IMAGEN_PENDIENTE = 'private, no-store'
+
+
+def _respuesta_imagen(request, etag, abrir, inmutable, pendiente=False):
+    """
+    Responde 304 si el navegador ya tiene la versión ``etag``; si no, sirve
+    el archivo que devuelve ``abrir()`` con su content type real
+    """
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        archivo = abrir()
+        respuesta = FileResponse(archivo, content_type=image_store.tipo_contenido_archivo(archivo))
+    respuesta['ETag'] = etag
+    if pendiente:
+        respuesta['Cache-Control'] = _CACHE_IMAGEN_PENDIENTE
+    else:
+        respuesta['Cache-Control'] = _CACHE_IMAGEN_INMUTABLE if inmutable else _CACHE_IMAGEN_REVALIDAR
+    respuesta['X-Content-Type-Options'] = 'nosniff'
+    return respuesta
+
+
 def producto_imagen_view(request, producto_id):
-    """Sirve la imagen de un producto desde la base de datos"""
+    """
+    Sirve la imagen de un producto desde el almacén de imágenes
+    
+    El ETag es el SHA-256 de la imagen, así que un If-None-Match vigente se
+    responde con 304 sin abrir el archivo. Una imagen que aún está en la fila
+    (ver el comando migrar_imagenes) se mueve al almacén la primera vez que
+    se pide; su ETag es el mismo antes y después.
+    """
     try:
-        producto = Products.objects.get(id_product=producto_id)
-        
-        # Si el producto tiene imagen, devolverla
-        if producto.image:
-            return HttpResponse(producto.image, content_type='image/jpeg')
-        else:
-            # Si no tiene imagen, devolver una imagen por defecto o un 404
-            return HttpResponse(status=404)
-            
+        producto = Products.objects.only('image_sha256').get(id_product=producto_id)
+    except Products.DoesNotExist:
+        return HttpResponse(status=404)
+    
+    sha256 = producto.image_sha256 or image_store.mover_imagen_de_fila(producto_id)
+    if not sha256:
+        return HttpResponse(status=404)
+    
+    try:
+        return _respuesta_imagen(
+            request,
+            f'"{sha256}"',
+            lambda: image_store.abrir_imagen(sha256),
+            request.GET.get('v') == sha256[:12],
+            pendiente=thumbnails.pendiente_de_normalizar(sha256),
+        )
+    except (FileNotFoundError, ValueError):
+        return HttpResponse(status=404)
+
+
+def producto_miniatura_view(request, producto_id, tamano):
+    """
+    Sirve una miniatura de la imagen de un producto
+    
+    Si la URL lleva el hash de la imagen (``?v=``), la respuesta no cambia
+    nunca y el navegador puede cachearla sin volver a pedirla; si no, se
+    revalida con ETag. Mientras la miniatura no exista se sirve la imagen
+    original, sin caché si aún no se normalizó.
+    """
+    if tamano not in thumbnails.configuracion()['TAMANOS']:
+        return HttpResponse(status=404)
+    
+    try:
+        producto = Products.objects.only('image_sha256').get(id_product=producto_id)
     except Products.DoesNotExist:
         return HttpResponse(status=404)
+    
+    # Imagen antigua aún en la base de datos: no tiene miniaturas
+    if not producto.image_sha256:
+        return redirect('producto_imagen', producto_id=producto_id)
+    
+    sha256 = producto.image_sha256
+    miniatura = thumbnails.buscar_miniatura(sha256, tamano, 'image/webp' in request.headers.get('Accept', ''))
+    try:
+        if miniatura:
+            ruta, content_type = miniatura
+            formato = content_type.split('/')[1]
+            respuesta = _respuesta_imagen(
+                request,
+                f'"{sha256}-{tamano}-{formato}"',
+                lambda: open(ruta, 'rb'),
+                request.GET.get('v') == sha256[:12],
+            )
+        else:
+            # Las miniaturas de una subida pendiente las genera su normalización
+            pendiente = thumbnails.pendiente_de_normalizar(sha256)
+            if not pendiente:
+                thumbnails.generar_en_segundo_plano(sha256)
+            respuesta = _respuesta_imagen(
+                request, f'"{sha256}"', lambda: image_store.abrir_imagen(sha256), False, pendiente=pendiente
+            )
+    except (FileNotFoundError, ValueError):
+        return HttpResponse(status=404)
+    
+    respuesta['Vary'] = 'Accept'
+    return respuesta
 
 
 def crear_categoria_view(request):
@@ -2026,6 +1724,7 @@ def superusuario_view(request):
                     phone=store_phone,
                     administrator_name=store_admin
                 )
+                recipients.invalidar_destinatarios(nueva_tienda.id_store)
                 
                 messages.success(request, f'Tienda "{store_name}" creada exitosamente')
                 return redirect('superusuario')
@@ -2077,6 +1776,7 @@ def superusuario_view(request):
                     rut=rut,
                     born_date=born_date
                 )
+                recipients.invalidar_destinatarios(tienda.id_store)
                 
                 messages.success(request, f'Usuario administrador "{username}" creado exitosamente para la tienda "{tienda.name}"')
                 return redirect('superusuario')
@@ -2104,6 +1804,7 @@ def superusuario_view(request):
 
 from django.http import JsonResponse
 from django.db.models import Sum, Count
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import datetime, timedelta
 
 def api_ventas_por_dia(request):
@@ -2120,32 +1821,13 @@ def api_ventas_por_dia(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    # Obtener ventas de la tienda
-    ventas_ids = SalesMovement.objects.filter(
-        id_user__id_store=user_store,
-        type_movement='venta'
-    ).values_list('id_sale', flat=True).distinct()
-    
-    # Últimos 30 días
+    # Últimos 30 días (desde el resumen diario de la tienda)
     hoy = datetime.now().date()
     hace_30_dias = hoy - timedelta(days=30)
     
-    ventas_por_dia = Sales.objects.filter(
-        id_sale__in=ventas_ids,
-        state=True,
-        date_sale__gte=hace_30_dias
-    ).values('date_sale').annotate(
-        total_ventas=Sum('total'),
-        cantidad_ventas=Count('id_sale')
-    ).order_by('date_sale')
+    ventas_por_dia = rollups.ventas_por_dia(user_store.id_store, desde=hace_30_dias)
     
-    datos = {
-        'labels': [v['date_sale'].strftime('%d/%m') for v in ventas_por_dia],
-        'ventas': [float(v['total_ventas']) for v in ventas_por_dia],
-        'cantidad': [v['cantidad_ventas'] for v in ventas_por_dia]
-    }
-    
-    return JsonResponse(datos)
+    return JsonResponse(dashboard_data.formato_ventas_por_dia(ventas_por_dia))
 
 
 def api_ventas_por_mes(request):
@@ -2162,36 +1844,13 @@ def api_ventas_por_mes(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    from django.db.models.functions import TruncMonth
-    
-    # Obtener ventas de la tienda
-    ventas_ids = SalesMovement.objects.filter(
-        id_user__id_store=user_store,
-        type_movement='venta'
-    ).values_list('id_sale', flat=True).distinct()
-    
-    # Últimos 12 meses
+    # Últimos 12 meses (desde el resumen diario de la tienda)
     hoy = datetime.now().date()
     hace_12_meses = hoy - timedelta(days=365)
     
-    ventas_por_mes = Sales.objects.filter(
-        id_sale__in=ventas_ids,
-        state=True,
-        date_sale__gte=hace_12_meses
-    ).annotate(
-        mes=TruncMonth('date_sale')
-    ).values('mes').annotate(
-        total_ventas=Sum('total'),
-        cantidad_ventas=Count('id_sale')
-    ).order_by('mes')
-    
-    datos = {
-        'labels': [v['mes'].strftime('%B %Y') for v in ventas_por_mes],
-        'ventas': [float(v['total_ventas']) for v in ventas_por_mes],
-        'cantidad': [v['cantidad_ventas'] for v in ventas_por_mes]
-    }
+    ventas_por_mes = rollups.ventas_por_mes(user_store.id_store, hace_12_meses)
     
-    return JsonResponse(datos)
+    return JsonResponse(dashboard_data.formato_ventas_por_mes(ventas_por_mes))
 
 
 def api_productos_mas_vendidos(request):
@@ -2208,42 +1867,48 @@ def api_productos_mas_vendidos(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    # Obtener ventas de la tienda
-    ventas_ids = SalesMovement.objects.filter(
-        id_user__id_store=user_store,
-        type_movement='venta'
-    ).values_list('id_sale', flat=True).distinct()
-    
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT p.name, SUM(sb.quantitity) as total_vendido, SUM(s.total) as ingresos
-                FROM sales_bag sb
-                INNER JOIN products p ON sb.id_product = p.id_product
-                INNER JOIN sales s ON sb.id_sale = s.id_sale
-                WHERE s.id_sale = ANY(%s) AND s.state = true
-                GROUP BY p.id_product, p.name
-                ORDER BY total_vendido DESC
-                LIMIT 10
-            """, [list(ventas_ids)])
-            
-            productos = []
-            for row in cursor.fetchall():
-                productos.append({
-                    'nombre': row[0],
-                    'cantidad': float(row[1]),
-                    'ingresos': float(row[2])
-                })
-            
-            datos = {
-                'labels': [p['nombre'] for p in productos],
-                'cantidades': [p['cantidad'] for p in productos],
-                'ingresos': [p['ingresos'] for p in productos]
-            }
-            
-            return JsonResponse(datos)
+        productos = analytics.productos_mas_vendidos(user_store.id_store, limite=10)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse(dashboard_data.formato_productos_mas_vendidos(productos))
+
+
+def api_buscar_productos(request):
+    """API: Productos de la tienda que coinciden con ?q= (autocompletado)"""
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    try:
+        limite = int(request.GET.get('limite', 10))
+    except ValueError:
+        return JsonResponse({'error': 'limite debe ser un número'}, status=400)
+    
+    productos = search.buscar_productos(
+        user_store.id_store,
+        request.GET.get('q', ''),
+        limite=limite,
+        con_stock=request.GET.get('con_stock') == '1',
+    )
+    return JsonResponse({'productos': [
+        {
+            'id_product': producto['id_product'],
+            'nombre': producto['name'],
+            'precio': float(producto['price_sale']),
+            'stock': float(producto['stock_actual']),
+        }
+        for producto in productos
+    ]})
 
 
 def api_ventas_por_categoria(request):
@@ -2260,41 +1925,12 @@ def api_ventas_por_categoria(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    # Obtener ventas de la tienda
-    ventas_ids = SalesMovement.objects.filter(
-        id_user__id_store=user_store,
-        type_movement='venta'
-    ).values_list('id_sale', flat=True).distinct()
-    
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT p.category, SUM(sb.quantitity) as total_vendido, SUM(s.total) as ingresos
-                FROM sales_bag sb
-                INNER JOIN products p ON sb.id_product = p.id_product
-                INNER JOIN sales s ON sb.id_sale = s.id_sale
-                WHERE s.id_sale = ANY(%s) AND s.state = true
-                GROUP BY p.category
-                ORDER BY ingresos DESC
-            """, [list(ventas_ids)])
-            
-            categorias = []
-            for row in cursor.fetchall():
-                categorias.append({
-                    'categoria': row[0],
-                    'cantidad': float(row[1]),
-                    'ingresos': float(row[2])
-                })
-            
-            datos = {
-                'labels': [c['categoria'] for c in categorias],
-                'cantidades': [c['cantidad'] for c in categorias],
-                'ingresos': [c['ingresos'] for c in categorias]
-            }
-            
-            return JsonResponse(datos)
+        categorias = analytics.ventas_por_categoria(user_store.id_store)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse(dashboard_data.formato_ventas_por_categoria(categorias))
 
 
 def api_estado_inventario(request):
@@ -2311,32 +1947,10 @@ def api_estado_inventario(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    productos_disponibles = Products.objects.filter(
-        id_store=user_store,
-        status_product=True,
-        stock__gte=10
-    ).count()
-    
-    productos_stock_bajo = Products.objects.filter(
-        id_store=user_store,
-        status_product=True,
-        stock__gt=0,
-        stock__lt=10
-    ).count()
+    # Disponibles, stock bajo y agotados en una sola consulta
+    estado = analytics.estado_inventario(user_store.id_store, STOCK_BAJO)
     
-    productos_agotados = Products.objects.filter(
-        id_store=user_store,
-        status_product=True,
-        stock=0
-    ).count()
-    
-    datos = {
-        'labels': ['Disponible', 'Stock Bajo', 'Agotado'],
-        'valores': [productos_disponibles, productos_stock_bajo, productos_agotados],
-        'colores': ['#10b981', '#f59e0b', '#ef4444']
-    }
-    
-    return JsonResponse(datos)
+    return JsonResponse(dashboard_data.formato_estado_inventario(*estado))
 
 
 def api_comparacion_periodos(request):
@@ -2353,51 +1967,114 @@ def api_comparacion_periodos(request):
     except Users.DoesNotExist:
         return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
     
-    # Obtener ventas de la tienda
-    ventas_ids = SalesMovement.objects.filter(
-        id_user__id_store=user_store,
-        type_movement='venta'
-    ).values_list('id_sale', flat=True).distinct()
-    
     hoy = datetime.now().date()
     
-    # Este mes
-    primer_dia_mes_actual = hoy.replace(day=1)
-    ventas_mes_actual = Sales.objects.filter(
-        id_sale__in=ventas_ids,
-        state=True,
-        date_sale__gte=primer_dia_mes_actual
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_sale')
+    primer_dia_mes_actual, primer_dia_mes_anterior, ultimo_dia_mes_anterior = (
+        dashboard_data.limites_comparacion(hoy)
     )
     
-    # Mes anterior
-    ultimo_dia_mes_anterior = primer_dia_mes_actual - timedelta(days=1)
-    primer_dia_mes_anterior = ultimo_dia_mes_anterior.replace(day=1)
-    ventas_mes_anterior = Sales.objects.filter(
-        id_sale__in=ventas_ids,
-        state=True,
-        date_sale__gte=primer_dia_mes_anterior,
-        date_sale__lte=ultimo_dia_mes_anterior
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_sale')
+    # Este mes y el anterior (desde el resumen diario de la tienda)
+    ventas_mes_actual = rollups.totales_periodo(user_store.id_store, primer_dia_mes_actual)
+    ventas_mes_anterior = rollups.totales_periodo(
+        user_store.id_store,
+        primer_dia_mes_anterior,
+        ultimo_dia_mes_anterior
     )
     
-    datos = {
-        'labels': ['Mes Anterior', 'Mes Actual'],
-        'ventas': [
-            float(ventas_mes_anterior['total'] or 0),
-            float(ventas_mes_actual['total'] or 0)
-        ],
-        'cantidad': [
-            ventas_mes_anterior['cantidad'] or 0,
-            ventas_mes_actual['cantidad'] or 0
-        ]
-    }
+    return JsonResponse(dashboard_data.formato_comparacion_periodos(ventas_mes_anterior, ventas_mes_actual))
+
+
+def api_dashboard_bundle(request):
+    """
+    API: Todos los datos BI del dashboard en una sola respuesta
     
-    return JsonResponse(datos)
+    Responde con un ETag derivado de la versión de datos de la tienda y de la
+    fecha (las ventanas de 30 días y 12 meses cambian cada día). Si el cliente
+    envía ``If-None-Match`` con ese ETag se responde 304 sin consultar nada más.
+    """
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    hoy = datetime.now().date()
+    version = chart_cache.version_datos(user_store.id_store)
+    etag = f'"{version}-{hoy.isoformat()}"'
+    
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        try:
+            # El paquete serializado se guarda junto a los gráficos de la tienda
+            cuerpo = chart_cache.obtener_o_generar(
+                user_store.id_store,
+                f'paquete-dashboard:{hoy.isoformat()}',
+                lambda: json.dumps(dashboard_data.paquete_dashboard(user_store.id_store, hoy), cls=DjangoJSONEncoder)
+            )
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        respuesta = HttpResponse(cuerpo, content_type='application/json')
+    
+    respuesta['ETag'] = etag
+    # El navegador puede guardarla, pero debe revalidar siempre con el ETag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def api_graficos(request):
+    """API: Especificaciones JSON de varios gráficos, generados en paralelo"""
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    # ?nombres=stock,ganancias (por defecto, todos)
+    nombres = [n for n in request.GET.get('nombres', '').split(',') if n] or list(charts.GRAFICOS)
+    desconocidos = [n for n in nombres if n not in charts.GRAFICOS]
+    if desconocidos:
+        return JsonResponse({'error': f'Gráficos no encontrados: {", ".join(desconocidos)}'}, status=404)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    graficos = generar_graficos(user_store.id_store, nombres)
+    
+    # Los gráficos ya vienen serializados: se unen sin volver a decodificarlos
+    cuerpo = '{' + ','.join(f'{json.dumps(nombre)}:{graficos[nombre]}' for nombre in nombres) + '}'
+    return HttpResponse(cuerpo, content_type='application/json')
+
+
+def api_grafico(request, nombre):
+    """API: Especificación JSON (datos y layout de Plotly) de un gráfico del dashboard"""
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    if nombre not in charts.GRAFICOS:
+        return JsonResponse({'error': 'Gráfico no encontrado'}, status=404)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    return HttpResponse(
+        generar_grafico(user_store.id_store, nombre),
+        content_type='application/json'
+    )
 
 def api_ventas_producto_por_fecha(request):
     """API para obtener ventas de un producto específico por fecha"""
@@ -2427,26 +2104,11 @@ def api_ventas_producto_por_fecha(request):
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
     
     # Obtener ventas del producto agrupadas por fecha
-    with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT 
-                s.date_sale,
-                SUM(sb.quantitity) as cantidad_vendida
-            FROM sales_bag sb
-            INNER JOIN sales s ON sb.id_sale = s.id_sale
-            WHERE sb.id_product = %s AND s.id_store = %s AND s.state = true
-            GROUP BY s.date_sale
-            ORDER BY s.date_sale
-        """, [str(producto_id), str(user_store.id_store)])
-        
-        rows = cursor.fetchall()
+    rows = analytics.ventas_producto_por_fecha(user_store.id_store, producto_id)
     
     # Formatear datos
-    fechas = []
-    cantidades = []
-    for row in rows:
-        fechas.append(row[0].strftime('%Y-%m-%d'))
-        cantidades.append(float(row[1]))
+    fechas = [fecha.strftime('%Y-%m-%d') for fecha, cantidad in rows]
+    cantidades = [cantidad for fecha, cantidad in rows]
     
     datos = {
         'producto_nombre': producto.name,
@@ -2455,3 +2117,114 @@ def api_ventas_producto_por_fecha(request):
     }
     
     return JsonResponse(datos)
+
+
+# Máximo de ventas por solicitud de cancelación masiva
+MAX_VENTAS_CANCELACION = 1000
+
+def api_cancelar_ventas(request):
+    """
+    API: Cancela varias ventas de la tienda y restaura su stock (p. ej. un turno completo)
+    
+    Recibe por POST un JSON ``{"ids": ["<uuid>", ...]}``. Todas las ventas se
+    cancelan en una sola transacción; las que no existen, no son de la tienda o
+    ya estaban canceladas se informan en ``no_canceladas``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    # Anular ventas en bloque queda reservado a administradores
+    if not user.type_user:
+        return JsonResponse({'error': 'Solo un administrador puede cancelar ventas en bloque'}, status=403)
+    
+    try:
+        ids = json.loads(request.body or b'{}').get('ids')
+        if not isinstance(ids, list) or not ids:
+            return JsonResponse({'error': 'ids debe ser una lista no vacía de ventas'}, status=400)
+        ids = {str(uuid.UUID(str(id_sale))) for id_sale in ids}
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Solicitud inválida: se esperaba {"ids": ["<uuid>", ...]}'}, status=400)
+    
+    if len(ids) > MAX_VENTAS_CANCELACION:
+        return JsonResponse({'error': f'Máximo {MAX_VENTAS_CANCELACION} ventas por solicitud'}, status=400)
+    
+    try:
+        canceladas = cancellation.cancelar_ventas(user_store.id_store, user_id, ids)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({
+        'canceladas': canceladas,
+        'no_canceladas': sorted(ids - set(canceladas))
+    })
+
+
+# Máximo de ventas por solicitud de ingreso en lote
+MAX_VENTAS_LOTE = 500
+
+def api_ingerir_ventas(request):
+    """
+    API: Registra en lote las ventas acumuladas por una caja
+    
+    Recibe por POST un JSON ``{"ventas": [...]}`` o, con ``Content-Type:
+    application/x-ndjson``, una venta JSON por línea. Cada venta tiene
+    ``clave`` (generada por la caja y única por venta), ``productos``
+    (``[{"id_product", "quantity"}, ...]``), ``metodo_pago`` y opcionalmente
+    ``fecha`` (AAAA-MM-DD). Reenviar un lote es seguro: las claves ya
+    registradas se informan como ``existente`` sin crear otra venta.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    user_id = request.session.get('user_id') or _get_user_from_cookie(request)
+    if not user_id:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    
+    try:
+        user = Users.objects.select_related('id_store').get(id_user=user_id)
+        user_store = user.id_store
+        if not user_store:
+            return JsonResponse({'error': 'Sin tienda asignada'}, status=400)
+    except Users.DoesNotExist:
+        return JsonResponse({'error': 'Usuario no encontrado'}, status=404)
+    
+    try:
+        if request.content_type == 'application/x-ndjson':
+            ventas = [json.loads(linea) for linea in request.body.decode('utf-8').splitlines() if linea.strip()]
+        else:
+            ventas = json.loads(request.body or b'{}').get('ventas')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Solicitud inválida: se esperaba {"ventas": [...]} o NDJSON'}, status=400)
+    
+    if not isinstance(ventas, list) or not ventas:
+        return JsonResponse({'error': 'ventas debe ser una lista no vacía'}, status=400)
+    if len(ventas) > MAX_VENTAS_LOTE:
+        return JsonResponse({'error': f'Máximo {MAX_VENTAS_LOTE} ventas por solicitud'}, status=400)
+    
+    try:
+        resultados = checkout.registrar_ventas_lote(user_store.id_store, user_id, ventas)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    resumen = {'creada': 0, 'existente': 0, 'rechazada': 0}
+    for resultado in resultados:
+        resumen[resultado['estado']] += 1
+    
+    return JsonResponse({
+        'creadas': resumen['creada'],
+        'existentes': resumen['existente'],
+        'rechazadas': resumen['rechazada'],
+        'resultados': resultados
+    })
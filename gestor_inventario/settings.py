@@ -95,6 +95,80 @@ DATABASES = {
     }
 }
 
+# Caché de gráficos del dashboard (ver core/chart_cache.py)
+# Los gráficos se guardan en memoria de cada proceso; la versión de datos por
+# tienda que los invalida vive en la base de datos (tabla data_version), por
+# lo que no hace falta una caché compartida.
+GRAFICOS_CACHE_MAX_ENTRADAS = 256
+GRAFICOS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Generación concurrente de gráficos (ver core/chart_executor.py)
+# TIPO: 'hilos', 'procesos' (evita el GIL en la construcción) o 'secuencial'
+GRAFICOS_EJECUTOR = {
+    'TIPO': 'hilos',
+    'TRABAJADORES': 4,
+    'TIMEOUT': 10,  # segundos por gráfico
+}
+
+# Despacho de alertas por email (ver core/alerts.py y el comando despachar_alertas)
+ALERTAS_DESPACHO = {
+    'TASA': 2,               # envíos por segundo (límite de Resend)
+    'RAFAGA': 2,
+    'VENTANA': 300,          # segundos que se acumulan alertas en un solo resumen por destinatario
+    'MAX_INTENTOS': 6,
+    'REINTENTO_BASE': 30,    # segundos; se duplica en cada reintento
+    'REINTENTO_MAX': 3600,
+}
+
+# Entrega de los emails de alerta (ver core/transports.py)
+# TIPO: 'resend', 'smtp', 'archivo', 'consola' o 'memoria'. Con 'resend' la
+# clave se lee de la variable de entorno RESEND_API_KEY; para pruebas locales
+# URL puede apuntar a `manage.py servidor_resend_falso` (http://127.0.0.1:8025)
+ALERTAS_TRANSPORTE = {
+    'TIPO': 'resend',
+    'URL': 'https://api.resend.com',
+    'TIMEOUT': 10,
+}
+ALERTAS_REMITENTE = "Sistema de Inventario <onboarding@resend.dev>"
+# Destinatario de las alertas de tiendas sin administradores que las reciban
+# (ver core/recipients.py); None descarta esas alertas
+ALERTAS_EMAIL_RESPALDO = None
+
+# Almacén de imágenes de productos direccionado por contenido (ver core/image_store.py)
+IMAGENES_PRODUCTOS_DIR = BASE_DIR / 'media' / 'productos'
+
+# Miniaturas WebP/JPEG de las imágenes (ver core/thumbnails.py; requiere Pillow)
+MINIATURAS = {
+    'TAMANOS': {'lista': 80, 'detalle': 256},  # lado máximo en píxeles
+    'CALIDAD': 80,
+    'TRABAJADORES': 2,
+}
+
+# Límites de las imágenes subidas (ver core/uploads.py). Las que superan
+# TAMANO_MAXIMO se descartan mientras llegan; las aceptadas se reducen en
+# segundo plano a LADO_MAXIMO y se guardan sin EXIF
+IMAGENES_SUBIDA = {
+    'TAMANO_MAXIMO': 5 * 1024 * 1024,  # bytes
+    'LADO_MAXIMO': 2048,               # píxeles
+    'PIXELES_MAXIMOS': 40_000_000,
+    'CALIDAD': 85,
+}
+
+# Los archivos subidos se escriben por partes a un temporal en disco, nunca
+# enteros en memoria
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.LimiteTamanoUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Ventas por página en el listado de ventas (?por_pagina= lo cambia, hasta 200)
+VENTAS_POR_PAGINA = 50
+# Productos por página en la tabla de productos
+PRODUCTOS_POR_PAGINA = 25
+
+# Un producto que sigue con stock bajo vuelve a alertar pasado este tiempo (segundos)
+ALERTAS_STOCK_ENFRIAMIENTO = 24 * 3600
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 